@@ -0,0 +1,211 @@
+import os
+import time
+import asyncio
+import logging
+from contextlib import asynccontextmanager, contextmanager
+import frappe
+from frappe.utils import cint
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+SLOTS_KEY = "aida_admission_slots"
+QUEUE_KEY = "aida_admission_queue"
+
+# Without a configured cap, AIDA calls get a third of the web workers and may
+# queue for as many again, so at least a third is always left for ERPNext pages
+DEFAULT_WORKER_SHARE = 3
+# Queued requests hold a web worker too, so the wait is kept short
+MAX_WAIT = 10
+# Queued requests a single user may have, so one user can't fill the queue
+USER_QUEUE_LIMIT = 2
+# A slot left behind by a killed worker is reclaimed after this long
+SLOT_LEASE = 5 * 60
+RETRY_AFTER = 5
+POLL_INTERVAL = 0.05
+MAX_POLL_INTERVAL = 0.25
+
+# Members are "<12 character token>:<user>"; the user starts at character 14.
+# Returns 1 when admitted, 0 to keep waiting and -1 when rejected.
+ADMIT_SCRIPT = """
+local slots, queue = KEYS[1], KEYS[2]
+local member, now = ARGV[1], tonumber(ARGV[2])
+local max_slots, max_queue, user_limit = tonumber(ARGV[5]), tonumber(ARGV[6]), tonumber(ARGV[7])
+local user = string.sub(member, 14)
+
+redis.call('zremrangebyscore', slots, '-inf', now)
+redis.call('zremrangebyscore', queue, '-inf', now)
+
+local waiting = redis.call('zrange', queue, 0, -1)
+if ARGV[8] == '1' then
+    if #waiting >= max_queue then return -1 end
+    local mine = 0
+    for _, waiter in ipairs(waiting) do
+        if string.sub(waiter, 14) == user then mine = mine + 1 end
+    end
+    if mine >= user_limit then return -1 end
+    redis.call('zadd', queue, ARGV[4], member)
+    table.insert(waiting, member)
+elseif not redis.call('zscore', queue, member) then
+    return -1
+end
+
+local free = max_slots - redis.call('zcard', slots)
+if free <= 0 then return 0 end
+
+-- Free slots go first to the users holding the fewest, then in arrival order
+local held = {}
+for _, holder in ipairs(redis.call('zrange', slots, 0, -1)) do
+    local holder_user = string.sub(holder, 14)
+    held[holder_user] = (held[holder_user] or 0) + 1
+end
+local own = held[user] or 0
+local ahead = 0
+for _, waiter in ipairs(waiting) do
+    if waiter == member then break end
+    if (held[string.sub(waiter, 14)] or 0) == own then ahead = ahead + 1 end
+end
+for _, waiter in ipairs(waiting) do
+    if (held[string.sub(waiter, 14)] or 0) < own then ahead = ahead + 1 end
+end
+if ahead >= free then return 0 end
+
+redis.call('zrem', queue, member)
+redis.call('zadd', slots, ARGV[3], member)
+return 1
+"""
+
+
+class AdmissionRejected(Exception):
+    """Raised when the AIDA call queue is full or the wait for a slot ran out."""
+
+    def __init__(self, retry_after):
+        self.retry_after = retry_after
+        super().__init__(f"AIDA assistant is busy, retry in {retry_after}s")
+
+
+def limits():
+    """
+    (slots, queue size) for the bench: aida_max_concurrent_calls from
+    common_site_config.json, else a third of the gunicorn workers.
+    """
+    slots = cint(frappe.conf.get("aida_max_concurrent_calls"))
+    if slots <= 0:
+        workers = cint(frappe.conf.get("gunicorn_workers")) or (os.cpu_count() or 1) * 2 + 1
+        slots = max(workers // DEFAULT_WORKER_SHARE, 1)
+    return slots, slots
+
+
+def _keys():
+    # Web workers are shared by every site of the bench, so the slots are too
+    cache = frappe.cache()
+    return [cache.make_key(SLOTS_KEY, shared=True), cache.make_key(QUEUE_KEY, shared=True)]
+
+
+class _Waiter:
+    """
+    One call's place in the admission queue, shared by slot and async_slot,
+    which differ only in how they sleep between attempts.
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self.max_slots, self.max_queue = limits()
+        self.cache = frappe.cache()
+        self.keys = _keys()
+        self.admit = self.cache.register_script(ADMIT_SCRIPT)
+        self.member = f"{frappe.generate_hash(length=12)}:{user}"
+        self.deadline = time.time() + MAX_WAIT
+        self.interval = POLL_INTERVAL
+        self.arriving = 1
+
+    def attempt(self):
+        """
+        Try to take a slot. Returns None once admitted, else the seconds to
+        wait before the next attempt; raises AdmissionRejected.
+        """
+        now = time.time()
+        admitted = self.admit(
+            keys=self.keys,
+            args=[
+                self.member, now, now + SLOT_LEASE, self.deadline, self.max_slots, self.max_queue,
+                USER_QUEUE_LIMIT, self.arriving
+            ]
+        )
+        self.arriving = 0
+        if admitted == 1:
+            return None
+        if admitted == -1 or now + self.interval >= self.deadline:
+            self.cache.zrem(self.keys[1], self.member)
+            logger.info(f"AIDA call for {self.user} rejected, {self.max_slots} slots busy")
+            raise AdmissionRejected(RETRY_AFTER)
+        wait, self.interval = self.interval, min(self.interval * 2, MAX_POLL_INTERVAL)
+        return wait
+
+    def release(self):
+        self.cache.zrem(self.keys[0], self.member)
+
+
+@contextmanager
+def slot(user):
+    """
+    Hold one of the bench-wide slots for an AIDA call.
+
+    When all slots are taken the request queues for up to MAX_WAIT seconds;
+    free slots go to the queued users holding the fewest. Raises
+    AdmissionRejected at once when the queue is full, or when the wait runs out.
+    """
+    waiter = _Waiter(user)
+    while True:
+        wait = waiter.attempt()
+        if wait is None:
+            break
+        time.sleep(wait)
+
+    try:
+        yield
+    finally:
+        waiter.release()
+
+
+@asynccontextmanager
+async def async_slot(user):
+    """
+    slot for the async gateway: waits on the event loop instead of blocking it.
+    """
+    waiter = _Waiter(user)
+    while True:
+        wait = waiter.attempt()
+        if wait is None:
+            break
+        await asyncio.sleep(wait)
+
+    try:
+        yield
+    finally:
+        waiter.release()
+
+
+def busy_response(error):
+    """
+    Immediate answer for a request turned away by admission control.
+    """
+    return {
+        "success": False,
+        "message": f"AIDA assistant is busy. Please retry in {error.retry_after} seconds.",
+        "retry_after": error.retry_after,
+        "busy": True
+    }
+
+
+def get_stats():
+    """
+    AIDA calls running and queued across the bench.
+    """
+    cache = frappe.cache()
+    slots_key, queue_key = _keys()
+    now = time.time()
+    return {
+        "in_flight": cache.zcount(slots_key, now, "+inf"),
+        "queued": cache.zcount(queue_key, now, "+inf")
+    }
@@ -0,0 +1,153 @@
+import time
+import hashlib
+import logging
+import frappe
+from aida_agent_app import backends, upstream
+from aida_agent_app.settings import get_settings_snapshot, get_settings_version
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+SESSION_KEY = "aida_agent_session:{}:{}"
+
+# An upstream session unused for this long is dropped and initialised again
+SESSION_IDLE_TIMEOUT = 30 * 60
+# Sessions are rebuilt after this long even when in constant use
+SESSION_MAX_AGE = 8 * 60 * 60
+
+CLEAR_TIMEOUT = 10
+
+# How the AIDA server answers a /chat for a session it no longer has, e.g. after a restart
+SESSION_LOST_STATUSES = (400, 404, 410)
+SESSION_LOST_WORDS = ("not found", "unknown", "expired", "invalid", "no such")
+
+
+def _session_key(user, sid):
+    # The sid is a credential, so only a digest of it goes into the key name
+    sid_hash = hashlib.sha1((sid or "").encode("utf-8")).hexdigest()[:16]
+    return SESSION_KEY.format(user, sid_hash)
+
+
+def get_session(user, sid):
+    """
+    Return the registered upstream session data for a user's Frappe session,
+    or None when there is none or it is no longer valid.
+
+    A session is invalid once it has been idle for SESSION_IDLE_TIMEOUT (the
+    Redis key expires), is older than SESSION_MAX_AGE, or was created with
+    settings that have changed since.
+    """
+    key = _session_key(user, sid)
+    entry = frappe.cache().get_value(key)
+    if not entry:
+        return None
+
+    if entry.get("settings_version") != get_settings_version() or \
+            time.time() - entry.get("created_at", 0) > SESSION_MAX_AGE:
+        frappe.cache().delete_value(key)
+        _enqueue_clear(entry)
+        return None
+
+    # Using the session pushes the idle expiry back
+    entry["last_used"] = time.time()
+    frappe.cache().set_value(key, entry, expires_in_sec=SESSION_IDLE_TIMEOUT)
+    return entry["session_data"]
+
+
+def register_session(user, sid, session_data, api_server_url=None):
+    """
+    Remember the upstream session created for a user's Frappe session, and
+    the server it was created on so it can be cleared there later.
+    """
+    now = time.time()
+    frappe.cache().set_value(_session_key(user, sid), {
+        "session_data": session_data,
+        "api_server_url": api_server_url,
+        "settings_version": get_settings_version(),
+        "created_at": now,
+        "last_used": now
+    }, expires_in_sec=SESSION_IDLE_TIMEOUT)
+
+
+def forget_session(user, sid, session_id=None):
+    """
+    Drop the registered session. With session_id, only drop it when it is
+    that session, so clearing an old session can't drop a newer one.
+    Returns the upstream session id that was dropped, if any.
+    """
+    key = _session_key(user, sid)
+    entry = frappe.cache().get_value(key)
+    if not entry:
+        return None
+
+    registered_id = (entry.get("session_data") or {}).get("session_id")
+    if session_id and registered_id != session_id:
+        return None
+
+    frappe.cache().delete_value(key)
+    return registered_id
+
+
+def is_session_lost(status_code, error_data):
+    """
+    True when a failed /chat says the AIDA server doesn't know the session.
+    """
+    if status_code not in SESSION_LOST_STATUSES:
+        return False
+    message = str(error_data.get("error") or error_data.get("message") or error_data.get("detail") or "").lower()
+    return status_code == 410 or ("session" in message and any(word in message for word in SESSION_LOST_WORDS))
+
+
+def _enqueue_clear(entry):
+    """
+    Release a dropped session on the server it was created on, which may have
+    left the pool when the settings changed.
+    """
+    session_id = (entry.get("session_data") or {}).get("session_id")
+    if not session_id:
+        return
+    try:
+        frappe.enqueue(
+            "aida_agent_app.agent_sessions.clear_upstream_session",
+            queue="short",
+            session_id=session_id,
+            api_server_url=entry.get("api_server_url")
+        )
+    except Exception as e:
+        # The server drops the session on its own once it idles out
+        logger.warning(f"Could not queue clearing AIDA session {session_id}: {str(e)}")
+
+
+def clear_upstream_session(session_id, api_server_url=None):
+    """
+    Background job: release an agent session on the AIDA server. Without
+    api_server_url the session's pinned server is used.
+    """
+    settings = get_settings_snapshot()
+    pairs = backends.pool(settings.api_server_url, settings.backends)
+    try:
+        upstream.post(
+            api_server_url or backends.for_session(session_id, pairs),
+            "/clear_session",
+            pool_size=settings.connection_pool_size,
+            json={"session_id": session_id},
+            timeout=CLEAR_TIMEOUT
+        )
+    except Exception as e:
+        logger.warning(f"Could not clear AIDA session {session_id}: {str(e)}")
+    finally:
+        backends.unpin(session_id, pairs)
+
+
+def on_logout(login_manager=None):
+    """
+    on_logout hook: drop the user's upstream session and release it on the
+    AIDA server without holding up the logout.
+    """
+    session_id = forget_session(frappe.session.user, frappe.session.sid)
+    if session_id:
+        frappe.enqueue(
+            "aida_agent_app.agent_sessions.clear_upstream_session",
+            queue="short",
+            session_id=session_id
+        )
@@ -0,0 +1,133 @@
+import re
+import time
+import hashlib
+import logging
+import frappe
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+ENTRY_KEY = "aida_answer:{}"
+LRU_KEY = "aida_answer_lru"
+HITS_KEY = "aida_answer_hits"
+MISSES_KEY = "aida_answer_misses"
+
+MAX_ENTRIES = 2000
+
+# Only generic how-to style questions are shared; anything else may depend on the session
+CACHEABLE_QUESTION = re.compile(
+    r"^(how (do|can|to|should)|what (is|are|does)|where (is|are|do|can)|why (is|does)|explain|steps to)\b"
+)
+
+
+def normalize_question(text):
+    """
+    Lower-case, strip punctuation and collapse whitespace so trivially
+    different phrasings share one entry.
+    """
+    text = re.sub(r"[^\w\s]", " ", (text or "").lower())
+    return " ".join(text.split())
+
+
+def role_profile(user):
+    """
+    Users with the same roles share cached answers.
+    """
+    return ",".join(sorted(frappe.get_roles(user)))
+
+
+def is_cacheable_question(question):
+    normalized = normalize_question(question)
+    return bool(normalized) and bool(CACHEABLE_QUESTION.match(normalized))
+
+
+def make_key(question, user=None):
+    """
+    Cache key for a question asked by a user, or None when the question
+    should not be answered from the shared cache.
+    """
+    if not is_cacheable_question(question):
+        return None
+
+    user = user or frappe.session.user
+    raw = f"{role_profile(user)}\n{normalize_question(question)}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def is_cacheable_answer(response_data):
+    """
+    Answers flagged by the AIDA server as session dependent are never shared.
+    """
+    if not isinstance(response_data, dict) or not response_data.get("response"):
+        return False
+    if response_data.get("cacheable") is False or response_data.get("session_dependent"):
+        return False
+    return True
+
+
+def _redis_key(key):
+    return frappe.cache().make_key(key)
+
+
+def lookup(key):
+    """
+    Look up a cached answer and record the hit or miss.
+    """
+    cache = frappe.cache()
+    answer = cache.get_value(ENTRY_KEY.format(key))
+
+    if answer is None:
+        cache.incr(_redis_key(MISSES_KEY))
+        return None
+
+    cache.incr(_redis_key(HITS_KEY))
+    cache.zadd(_redis_key(LRU_KEY), {key: time.time()})
+    return answer
+
+
+def has_answer(key):
+    """
+    Whether an answer is cached, without counting a hit or miss.
+    """
+    return frappe.cache().get_value(ENTRY_KEY.format(key)) is not None
+
+
+def store(key, response_data, ttl):
+    """
+    Store an answer and evict the least recently used entries beyond MAX_ENTRIES.
+    """
+    if not ttl or not is_cacheable_answer(response_data):
+        return
+
+    cache = frappe.cache()
+    lru_key = _redis_key(LRU_KEY)
+
+    cache.set_value(ENTRY_KEY.format(key), response_data, expires_in_sec=ttl)
+    cache.zadd(lru_key, {key: time.time()})
+
+    overflow = cache.zcard(lru_key) - MAX_ENTRIES
+    if overflow > 0:
+        for evicted in cache.zpopmin(lru_key, overflow):
+            member = evicted[0].decode() if isinstance(evicted[0], bytes) else evicted[0]
+            cache.delete_value(ENTRY_KEY.format(member))
+
+
+def get_stats():
+    cache = frappe.cache()
+    hits = int(cache.get(_redis_key(HITS_KEY)) or 0)
+    misses = int(cache.get(_redis_key(MISSES_KEY)) or 0)
+    return {
+        "hits": hits,
+        "misses": misses,
+        "entries": cache.zcard(_redis_key(LRU_KEY)),
+        "hit_ratio": round(hits / (hits + misses), 4) if hits + misses else 0
+    }
+
+
+def clear():
+    """
+    Drop every cached answer, e.g. after the AIDA server or its knowledge changed.
+    """
+    cache = frappe.cache()
+    cache.delete_keys(ENTRY_KEY.format(""))
+    cache.delete_value(LRU_KEY)
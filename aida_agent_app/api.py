@@ -1,51 +1,47 @@
 import frappe
-import requests
 import json
 import logging
 import time
 from frappe import _
-from frappe.utils import get_site_url, validate_email_address
+from frappe.utils import cint, get_site_url, validate_email_address
 from frappe.rate_limiter import rate_limit
+from werkzeug.wrappers import Response
+from aida_agent_app import (
+    upstream, admission, agent_sessions, backends, streaming, leads, answer_cache, chat_history, metrics,
+    circuit_breaker, health, intent_router, doctype_index, wire
+)
+from aida_agent_app.circuit_breaker import CircuitOpenError
+from aida_agent_app.settings import get_settings_snapshot, default_settings
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+def _circuit_open_response(error):
+    """
+    Immediate answer while the AIDA server's circuit is open.
+    """
+    return {
+        "success": False,
+        "message": f"AIDA server is temporarily unavailable. Please retry in {error.retry_after} seconds.",
+        "retry_after": error.retry_after
+    }
+
 @frappe.whitelist()
 def get_settings():
     """
-    Get AIDA Agent settings from the database.
+    Get AIDA Agent settings from the cached settings snapshot.
     """
     try:
-        # Try to get existing settings
-        settings = frappe.get_single("AIDA Agent Settings")
         return {
             "success": True,
-            "settings": {
-                "api_server_url": settings.get("api_server_url", "http://localhost:5000"),
-                "erpnext_url": settings.get("erpnext_url", get_site_url(frappe.local.site)),
-                "google_api_key": settings.get("google_api_key", ""),
-                "mongo_uri": settings.get("mongo_uri", ""),
-                "enable_onboarding": settings.get("enable_onboarding", 1),
-                "enable_lead_creation": settings.get("enable_lead_creation", 1),
-                "widget_position": settings.get("widget_position", "bottom-right"),
-                "widget_theme": settings.get("widget_theme", "light")
-            }
+            "settings": get_settings_snapshot().as_dict()
         }
     except Exception as e:
         frappe.log_error(f"Error getting AIDA settings: {str(e)}", "AIDA Agent Settings")
-        # Return default settings if document doesn't exist
+        # Return default settings if settings can't be read
         return {
             "success": True,
-            "settings": {
-                "api_server_url": "http://localhost:5000",
-                "erpnext_url": get_site_url(frappe.local.site),
-                "google_api_key": "",
-                "mongo_uri": "",
-                "enable_onboarding": 1,
-                "enable_lead_creation": 1,
-                "widget_position": "bottom-right",
-                "widget_theme": "light"
-            }
+            "settings": default_settings().as_dict()
         }
 
 @frappe.whitelist()
@@ -77,6 +73,10 @@ def save_settings(settings):
         if 'mongo_uri' in settings and settings['mongo_uri']:
             if not settings['mongo_uri'].startswith(('mongodb://', 'mongodb+srv://')):
                 frappe.throw("Invalid MongoDB URI format")
+                
+        if 'connection_pool_size' in settings and settings['connection_pool_size']:
+            if not 1 <= int(settings['connection_pool_size']) <= 100:
+                frappe.throw("Connection pool size must be between 1 and 100")
         
         # Get or create settings document
         try:
@@ -86,7 +86,9 @@ def save_settings(settings):
         
         # Update settings with validation
         allowed_fields = ['api_server_url', 'erpnext_url', 'google_api_key', 'mongo_uri', 
-                         'enable_onboarding', 'enable_lead_creation', 'widget_position', 'widget_theme']
+                         'enable_onboarding', 'enable_lead_creation', 'widget_position', 'widget_theme',
+                         'connection_pool_size', 'enable_streaming', 'lead_batch_concurrency',
+                         'bulk_insert_leads', 'answer_cache_ttl']
         
         update_data = {}
         for key in allowed_fields:
@@ -94,19 +96,11 @@ def save_settings(settings):
                 update_data[key] = settings[key]
             else:
                 # Set defaults for missing fields
-                defaults = {
-                    "api_server_url": "http://localhost:5000",
-                    "erpnext_url": get_site_url(frappe.local.site),
-                    "google_api_key": "",
-                    "mongo_uri": "",
-                    "enable_onboarding": 1,
-                    "enable_lead_creation": 1,
-                    "widget_position": "bottom-right",
-                    "widget_theme": "light"
-                }
+                defaults = default_settings().as_dict()
                 update_data[key] = defaults.get(key, "")
         
         doc.update(update_data)
+        # The settings version is bumped by the document once this commits
         doc.save()
         frappe.db.commit()
         
@@ -119,6 +113,7 @@ def save_settings(settings):
         return {"success": False, "message": f"Error saving settings: {str(e)}"}
 
 @frappe.whitelist()
+@metrics.instrument("test_connection")
 def test_connection():
     """
     Test connection to AIDA API server.
@@ -128,28 +123,35 @@ def test_connection():
         if not settings["success"]:
             return {"success": False, "message": "Could not load settings"}
         
-        api_server_url = settings["settings"]["api_server_url"]
+        pool_size = settings["settings"].get("connection_pool_size")
+        server_urls = backends.urls(settings["settings"]["api_server_url"], settings["settings"].get("backends"))
         
-        # Test health endpoint
-        response = requests.get(f"{api_server_url}/health", timeout=10)
+        # The background prober's last results answer at once; probe only servers without one
+        statuses = [health.get_or_check(api_server_url, pool_size) for api_server_url in server_urls]
+        servers = [
+            {key: status.get(key) for key in ("api_server_url", "status", "latency_ms", "error", "checked_at")}
+            for status in statuses
+        ]
+        up = [status for status in statuses if status["status"] == health.UP]
         
-        if response.status_code == 200:
+        if up:
             return {
                 "success": True, 
-                "message": "Connection successful",
-                "server_status": response.json()
+                "message": "Connection successful" if len(up) == len(statuses)
+                    else f"{len(up)} of {len(statuses)} AIDA servers reachable",
+                "server_status": up[0]["server_status"],
+                "latency_ms": up[0]["latency_ms"],
+                "checked_at": up[0]["checked_at"],
+                "servers": servers
             }
         else:
             return {
                 "success": False, 
-                "message": f"Server returned status code: {response.status_code}"
+                "message": f"Connection failed: {statuses[0]['error']}",
+                "checked_at": statuses[0]["checked_at"],
+                "servers": servers
             }
             
-    except requests.exceptions.RequestException as e:
-        return {
-            "success": False, 
-            "message": f"Connection failed: {str(e)}"
-        }
     except Exception as e:
         frappe.log_error(f"Error testing AIDA connection: {str(e)}", "AIDA Agent Connection Test")
         return {
@@ -158,51 +160,48 @@ def test_connection():
         }
 
 @frappe.whitelist()
-def init_agent_session():
+@metrics.instrument("init")
+def init_agent_session(refresh=False):
     """
-    Initialize a new AIDA agent session.
+    Initialize an AIDA agent session, reusing the user's live session when there is one.
+    Pass refresh to always start a new session.
     """
     try:
-        settings = get_settings()
-        if not settings["success"]:
-            return {"success": False, "message": "Could not load settings"}
-        
-        settings_data = settings["settings"]
-        api_server_url = settings_data["api_server_url"]
-        
         # Get current user session info
         user = frappe.session.user
         sid = frappe.session.sid
         
-        payload = {
-            "erpnext_url": settings_data["erpnext_url"],
-            "username": user,
-            "password": "session_token",
-            "google_api_key": settings_data["google_api_key"],
-            "mongo_uri": settings_data["mongo_uri"],
-            "site_base_url": settings_data["erpnext_url"],
-            "api_key": user,
-            "api_secret": sid
-        }
+        if not cint(refresh):
+            session_data = agent_sessions.get_session(user, sid)
+            if session_data:
+                return {
+                    "success": True,
+                    "session_data": session_data,
+                    "cached": True
+                }
         
-        response = requests.post(
-            f"{api_server_url}/init_session",
-            json=payload,
-            timeout=30
-        )
+        settings = get_settings()
+        if not settings["success"]:
+            return {"success": False, "message": "Could not load settings"}
         
-        if response.status_code == 200:
+        response, session_data = _start_session(settings["settings"], user, sid)
+        
+        if session_data:
             return {
                 "success": True,
-                "session_data": response.json()
+                "session_data": session_data
             }
         else:
-            error_data = response.json() if response.headers.get('content-type') == 'application/json' else {}
+            error_data = wire.decode_error(response)
             return {
                 "success": False,
                 "message": error_data.get("error", f"Failed to initialize session: {response.status_code}")
             }
             
+    except CircuitOpenError as e:
+        return _circuit_open_response(e)
+    except admission.AdmissionRejected as e:
+        return admission.busy_response(e)
     except Exception as e:
         frappe.log_error(f"Error initializing AIDA session: {str(e)}", "AIDA Agent Session")
         return {
@@ -210,8 +209,137 @@ def init_agent_session():
             "message": f"Failed to initialize session: {str(e)}"
         }
 
+def _start_session(settings_data, user, sid):
+    """
+    Start an agent session for a user's Frappe session and register it.
+    Returns the /init_session response and the session data, None when the
+    server refused.
+    """
+    # New sessions are spread over the server pool and stay on the server they start on
+    pairs = backends.pool(settings_data["api_server_url"], settings_data.get("backends"))
+    api_server_url = backends.for_new_session(f"{user}:{sid}", pairs)
+    
+    with admission.slot(user):
+        response = upstream.post(
+            api_server_url,
+            "/init_session",
+            pool_size=settings_data.get("connection_pool_size"),
+            retries=1,
+            coalesce=True,
+            json=build_init_payload(settings_data, user, sid),
+            timeout=30
+        )
+    
+    if response.status_code != 200:
+        return response, None
+    
+    session_data = wire.decode(response)
+    backends.pin(session_data.get("session_id"), api_server_url, pairs)
+    agent_sessions.register_session(user, sid, session_data, api_server_url)
+    return response, session_data
+
+def build_init_payload(settings_data, user, sid):
+    """
+    Body of the /init_session call for a user's Frappe session.
+    """
+    return {
+        "erpnext_url": settings_data["erpnext_url"],
+        "username": user,
+        "password": "session_token",
+        "google_api_key": settings_data["google_api_key"],
+        "mongo_uri": settings_data["mongo_uri"],
+        "site_base_url": settings_data["erpnext_url"],
+        "api_key": user,
+        "api_secret": sid
+    }
+
+def build_chat_payload(session_id, user_input, user):
+    """
+    Body of the /chat call for an already validated message.
+    """
+    return {
+        "session_id": session_id,
+        "user_input": user_input,
+        "user": user,
+        "site": get_site_url(frappe.local.site)
+    }
+
+def _send_chat(api_server_url, pool_size, session_id, user_input):
+    """
+    Send a validated message to the agent session on its server.
+    """
+    # Send request with retry logic (jittered backoff, fails fast while the circuit is open).
+    # A resent identical message joins the call already in flight.
+    # Waits briefly for a bench-wide slot so chat can't take every web worker.
+    with admission.slot(frappe.session.user):
+        return upstream.post(
+            api_server_url,
+            "/chat",
+            pool_size=pool_size,
+            retries=2,
+            coalesce=True,
+            json=build_chat_payload(session_id, user_input, frappe.session.user),
+            timeout=60,
+            headers={'Content-Type': 'application/json'}
+        )
+
+def _resume_session(settings_data, session_id, user_input):
+    """
+    Replace an agent session the AIDA server no longer knows and resend the
+    message to the new one. Returns the new session data, None when it could
+    not be started, and the response to hand back.
+    """
+    user, sid = frappe.session.user, frappe.session.sid
+    pairs = backends.pool(settings_data["api_server_url"], settings_data.get("backends"))
+    agent_sessions.forget_session(user, sid, session_id=session_id)
+    backends.unpin(session_id, pairs)
+    logger.info(f"AIDA session {session_id} of user {user} was lost upstream, starting a new one")
+    
+    response, session_data = _start_session(settings_data, user, sid)
+    if not session_data:
+        return None, response
+    
+    new_session_id = session_data.get("session_id")
+    response = _send_chat(
+        backends.for_session(new_session_id, pairs), settings_data.get("connection_pool_size"), new_session_id, user_input
+    )
+    return session_data, response
+
+def _validate_chat_input(session_id, user_input):
+    """
+    Validate and sanitize a chat message.
+    Returns the cleaned message and an error response, one of which is None.
+    """
+    # Enhanced input validation
+    if not user_input or not isinstance(user_input, str):
+        return None, {"success": False, "message": "Valid message is required"}
+        
+    user_input = user_input.strip()
+    if len(user_input) > 1000:  # Limit message length
+        return None, {"success": False, "message": "Message too long (max 1000 characters)"}
+        
+    # Sanitize input (basic XSS prevention)
+    user_input = frappe.utils.sanitize_html(user_input)
+    
+    if not session_id:
+        return None, {"success": False, "message": "Session ID is required"}
+    
+    return user_input, None
+
+def route_locally(user_input, user):
+    """
+    Local answer for a navigation request, or None to ask the agent.
+    A router failure never fails the chat; the message goes to the agent.
+    """
+    try:
+        return intent_router.route(user_input, user)
+    except Exception as e:
+        logger.warning(f"AIDA intent router failed, asking the agent instead: {str(e)}")
+        return None
+
 @frappe.whitelist()
 @rate_limit(limit=20, seconds=60, methods=["POST"])
+@metrics.instrument("chat")
 def chat_with_agent(session_id, user_input):
     """
     Send a message to the AIDA agent with enhanced security.
@@ -219,65 +347,85 @@ def chat_with_agent(session_id, user_input):
     start_time = time.time()
     
     try:
-        # Enhanced input validation
-        if not user_input or not isinstance(user_input, str):
-            return {"success": False, "message": "Valid message is required"}
-            
-        user_input = user_input.strip()
-        if len(user_input) > 1000:  # Limit message length
-            return {"success": False, "message": "Message too long (max 1000 characters)"}
-            
-        # Sanitize input (basic XSS prevention)
-        user_input = frappe.utils.sanitize_html(user_input)
-        
-        if not session_id:
-            return {"success": False, "message": "Session ID is required"}
+        user_input, error = _validate_chat_input(session_id, user_input)
+        if error:
+            return error
+        
+        # "Open the X list" and "new X" are answered here in milliseconds
+        routed = route_locally(user_input, frappe.session.user)
+        if routed:
+            chat_history.queue_exchange(session_id, user_input, routed["response"])
+            return {
+                "success": True,
+                "response_data": routed,
+                "routed": True
+            }
         
         settings = get_settings()
         if not settings["success"]:
             return {"success": False, "message": "Could not load settings"}
         
-        api_server_url = settings["settings"]["api_server_url"]
+        api_server_url = backends.for_session(
+            session_id, backends.pool(settings["settings"]["api_server_url"], settings["settings"].get("backends"))
+        )
+        pool_size = settings["settings"].get("connection_pool_size")
+        answer_cache_ttl = settings["settings"].get("answer_cache_ttl")
+        
+        # Common how-to questions are answered from the shared cache
+        answer_key = answer_cache.make_key(user_input) if answer_cache_ttl else None
+        if answer_key:
+            cached_answer = answer_cache.lookup(answer_key)
+            if cached_answer is not None:
+                chat_history.queue_exchange(session_id, user_input, cached_answer.get("response", ""), cached=True)
+                return {
+                    "success": True,
+                    "response_data": cached_answer,
+                    "cached": True
+                }
         
-        payload = {
-            "session_id": session_id,
-            "user_input": user_input,
-            "user": frappe.session.user,
-            "site": get_site_url(frappe.local.site)
-        }
+        # Answer at once while the health prober sees the server down
+        down_status = health.known_down(api_server_url)
+        if down_status:
+            return health.down_response(down_status)
         
-        # Send request with retry logic
-        max_retries = 2
-        for attempt in range(max_retries + 1):
-            try:
-                response = requests.post(
-                    f"{api_server_url}/chat",
-                    json=payload,
-                    timeout=60,
-                    headers={'Content-Type': 'application/json'}
-                )
-                break
-            except requests.exceptions.RequestException as e:
-                if attempt == max_retries:
-                    raise e
-                time.sleep(1)  # Wait before retry
+        response = _send_chat(api_server_url, pool_size, session_id, user_input)
+        
+        # The AIDA server lost the session (e.g. it restarted): start a new one and resend once
+        new_session = None
+        if response.status_code != 200 and \
+                agent_sessions.is_session_lost(response.status_code, wire.decode_error(response)):
+            new_session, response = _resume_session(settings["settings"], session_id, user_input)
+            if new_session:
+                session_id = new_session.get("session_id", session_id)
         
         duration = time.time() - start_time
         
         if response.status_code == 200:
             logger.info(f"AIDA chat request completed in {duration:.2f}s for user {frappe.session.user}")
-            return {
+            response_data = wire.decode(response)
+            if answer_key:
+                answer_cache.store(answer_key, response_data, answer_cache_ttl)
+            chat_history.queue_exchange(session_id, user_input, response_data.get("response", ""))
+            result = {
                 "success": True,
-                "response_data": response.json()
+                "response_data": response_data
             }
+            if new_session:
+                # The widget sends later messages to the new session
+                result["session_data"] = new_session
+            return result
         else:
-            error_data = response.json() if response.headers.get('content-type') == 'application/json' else {}
+            error_data = wire.decode_error(response)
             logger.warning(f"AIDA API returned status {response.status_code}")
             return {
                 "success": False,
                 "message": error_data.get("error", f"Chat failed: {response.status_code}")
             }
             
+    except CircuitOpenError as e:
+        return _circuit_open_response(e)
+    except admission.AdmissionRejected as e:
+        return admission.busy_response(e)
     except Exception as e:
         duration = time.time() - start_time
         logger.error(f"Error in AIDA chat after {duration:.2f}s: {str(e)}", exc_info=True)
@@ -288,50 +436,164 @@ def chat_with_agent(session_id, user_input):
         }
 
 @frappe.whitelist()
-def create_leads(business_type, location, count=10):
+@rate_limit(limit=20, seconds=60, methods=["POST"])
+@metrics.instrument("chat_stream")
+def chat_with_agent_stream(session_id, user_input, stream_id):
     """
-    Create leads using the separated lead creation endpoint.
+    Start a streamed reply from the AIDA agent.
+    Chunks are pushed to the user over realtime events tagged with stream_id,
+    so the request returns as soon as the job is queued.
     """
     try:
-        settings = get_settings()
-        if not settings["success"]:
-            return {"success": False, "message": "Could not load settings"}
+        user_input, error = _validate_chat_input(session_id, user_input)
+        if error:
+            return error
         
-        settings_data = settings["settings"]
-        api_server_url = settings_data["api_server_url"]
+        if not stream_id or not isinstance(stream_id, str) or len(stream_id) > 64 or not stream_id.isalnum():
+            return {"success": False, "message": "Valid stream ID is required"}
         
-        # Get current user session info
-        user = frappe.session.user
-        sid = frappe.session.sid
+        # Navigation answers are returned directly instead of being streamed
+        routed = route_locally(user_input, frappe.session.user)
+        if routed:
+            chat_history.queue_exchange(session_id, user_input, routed["response"])
+            return {
+                "success": True,
+                "stream_id": stream_id,
+                "response_data": routed,
+                "routed": True
+            }
         
-        payload = {
-            "erpnext_url": settings_data["erpnext_url"],
-            "username": user,
-            "password": sid,
-            "google_api_key": settings_data["google_api_key"],
-            "business_type": business_type,
-            "location": location,
-            "count": int(count)
-        }
+        # A cached answer is returned directly instead of being streamed
+        answer_key = answer_cache.make_key(user_input) if get_settings_snapshot().answer_cache_ttl else None
+        if answer_key:
+            cached_answer = answer_cache.lookup(answer_key)
+            if cached_answer is not None:
+                chat_history.queue_exchange(session_id, user_input, cached_answer.get("response", ""), cached=True)
+                return {
+                    "success": True,
+                    "stream_id": stream_id,
+                    "response_data": cached_answer,
+                    "cached": True
+                }
         
-        response = requests.post(
-            f"{api_server_url}/create_leads",
-            json=payload,
-            timeout=120
+        # Same gates as a direct call; the bench-wide slot is taken by the job
+        settings = get_settings_snapshot()
+        api_server_url = backends.for_session(session_id, backends.pool(settings.api_server_url, settings.backends))
+        circuit_breaker.raise_if_open(api_server_url)
+        down_status = health.known_down(api_server_url)
+        if down_status:
+            return health.down_response(down_status)
+        
+        frappe.enqueue(
+            "aida_agent_app.streaming.stream_chat",
+            queue=streaming.STREAM_QUEUE,
+            timeout=streaming.STREAM_JOB_TIMEOUT,
+            stream_id=stream_id,
+            session_id=session_id,
+            user_input=user_input,
+            user=frappe.session.user,
+            site_url=get_site_url(frappe.local.site),
+            answer_key=answer_key
         )
         
-        if response.status_code == 200:
-            return {
-                "success": True,
-                "result": response.json()
-            }
-        else:
-            error_data = response.json() if response.headers.get('content-type') == 'application/json' else {}
-            return {
-                "success": False,
-                "message": error_data.get("error", f"Lead creation failed: {response.status_code}")
-            }
+        return {"success": True, "stream_id": stream_id}
+        
+    except CircuitOpenError as e:
+        return _circuit_open_response(e)
+    except Exception as e:
+        logger.error(f"Error starting AIDA chat stream: {str(e)}", exc_info=True)
+        frappe.log_error(f"Error starting AIDA chat stream: {str(e)}", "AIDA Agent Chat")
+        return {
+            "success": False,
+            "message": "An error occurred while processing your request"
+        }
+
+@frappe.whitelist()
+def get_chat_history(before=None, limit=20):
+    """
+    Get a page of the current user's chat history, oldest message first.
+    Pass the returned next_before to load the page before it.
+    """
+    if frappe.session.user == "Guest":
+        return {"success": False, "message": "Login required"}
+    
+    return dict(chat_history.get_history(frappe.session.user, before=before, limit=limit), success=True)
+
+@frappe.whitelist()
+def search_doctypes(query, limit=10):
+    """
+    DocTypes the current user can read that match a free-text query, best
+    match first, each with a link to open it. The last word may be partial.
+    """
+    if frappe.session.user == "Guest":
+        return {"success": False, "message": "Login required"}
+    
+    limit = min(max(cint(limit), 1), 50)
+    try:
+        return {"success": True, "results": doctype_index.search(query or "", limit=limit)}
+    except Exception as e:
+        logger.error(f"Error searching DocTypes: {str(e)}", exc_info=True)
+        return {"success": False, "message": "DocType search is not available right now"}
+
+@frappe.whitelist()
+def get_answer_cache_stats():
+    """
+    Hit/miss counters and size of the shared answer cache.
+    """
+    frappe.only_for("System Manager")
+    return {"success": True, "stats": answer_cache.get_stats()}
+
+@frappe.whitelist()
+def get_metrics():
+    """
+    Latency histograms and counters of the AIDA endpoints, plus answer-cache
+    and circuit-breaker gauges, in the Prometheus text format.
+    """
+    frappe.only_for("System Manager")
+    
+    api_server_url = get_settings_snapshot().api_server_url
+    cache_stats = answer_cache.get_stats()
+    admission_stats = admission.get_stats()
+    circuit_state = circuit_breaker.get_state(api_server_url)
+    
+    text = metrics.render_prometheus({
+        "aida_answer_cache_entries": ("Answers held in the shared answer cache.", [({}, cache_stats["entries"])]),
+        "aida_answer_cache_hit_ratio": ("Share of cacheable questions answered from the cache.", [({}, cache_stats["hit_ratio"])]),
+        "aida_admission_in_flight": ("AIDA calls holding a web worker slot.", [({}, admission_stats["in_flight"])]),
+        "aida_admission_queued": ("AIDA calls waiting for a slot.", [({}, admission_stats["queued"])]),
+        "aida_circuit_open": (
+            "1 while the AIDA server's circuit is open or half open.",
+            [({"server": api_server_url}, 0 if circuit_state == circuit_breaker.CLOSED else 1)]
+        )
+    })
+    
+    return Response(text, mimetype="text/plain; version=0.0.4")
+
+@frappe.whitelist()
+@metrics.instrument("create_leads")
+def create_leads(business_type, location, count=10):
+    """
+    Queue lead creation as a background job on the long queue.
+    Progress is pushed to the user over realtime; the job can also be polled
+    with get_lead_job_status and stopped with cancel_lead_job.
+    """
+    try:
+        if not business_type or not location:
+            return {"success": False, "message": "Business type and location are required"}
+        
+        count = int(count)
+        if not 1 <= count <= 500:
+            return {"success": False, "message": "Lead count must be between 1 and 500"}
+        
+        job_id = leads.start_lead_job(business_type, location, count)
+        
+        return {
+            "success": True,
+            "job_id": job_id
+        }
             
+    except frappe.PermissionError as e:
+        return {"success": False, "message": str(e)}
     except Exception as e:
         frappe.log_error(f"Error creating leads: {str(e)}", "AIDA Lead Creation")
         return {
@@ -340,6 +602,100 @@ def create_leads(business_type, location, count=10):
         }
 
 @frappe.whitelist()
+@metrics.instrument("create_leads_batch")
+def create_leads_batch(queries):
+    """
+    Queue a batch of lead queries that the job sends to the AIDA server in parallel.
+    queries is a list of {"business_type", "location", "count"} objects or
+    [business_type, location, count] triples.
+    """
+    try:
+        if isinstance(queries, str):
+            if len(queries) > 20000:  # 20KB limit
+                return {"success": False, "message": "Request payload too large"}
+            queries = json.loads(queries)
+        
+        if not isinstance(queries, list) or not queries:
+            return {"success": False, "message": "At least one query is required"}
+        
+        if len(queries) > leads.MAX_BATCH_QUERIES:
+            return {"success": False, "message": f"A batch can hold at most {leads.MAX_BATCH_QUERIES} queries"}
+        
+        normalized = []
+        for query in queries:
+            if isinstance(query, dict):
+                query = (query.get("business_type"), query.get("location"), query.get("count", 10))
+            if not isinstance(query, (list, tuple)) or len(query) != 3:
+                return {"success": False, "message": "Each query needs business_type, location and count"}
+            
+            business_type, location, count = query
+            if not business_type or not location:
+                return {"success": False, "message": "Business type and location are required"}
+            
+            count = int(count)
+            if not 1 <= count <= 500:
+                return {"success": False, "message": "Lead count must be between 1 and 500"}
+            
+            normalized.append((business_type, location, count))
+        
+        job_id = leads.start_lead_batch_job(normalized)
+        
+        return {
+            "success": True,
+            "job_id": job_id
+        }
+    
+    except (ValueError, TypeError) as e:
+        return {"success": False, "message": f"Invalid batch: {str(e)}"}
+    except frappe.PermissionError as e:
+        return {"success": False, "message": str(e)}
+    except Exception as e:
+        frappe.log_error(f"Error creating lead batch: {str(e)}", "AIDA Lead Creation")
+        return {
+            "success": False,
+            "message": f"Lead creation failed: {str(e)}"
+        }
+
+def _get_own_lead_job(job_id):
+    """
+    Get a lead job's status if it belongs to the current user (or a System Manager).
+    """
+    status = leads.get_job_status(job_id) if job_id else None
+    if not status:
+        return None
+    if status.get("user") != frappe.session.user and "System Manager" not in frappe.get_roles():
+        return None
+    return status
+
+@frappe.whitelist()
+def get_lead_job_status(job_id):
+    """
+    Get the status and, once finished, the result of a lead creation job.
+    """
+    status = _get_own_lead_job(job_id)
+    if not status:
+        return {"success": False, "message": "Lead job not found"}
+    
+    return {"success": True, "job": status}
+
+@frappe.whitelist()
+def cancel_lead_job(job_id):
+    """
+    Ask a running lead creation job to stop at its next checkpoint.
+    """
+    status = _get_own_lead_job(job_id)
+    if not status:
+        return {"success": False, "message": "Lead job not found"}
+    
+    if status.get("status") not in ("queued", "running"):
+        return {"success": False, "message": f"Lead job is already {status.get('status')}"}
+    
+    leads.request_cancel(job_id)
+    leads.set_job_status(job_id, status="cancelling")
+    return {"success": True, "message": "Cancellation requested"}
+
+@frappe.whitelist()
+@metrics.instrument("clear")
 def clear_agent_session(session_id):
     """
     Clear an AIDA agent session.
@@ -349,21 +705,31 @@ def clear_agent_session(session_id):
         if not settings["success"]:
             return {"success": False, "message": "Could not load settings"}
         
-        api_server_url = settings["settings"]["api_server_url"]
+        pairs = backends.pool(settings["settings"]["api_server_url"], settings["settings"].get("backends"))
+        api_server_url = backends.for_session(session_id, pairs)
+        pool_size = settings["settings"].get("connection_pool_size")
         
         payload = {"session_id": session_id}
         
-        response = requests.post(
-            f"{api_server_url}/clear_session",
+        response = upstream.post(
+            api_server_url,
+            "/clear_session",
+            pool_size=pool_size,
+            retries=1,
             json=payload,
             timeout=10
         )
         
+        agent_sessions.forget_session(frappe.session.user, frappe.session.sid, session_id=session_id)
+        backends.unpin(session_id, pairs)
+        
         return {
             "success": response.status_code == 200,
             "message": "Session cleared" if response.status_code == 200 else "Failed to clear session"
         }
         
+    except CircuitOpenError as e:
+        return _circuit_open_response(e)
     except Exception as e:
         frappe.log_error(f"Error clearing AIDA session: {str(e)}", "AIDA Agent Session")
         return {
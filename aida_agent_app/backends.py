@@ -0,0 +1,168 @@
+import bisect
+import hashlib
+import logging
+import frappe
+from aida_agent_app import circuit_breaker, health, upstream
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+SESSION_BACKEND_KEY = "aida_session_backend:{}"
+OUTSTANDING_KEY = "aida_backend_outstanding:{}"
+
+# Points each unit of weight gets on the hash ring; more points, smoother spread
+RING_POINTS_PER_WEIGHT = 64
+# Agent sessions are rebuilt after 8 hours (agent_sessions.SESSION_MAX_AGE)
+PIN_TTL = 8 * 60 * 60
+# A counter left behind by a killed job stops skewing the balance after this long
+OUTSTANDING_TTL = 60 * 60
+
+# Hash rings built in this process, keyed by the pool they were built for
+_rings = {}
+
+
+def pool(api_server_url, backends=None):
+    """
+    The (url, weight) pairs requests are spread over: the configured server
+    pool, or api_server_url alone when the pool is empty.
+    """
+    pairs = tuple((url, weight) for url, weight in (backends or ()) if url) or ((api_server_url, 1),)
+    upstream.use_backends(url for url, _ in pairs)
+    return pairs
+
+
+def urls(api_server_url, backends=None):
+    return [url for url, _ in pool(api_server_url, backends)]
+
+
+def _hash(value):
+    return int(hashlib.md5(value.encode("utf-8")).hexdigest()[:16], 16)
+
+
+def _ring(pairs):
+    ring = _rings.get(pairs)
+    if ring is None:
+        points = sorted(
+            (_hash(f"{url}#{index}"), url)
+            for url, weight in pairs
+            for index in range(weight * RING_POINTS_PER_WEIGHT)
+        )
+        ring = ([point for point, _ in points], [url for _, url in points])
+        _rings[pairs] = ring
+    return ring
+
+
+def ring_order(key, pairs):
+    """
+    Every server of the pool, in the order they follow the key on the hash
+    ring. Adding or removing a server only moves the keys next to it.
+    """
+    if len(pairs) == 1:
+        return [pairs[0][0]]
+
+    points, owners = _ring(pairs)
+    start = bisect.bisect(points, _hash(key))
+    order = []
+    for offset in range(len(owners)):
+        url = owners[(start + offset) % len(owners)]
+        if url not in order:
+            order.append(url)
+            if len(order) == len(pairs):
+                break
+    return order
+
+
+def is_available(api_server_url):
+    """
+    False while the health prober sees the server down or its circuit is open.
+    Routing only looks; the recheck turn of a down server is left to the
+    request that goes to it.
+    """
+    if health.known_down(api_server_url, recheck=False):
+        return False
+    return circuit_breaker.get_state(api_server_url) != circuit_breaker.OPEN
+
+
+def _first_available(candidates):
+    for api_server_url in candidates:
+        if is_available(api_server_url):
+            return api_server_url
+    # Nothing is up: use the preferred server and let the caller report the failure
+    return candidates[0]
+
+
+def _pin_key(session_id):
+    return SESSION_BACKEND_KEY.format(hashlib.sha1(str(session_id).encode("utf-8")).hexdigest()[:16])
+
+
+def for_new_session(routing_key, pairs):
+    """
+    Server to create a new agent session on, by consistent hashing of a key
+    known before the session exists (the user's Frappe session).
+    """
+    if len(pairs) == 1:
+        return pairs[0][0]
+    return _first_available(ring_order(routing_key, pairs))
+
+
+def for_session(session_id, pairs):
+    """
+    Server holding an agent session: the one it was created on, else its
+    place on the hash ring. Fails over along the ring when that server is down.
+    """
+    if len(pairs) == 1:
+        return pairs[0][0]
+
+    candidates = ring_order(str(session_id or ""), pairs)
+    pinned = frappe.cache().get_value(_pin_key(session_id)) if session_id else None
+    if pinned in candidates:
+        candidates.remove(pinned)
+        candidates.insert(0, pinned)
+    return _first_available(candidates)
+
+
+def pin(session_id, api_server_url, pairs):
+    """
+    Remember which server a new agent session lives on.
+    """
+    if len(pairs) > 1 and session_id:
+        frappe.cache().set_value(_pin_key(session_id), api_server_url, expires_in_sec=PIN_TTL)
+
+
+def unpin(session_id, pairs):
+    if len(pairs) > 1 and session_id:
+        frappe.cache().delete_value(_pin_key(session_id))
+
+
+def _outstanding_key(api_server_url):
+    return frappe.cache().make_key(
+        OUTSTANDING_KEY.format(hashlib.sha1(api_server_url.encode("utf-8")).hexdigest()[:12])
+    )
+
+
+def acquire(pairs):
+    """
+    Pick the available server with the fewest outstanding requests per unit
+    of weight, counted across all workers, and count this request against it.
+    Returns a route (url, counter key) to hand back to release().
+    """
+    if len(pairs) == 1:
+        return pairs[0][0], None
+
+    cache = frappe.cache()
+    keys = {url: _outstanding_key(url) for url, _ in pairs}
+    counts = dict(zip(keys, cache.mget(list(keys.values()))))
+    ranked = sorted(pairs, key=lambda pair: max(int(counts[pair[0]] or 0), 0) / pair[1])
+    api_server_url = _first_available([url for url, _ in ranked])
+
+    pipe = cache.pipeline(transaction=False)
+    pipe.incr(keys[api_server_url])
+    pipe.expire(keys[api_server_url], OUTSTANDING_TTL)
+    pipe.execute()
+    return api_server_url, keys[api_server_url]
+
+
+def release(route):
+    _, key = route
+    if key:
+        frappe.cache().decr(key)
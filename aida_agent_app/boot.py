@@ -1,6 +1,60 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals
+import hashlib
 import frappe
+from aida_agent_app.settings import get_settings_snapshot, get_settings_version
+
+# Chunks the chat widget fetches on first use, relative to public/. The widget
+# itself (js/aida_chat.js) is loaded with the build version of the loader's URL
+LAZY_ASSETS = ("css/aida_agent.css", "css/aida_leads.css", "js/aida_leads.js")
+
+# Boot config shared by every session of a site: site -> (settings version, config)
+_boot_configs = {}
+_asset_version = None
+
+def get_asset_version():
+    """
+    Content hash of the lazily loaded widget chunks. The widget appends it to
+    their URLs, so browsers can cache them for as long as /assets allows and
+    still fetch new ones after an update. Assets only change on deploy, which
+    restarts the workers, so it is computed once per process.
+    """
+    global _asset_version
+    if _asset_version is None:
+        digest = hashlib.md5()
+        for path in LAZY_ASSETS:
+            with open(frappe.get_app_path("aida_agent_app", "public", *path.split("/")), "rb") as f:
+                digest.update(f.read())
+        _asset_version = digest.hexdigest()[:10]
+    return _asset_version
+
+def get_boot_config():
+    """
+    Build the AIDA boot config once per settings version and share it
+    across all user sessions of the site.
+    """
+    site = frappe.local.site
+    version = get_settings_version()
+
+    cached = _boot_configs.get(site)
+    if cached and cached[0] == version:
+        return cached[1]
+
+    settings = get_settings_snapshot()
+    aida_config = {
+        'enabled': bool(settings.enable_onboarding or settings.enable_lead_creation),
+        'version': '1.0.0',
+        'widget_position': str(settings.widget_position),
+        'theme': str(settings.widget_theme),
+        'onboarding_enabled': bool(settings.enable_onboarding),
+        'lead_creation_enabled': bool(settings.enable_lead_creation),
+        # Path of the async gateway (e.g. "/aida-gateway"), set in site_config.json
+        'gateway_url': frappe.conf.get('aida_gateway_url') or '',
+        'asset_version': get_asset_version()
+    }
+
+    _boot_configs[site] = (version, aida_config)
+    return aida_config
 
 def boot_session(bootinfo):
     """
@@ -19,38 +73,19 @@ def boot_session(bootinfo):
                 'onboarding_enabled': True,
                 'lead_creation_enabled': True
             }
-            
-            # Use frappe.db.get_single_value to get individual values instead of the Document object
+
             try:
-                enabled = frappe.db.get_single_value('AIDA Agent Settings', 'enabled')
-                if enabled is not None:
-                    aida_config['enabled'] = bool(enabled)
-                    
-                widget_position = frappe.db.get_single_value('AIDA Agent Settings', 'widget_position')
-                if widget_position:
-                    aida_config['widget_position'] = str(widget_position)
-                    
-                theme = frappe.db.get_single_value('AIDA Agent Settings', 'theme')
-                if theme:
-                    aida_config['theme'] = str(theme)
-                    
-                onboarding_enabled = frappe.db.get_single_value('AIDA Agent Settings', 'onboarding_enabled')
-                if onboarding_enabled is not None:
-                    aida_config['onboarding_enabled'] = bool(onboarding_enabled)
-                    
-                lead_creation_enabled = frappe.db.get_single_value('AIDA Agent Settings', 'lead_creation_enabled')
-                if lead_creation_enabled is not None:
-                    aida_config['lead_creation_enabled'] = bool(lead_creation_enabled)
+                aida_config = get_boot_config()
             except Exception as settings_error:
                 # If settings don't exist or can't be retrieved, use defaults
                 frappe.log_error(f"Could not retrieve AIDA settings: {str(settings_error)}", "AIDA Settings Error")
-            
-            # Assign the clean config to bootinfo
-            bootinfo['aida_agent'] = aida_config
-                
+
+            # Assign a copy so one session can't mutate the shared config
+            bootinfo['aida_agent'] = dict(aida_config)
+
     except Exception as e:
         # Log error but don't break boot process
         try:
             frappe.log_error(f"AIDA Agent boot error: {str(e)}", "AIDA Agent Boot")
         except:
-            pass
\ No newline at end of file
+            pass
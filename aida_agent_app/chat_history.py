@@ -0,0 +1,85 @@
+import logging
+import frappe
+from frappe.utils import cint
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+MESSAGE_DOCTYPE = "AIDA Chat Message"
+HISTORY_QUEUE = "short"
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+HISTORY_FIELDS = ["name", "role", "message", "cached", "creation"]
+
+
+def queue_exchange(session_id, user_input, response_text, cached=False, user=None):
+    """
+    Save a question and its answer from a background job, after the current
+    transaction commits, so the chat reply isn't held up by the write.
+
+    Callers outside a request (the async gateway) pass the user; the job is
+    then queued straight away, as there is no transaction to wait for.
+    """
+    try:
+        frappe.enqueue(
+            "aida_agent_app.chat_history.record_exchange",
+            queue=HISTORY_QUEUE,
+            enqueue_after_commit=user is None,
+            user=user or frappe.session.user,
+            session_id=session_id,
+            user_input=user_input,
+            response_text=response_text,
+            cached=cached
+        )
+    except Exception as e:
+        # Losing a history entry must not fail the chat reply
+        logger.warning(f"Could not queue AIDA chat history: {str(e)}")
+
+
+def record_exchange(user, session_id, user_input, response_text, cached=False):
+    """
+    Store one exchange as two AIDA Chat Message rows, question first, so
+    ids follow the order of the conversation.
+    """
+    for role, message in (("user", user_input), ("bot", response_text)):
+        frappe.get_doc({
+            "doctype": MESSAGE_DOCTYPE,
+            "user": user,
+            "session_id": session_id,
+            "role": role,
+            "message": message,
+            "cached": 1 if cached and role == "bot" else 0
+        }).insert(ignore_permissions=True)
+
+
+def get_history(user, before=None, limit=DEFAULT_PAGE_SIZE):
+    """
+    A page of the user's messages, oldest first, ending just before the
+    message id `before` (or at the newest message).
+
+    Pages are fetched by id rather than by offset, so every page is a short
+    range scan on the (user, name) index however long the history is.
+    """
+    limit = min(max(cint(limit) or DEFAULT_PAGE_SIZE, 1), MAX_PAGE_SIZE)
+    filters = {"user": user}
+    if before:
+        filters["name"] = ["<", cint(before)]
+
+    rows = frappe.get_all(
+        MESSAGE_DOCTYPE,
+        filters=filters,
+        fields=HISTORY_FIELDS,
+        order_by="name desc",
+        limit_page_length=limit + 1
+    )
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    rows.reverse()
+    return {
+        "messages": rows,
+        "has_more": has_more,
+        "next_before": rows[0]["name"] if rows and has_more else None
+    }
@@ -0,0 +1,135 @@
+import time
+import random
+import hashlib
+import logging
+import frappe
+import requests
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+FAILURE_THRESHOLD = 5
+FAILURE_WINDOW = 60
+RESET_TIMEOUT = 30
+PROBE_TIMEOUT = 30
+
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 8
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+FAILURES_KEY = "aida_circuit_failures:{}"
+OPENED_KEY = "aida_circuit_opened:{}"
+PROBE_KEY = "aida_circuit_probe:{}"
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Raised without contacting the server while its circuit is open."""
+
+    def __init__(self, api_server_url, retry_after):
+        self.api_server_url = api_server_url
+        self.retry_after = retry_after
+        super().__init__(f"AIDA server {api_server_url} is unavailable, retry in {retry_after}s")
+
+
+def backoff_delay(attempt):
+    """
+    Exponential backoff with full jitter, so retrying workers don't hit the
+    server in lockstep.
+    """
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * (2 ** attempt)))
+
+
+def _keys(api_server_url):
+    circuit_id = hashlib.sha1(api_server_url.encode("utf-8")).hexdigest()[:12]
+    cache = frappe.cache()
+    return (
+        cache.make_key(FAILURES_KEY.format(circuit_id)),
+        cache.make_key(OPENED_KEY.format(circuit_id)),
+        cache.make_key(PROBE_KEY.format(circuit_id))
+    )
+
+
+def get_state(api_server_url):
+    """
+    Current circuit state for a server, shared by all workers through Redis.
+    """
+    _, opened_key, _ = _keys(api_server_url)
+    opened = frappe.cache().get(opened_key)
+    if not opened:
+        return CLOSED
+    if time.time() - float(opened) < RESET_TIMEOUT:
+        return OPEN
+    return HALF_OPEN
+
+
+def before_request(api_server_url):
+    """
+    Raise CircuitOpenError while the circuit is open. Once the reset timeout
+    has passed, a single worker is let through to probe the server.
+    """
+    _, opened_key, probe_key = _keys(api_server_url)
+    cache = frappe.cache()
+
+    opened = cache.get(opened_key)
+    if not opened:
+        return
+
+    elapsed = time.time() - float(opened)
+    if elapsed < RESET_TIMEOUT:
+        raise CircuitOpenError(api_server_url, max(1, int(RESET_TIMEOUT - elapsed)))
+
+    if not cache.set(probe_key, 1, nx=True, ex=PROBE_TIMEOUT):
+        raise CircuitOpenError(api_server_url, 1)
+
+
+def raise_if_open(api_server_url):
+    """
+    Raise CircuitOpenError while the circuit is open, without taking the
+    half-open probe. For requests that hand the upstream call on to a job.
+    """
+    _, opened_key, _ = _keys(api_server_url)
+    opened = frappe.cache().get(opened_key)
+    if not opened:
+        return
+
+    elapsed = time.time() - float(opened)
+    if elapsed < RESET_TIMEOUT:
+        raise CircuitOpenError(api_server_url, max(1, int(RESET_TIMEOUT - elapsed)))
+
+
+def record_success(api_server_url):
+    """
+    Close the circuit and reset the failure count.
+    """
+    frappe.cache().delete(*_keys(api_server_url))
+
+
+def record_failure(api_server_url):
+    """
+    Count a failure. The circuit opens after FAILURE_THRESHOLD failures
+    within FAILURE_WINDOW seconds, or straight away when a probe fails.
+    """
+    failures_key, opened_key, probe_key = _keys(api_server_url)
+    cache = frappe.cache()
+
+    opened = cache.get(opened_key)
+    if opened:
+        if time.time() - float(opened) < RESET_TIMEOUT:
+            # A call sent before the circuit opened; the open period isn't extended
+            return
+        # Half-open probe failed: start a new open period
+        cache.set(opened_key, time.time())
+        cache.delete(probe_key)
+        return
+
+    failures = cache.incr(failures_key)
+    if failures == 1:
+        cache.expire(failures_key, FAILURE_WINDOW)
+
+    if failures >= FAILURE_THRESHOLD:
+        cache.set(opened_key, time.time())
+        cache.delete(failures_key)
+        logger.warning(f"AIDA circuit opened for {api_server_url} after {failures} failures")
@@ -0,0 +1,42 @@
+import click
+from frappe.commands import get_site, pass_context
+
+
+@click.command("aida-gateway")
+@click.option("--host", default="127.0.0.1", help="Interface to listen on")
+@click.option("--port", default=9010, type=int, help="Port to listen on")
+@click.option("--max-connections", default=1000, type=int, help="Upstream connections to the AIDA server")
+@pass_context
+def aida_gateway(context, host, port, max_connections):
+    """
+    Serve AIDA chat traffic from a single asyncio process.
+    """
+    from aida_agent_app import gateway
+
+    gateway.serve(get_site(context), host=host, port=port, max_connections=max_connections)
+
+
+@click.command("aida-warm-up")
+@click.option("--questions", default=20, type=int, help="Most asked questions to pre-answer; 0 to skip")
+@click.option("--profiles", default=3, type=int, help="Role profiles to pre-answer them for")
+@pass_context
+def aida_warm_up(context, questions, profiles):
+    """
+    Build AIDA's lookup indexes, open connections to the AIDA servers and
+    pre-answer the most asked onboarding questions.
+    """
+    import frappe
+    from aida_agent_app import warmup
+
+    for site in context.sites:
+        try:
+            frappe.init(site=site)
+            frappe.connect()
+            report = warmup.warm_up(question_count=questions, profile_count=profiles)
+            frappe.db.commit()
+            click.echo(warmup.format_report(report))
+        finally:
+            frappe.destroy()
+
+
+commands = [aida_gateway, aida_warm_up]
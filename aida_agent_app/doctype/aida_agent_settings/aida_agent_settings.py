@@ -1,9 +1,11 @@
 # Copyright (c) 2024, AIDA AI and contributors
 # For license information, please see license.txt
 
+import time
 import frappe
 from frappe.model.document import Document
-import requests
+from aida_agent_app import health
+from aida_agent_app.settings import bump_settings_version
 
 class AidaAgentSettings(Document):
     def validate(self):
@@ -13,6 +15,23 @@ class AidaAgentSettings(Document):
         
         if self.erpnext_url and not self.erpnext_url.startswith(('http://', 'https://')):
             frappe.throw("ERPNext URL must start with http:// or https://")
+        
+        if self.connection_pool_size and not 1 <= self.connection_pool_size <= 100:
+            frappe.throw("Connection pool size must be between 1 and 100")
+        
+        if self.lead_batch_concurrency and not 1 <= self.lead_batch_concurrency <= 20:
+            frappe.throw("Lead batch concurrency must be between 1 and 20")
+        
+        for backend in self.get("backends") or []:
+            if not backend.url.startswith(('http://', 'https://')):
+                frappe.throw(f"Row {backend.idx}: AIDA server URL must start with http:// or https://")
+            if backend.weight is not None and backend.weight < 1:
+                frappe.throw(f"Row {backend.idx}: Weight must be at least 1")
+    
+    def on_update(self):
+        """Make every worker pick up the new settings once they are committed."""
+        # Bumping before commit would let another worker cache the old values under the new version
+        frappe.db.after_commit.add(bump_settings_version)
     
     def test_connection(self):
         """Test connection to AIDA API server."""
@@ -20,23 +39,43 @@ class AidaAgentSettings(Document):
             if not self.api_server_url:
                 frappe.throw("API Server URL is required")
             
-            response = requests.get(f"{self.api_server_url}/health", timeout=10)
+            server_urls = [
+                backend.url.rstrip("/") for backend in self.get("backends") or [] if backend.enabled and backend.url
+            ] or [self.api_server_url]
+            
+            # Uses the background prober's last results when there are recent ones
+            report = []
+            reachable = 0
+            for api_server_url in server_urls:
+                status = health.get_or_check(api_server_url, self.connection_pool_size)
+                checked_ago = max(int(time.time() - status["checked_at"]), 0)
+                
+                if status["status"] == health.UP:
+                    reachable += 1
+                    server_status = status["server_status"]
+                    report.append(
+                        f"<b>{api_server_url}</b>: connected<br>"
+                        f"Server Status: {server_status.get('status', 'Unknown')}<br>"
+                        f"Active Sessions: {server_status.get('active_sessions', 0)}<br>"
+                        f"MongoDB Available: {server_status.get('mongodb_available', False)}<br>"
+                        f"Latency: {status['latency_ms']} ms (checked {checked_ago}s ago)"
+                    )
+                else:
+                    report.append(
+                        f"<b>{api_server_url}</b>: connection failed: {status['error']} (checked {checked_ago}s ago)"
+                    )
+            
+            if not reachable:
+                frappe.throw("<br><br>".join(report))
             
-            if response.status_code == 200:
-                server_status = response.json()
-                frappe.msgprint(
-                    f"Connection successful!<br>"
-                    f"Server Status: {server_status.get('status', 'Unknown')}<br>"
-                    f"Active Sessions: {server_status.get('active_sessions', 0)}<br>"
-                    f"MongoDB Available: {server_status.get('mongodb_available', False)}",
-                    title="Connection Test Result",
-                    indicator="green"
-                )
-            else:
-                frappe.throw(f"Server returned status code: {response.status_code}")
+            frappe.msgprint(
+                "<br><br>".join(report),
+                title="Connection Test Result",
+                indicator="green" if reachable == len(server_urls) else "orange"
+            )
                 
-        except requests.exceptions.RequestException as e:
-            frappe.throw(f"Connection failed: {str(e)}")
+        except frappe.ValidationError:
+            raise
         except Exception as e:
             frappe.log_error(f"Error testing AIDA connection: {str(e)}", "AIDA Agent Connection Test")
             frappe.throw(f"Unexpected error: {str(e)}")
@@ -0,0 +1,12 @@
+# Copyright (c) 2024, AIDA AI and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+
+class AidaChatMessage(Document):
+    pass
+
+def on_doctype_update():
+    """History is read newest first per user, walking back by id."""
+    frappe.db.add_index("AIDA Chat Message", ["user", "name"])
@@ -0,0 +1,372 @@
+import json
+import logging
+import frappe
+from frappe.utils import get_url
+from aida_agent_app.answer_cache import normalize_question
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# term -> zset of DocType names scored by how strongly the term describes them
+TERM_KEY = "aida_doctype_index:{}"
+# All indexed terms, score 0, for prefix lookups by lex range
+TERMS_KEY = "aida_doctype_index_terms"
+# DocType name -> JSON of its module and terms, so an update can drop stale terms
+DOCS_KEY = "aida_doctype_index_docs"
+BUILT_KEY = "aida_doctype_index_built"
+# Set while a queued build is pending, so searches queue only one
+BUILDING_KEY = "aida_doctype_index_building"
+BUILD_JOB_TIMEOUT = 10 * 60
+
+NAME_WEIGHT = 8
+FIELD_WEIGHT = 2
+MODULE_WEIGHT = 1
+
+BUILD_BATCH_SIZE = 200
+MAX_PREFIX_TERMS = 20
+# Ranked DocTypes checked for read permission before a search gives up
+MAX_CANDIDATES = 200
+
+# Layout fields have labels such as "Details" or "More Info" that say nothing about the DocType
+NO_DATA_FIELDTYPES = ("Section Break", "Column Break", "Tab Break", "HTML", "Button", "Fold", "Heading")
+
+STOP_WORDS = {
+    "a", "an", "and", "the", "of", "to", "in", "on", "for", "by", "with", "my", "our", "i", "we", "me",
+    "how", "do", "does", "can", "where", "what", "is", "are", "find", "open", "show", "create", "new",
+    "make", "add", "list", "form", "doctype", "please"
+}
+
+
+def stem(token):
+    """
+    Singular form of a word, so "invoices" finds "Sales Invoice" and
+    "entries" finds "Stock Entry".
+    """
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 4 and token.endswith(("ches", "shes", "sses", "xes")):
+        return token[:-2]
+    if len(token) > 3 and token.endswith("s") and not token.endswith(("ss", "us", "is")):
+        return token[:-1]
+    return token
+
+
+def tokenize(text):
+    """
+    Normalized, stemmed words of a name, label or query, stop words removed.
+    """
+    return [stem(word) for word in normalize_question(text).split() if word not in STOP_WORDS]
+
+
+def _term_key(term):
+    return frappe.cache().make_key(TERM_KEY.format(term))
+
+
+def _keys():
+    cache = frappe.cache()
+    return cache.make_key(TERMS_KEY), cache.make_key(DOCS_KEY), cache.make_key(BUILT_KEY)
+
+
+def _decode(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def _read_doctypes(names=None):
+    """
+    {doctype: {"module", "issingle", "terms": {term: weight}}} for the
+    given DocTypes, or all of them, from DocType, DocField and Custom Field.
+    Child tables can't be opened on their own and are left out.
+    """
+    filters = {"istable": 0}
+    if names is not None:
+        filters["name"] = ["in", list(names)]
+
+    entries = {}
+    for row in frappe.get_all("DocType", filters=filters, fields=["name", "module", "issingle"]):
+        entries[row.name] = {"module": row.module, "issingle": row.issingle, "terms": {}}
+    if not entries:
+        return entries
+
+    def add(doctype, text, weight):
+        terms = entries[doctype]["terms"]
+        for term in tokenize(text):
+            if terms.get(term, 0) < weight:
+                terms[term] = weight
+
+    for name, entry in entries.items():
+        add(name, name, NAME_WEIGHT)
+        add(name, entry["module"], MODULE_WEIGHT)
+
+    field_filters = {"fieldtype": ["not in", NO_DATA_FIELDTYPES], "label": ["is", "set"]}
+    parent_filter = ["in", list(entries)] if names is not None else None
+    for doctype, parent_field in (("DocField", "parent"), ("Custom Field", "dt")):
+        filters = dict(field_filters)
+        if parent_filter:
+            filters[parent_field] = parent_filter
+        for row in frappe.get_all(doctype, filters=filters, fields=[f"{parent_field} as parent", "label"]):
+            if row.parent in entries:
+                add(row.parent, row.label, FIELD_WEIGHT)
+
+    return entries
+
+
+def _write(pipe, terms_key, docs_key, entries, previous):
+    """
+    Queue the index changes for entries, dropping terms the previous
+    version of each DocType had and the new one hasn't.
+    """
+    for name, entry in entries.items():
+        old_terms = previous.get(name, {}).get("terms", {})
+        for term in set(old_terms) - set(entry["terms"]):
+            pipe.zrem(_term_key(term), name)
+        for term, weight in entry["terms"].items():
+            pipe.zadd(_term_key(term), {name: weight})
+        if entry["terms"]:
+            pipe.zadd(terms_key, {term: 0 for term in entry["terms"]})
+        pipe.hset(docs_key, name, json.dumps(entry))
+
+
+def build_index():
+    """
+    Index every DocType from scratch. Runs after install and migrate, and
+    in the background after a search finds the index missing.
+    """
+    cache = frappe.cache()
+    terms_key, docs_key, built_key = _keys()
+
+    stale = [_term_key(_decode(term)) for term in cache.zrange(terms_key, 0, -1)]
+    for start in range(0, len(stale), 1000):
+        cache.delete(*stale[start:start + 1000])
+    cache.delete(terms_key, docs_key)
+
+    entries = _read_doctypes()
+    names = sorted(entries)
+    for start in range(0, len(names), BUILD_BATCH_SIZE):
+        batch = {name: entries[name] for name in names[start:start + BUILD_BATCH_SIZE]}
+        pipe = cache.pipeline(transaction=False)
+        _write(pipe, terms_key, docs_key, batch, {})
+        pipe.execute()
+
+    cache.set(built_key, 1)
+    logger.info(f"Built AIDA DocType index from {len(entries)} DocTypes")
+
+
+def ensure_index(background=True):
+    """
+    True when the index is built. Otherwise build it, or with background
+    queue one build across all workers and return False, so a user's search
+    never waits for a full build.
+    """
+    cache = frappe.cache()
+    if cache.get(_keys()[2]):
+        return True
+    if not background:
+        build_index()
+        return True
+
+    if cache.set(cache.make_key(BUILDING_KEY), 1, nx=True, ex=BUILD_JOB_TIMEOUT):
+        try:
+            frappe.enqueue(
+                "aida_agent_app.doctype_index.build_index",
+                queue="long",
+                timeout=BUILD_JOB_TIMEOUT
+            )
+        except Exception as e:
+            cache.delete(cache.make_key(BUILDING_KEY))
+            logger.warning(f"Could not queue the AIDA DocType index build: {str(e)}")
+    return False
+
+
+def indexed_count():
+    return frappe.cache().hlen(_keys()[1])
+
+
+def _previous(docs_key, names):
+    if not names:
+        return {}
+    values = frappe.cache().hmget(docs_key, names)
+    return {name: json.loads(value) for name, value in zip(names, values) if value}
+
+
+def update_doctypes(names):
+    """
+    Re-read the given DocTypes and update only their entries.
+    """
+    cache = frappe.cache()
+    terms_key, docs_key, built_key = _keys()
+    if not cache.get(built_key):
+        # Nothing to update; the next build reads these DocTypes from the tables
+        return
+
+    names = list(names)
+    previous = _previous(docs_key, names)
+    entries = _read_doctypes(names)
+
+    pipe = cache.pipeline(transaction=False)
+    _write(pipe, terms_key, docs_key, entries, previous)
+    # DocTypes that no longer exist, or became child tables
+    _drop(pipe, docs_key, set(names) - set(entries), previous)
+    pipe.execute()
+    # Terms with no DocTypes left stay in the terms list; prefix lookups skip them
+
+
+def _drop(pipe, docs_key, names, previous):
+    for name in names:
+        for term in previous.get(name, {}).get("terms", {}):
+            pipe.zrem(_term_key(term), name)
+        pipe.hdel(docs_key, name)
+
+
+def remove_doctypes(names):
+    """
+    Drop the given DocTypes from the index without reading the tables,
+    for DocTypes being deleted whose rows are still there.
+    """
+    cache = frappe.cache()
+    _terms_key, docs_key, built_key = _keys()
+    if not cache.get(built_key):
+        return
+
+    names = list(names)
+    pipe = cache.pipeline(transaction=False)
+    _drop(pipe, docs_key, names, _previous(docs_key, names))
+    pipe.execute()
+
+
+def on_doctype_update(doc, method=None):
+    _safe_update([doc.name])
+
+
+def on_doctype_trash(doc, method=None):
+    # on_trash runs before the row is deleted, so re-reading would index it again
+    try:
+        remove_doctypes([doc.name])
+    except Exception as e:
+        logger.warning(f"Could not remove {doc.name} from the AIDA DocType index: {str(e)}")
+
+
+def on_doctype_rename(doc, method=None, old=None, new=None, merge=False):
+    _safe_update([name for name in (old, new or doc.name) if name])
+
+
+def on_custom_field_change(doc, method=None):
+    if doc.dt:
+        _safe_update([doc.dt])
+
+
+def _safe_update(names):
+    try:
+        update_doctypes(names)
+    except Exception as e:
+        # Never block saving a DocType; a rebuild picks the change up
+        logger.warning(f"Could not update the AIDA DocType index for {', '.join(names)}: {str(e)}")
+
+
+def _query_terms(query):
+    """
+    Terms to look up: every word of the query, the last one also as a
+    prefix while the user is still typing it.
+    """
+    terms = tokenize(query)
+    if not terms:
+        return [], []
+
+    prefix = normalize_question(query).split()[-1]
+    if len(prefix) < 2 or prefix in STOP_WORDS:
+        return terms, []
+
+    terms_key = _keys()[0]
+    expansions = frappe.cache().zrangebylex(
+        terms_key, f"[{prefix}", f"[{prefix}\xff", start=0, num=MAX_PREFIX_TERMS
+    )
+    return terms, [term for term in map(_decode, expansions) if term not in terms]
+
+
+def _rank(terms, prefix_terms):
+    """
+    DocTypes ordered by how many query words they match, then by the
+    summed weight of the matches.
+    """
+    lookups = [(index, term) for index, term in enumerate(terms)]
+    # Prefix expansions all stand in for the last word
+    lookups += [(len(terms) - 1, term) for term in prefix_terms]
+
+    pipe = frappe.cache().pipeline(transaction=False)
+    for _index, term in lookups:
+        pipe.zrange(_term_key(term), 0, -1, withscores=True)
+
+    best = {}
+    for (index, _term), members in zip(lookups, pipe.execute()):
+        for name, weight in members:
+            word_weights = best.setdefault(_decode(name), {})
+            if word_weights.get(index, 0) < weight:
+                word_weights[index] = weight
+
+    return sorted(
+        best.items(),
+        key=lambda item: (-len(item[1]), -sum(item[1].values()), item[0])
+    )
+
+
+def _rank_names(terms):
+    """
+    DocTypes whose name contains the query words, read straight from the
+    DocType table and ranked like _rank, with their module and issingle.
+    """
+    rows = frappe.get_all(
+        "DocType",
+        filters={"istable": 0},
+        or_filters=[["name", "like", f"%{term}%"] for term in terms],
+        fields=["name", "module", "issingle"],
+        page_length=MAX_CANDIDATES
+    )
+    ranked = []
+    for row in rows:
+        name = row.name.lower()
+        word_weights = {index: NAME_WEIGHT for index, term in enumerate(terms) if term in name}
+        if word_weights:
+            ranked.append((row.name, word_weights))
+    ranked.sort(key=lambda item: (-len(item[1]), -sum(item[1].values()), item[0]))
+    return ranked, {row.name: {"module": row.module, "issingle": row.issingle} for row in rows}
+
+
+def search(query, limit=10, user=None):
+    """
+    DocTypes matching a free-text query that the user may read, best match
+    first, each with the desk route to open it. While the index is being
+    built, only DocType names are matched.
+    """
+    terms = tokenize(query)
+    if not terms:
+        return []
+
+    user = user or frappe.session.user
+    entries = None
+    if ensure_index():
+        ranked = _rank(*_query_terms(query))
+    else:
+        ranked, entries = _rank_names(terms)
+
+    results = []
+    for name, word_weights in ranked[:MAX_CANDIDATES]:
+        if not frappe.has_permission(name, "read", user=user):
+            continue
+        results.append((name, word_weights))
+        if len(results) >= limit:
+            break
+
+    if entries is None:
+        entries = _previous(_keys()[1], [name for name, _weights in results])
+    matches = []
+    for name, word_weights in results:
+        route = f"/app/{frappe.scrub(name).replace('_', '-')}"
+        matches.append({
+            "doctype": name,
+            "module": entries.get(name, {}).get("module"),
+            "issingle": entries.get(name, {}).get("issingle", 0),
+            "route": route,
+            "url": get_url(route),
+            "score": sum(word_weights.values()),
+            "matched_words": len(word_weights)
+        })
+    return matches
@@ -0,0 +1,476 @@
+import json
+import time
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import NamedTuple
+import frappe
+from frappe.sessions import get_expiry_in_seconds
+from frappe.utils import now, time_diff_in_seconds
+from aida_agent_app import (
+    api, admission, agent_sessions, answer_cache, backends, chat_history, circuit_breaker, health, metrics,
+    singleflight, wire
+)
+from aida_agent_app.circuit_breaker import CircuitOpenError
+from aida_agent_app.settings import get_settings_snapshot, get_settings_version
+
+try:
+    import aiohttp
+    from aiohttp import web
+except ImportError:
+    aiohttp = None
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+DEFAULT_PORT = 9010
+# Upstream connections shared by every in-flight request of the gateway
+MAX_CONNECTIONS = 1000
+MAX_BODY_SIZE = 64 * 1024
+
+# Same limit as the whitelisted chat methods, counted separately per user
+CHAT_RATE_LIMIT = 20
+RATE_WINDOW = 60
+RATE_KEY = "aida_gateway_rate:{}:{}"
+
+# How often the idle database connection is refreshed
+DB_REFRESH_INTERVAL = 60
+
+
+def get_session_user(sid, csrf_token=None):
+    """
+    The user of a live Frappe session, read from the session cache Frappe
+    keeps in Redis, or None when the session is unknown, expired or the
+    CSRF token doesn't match.
+
+    Sessions that are only in the database (e.g. after Redis was flushed)
+    are not found; the widget falls back to the whitelisted methods for them.
+    """
+    if not sid or sid == "Guest":
+        return None
+
+    data = frappe.cache().hget("session", sid)
+    if not data:
+        return None
+
+    session_data = data.get("data") or {}
+    user = session_data.get("user")
+    if not user or user == "Guest":
+        return None
+
+    last_updated = session_data.get("last_updated")
+    if not last_updated or \
+            time_diff_in_seconds(now(), last_updated) > get_expiry_in_seconds(session_data.get("session_expiry")):
+        return None
+
+    expected_token = session_data.get("csrf_token")
+    if expected_token and csrf_token != expected_token and not frappe.conf.ignore_csrf:
+        return None
+
+    return user
+
+
+def allow_request(user):
+    """
+    Fixed-window rate limit shared by every gateway process through Redis.
+    """
+    cache = frappe.cache()
+    key = cache.make_key(RATE_KEY.format(user, int(time.time() // RATE_WINDOW)))
+    count = cache.incr(key)
+    if count == 1:
+        cache.expire(key, RATE_WINDOW)
+    return count <= CHAT_RATE_LIMIT
+
+
+class UpstreamReply(NamedTuple):
+    """Fully read AIDA server response; shaped enough like a requests response for wire.decode."""
+    status_code: int
+    headers: object
+    content: bytes
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class AsyncUpstream:
+    """
+    Pooled async client for the AIDA server with the same circuit breaker,
+    retry and wire format handling as upstream.request.
+    """
+
+    def __init__(self, max_connections=MAX_CONNECTIONS):
+        self.max_connections = max_connections
+        self.session = None
+        # Identical calls in flight in this process share one upstream call
+        self._in_flight = {}
+
+    async def start(self):
+        connector = aiohttp.TCPConnector(limit=self.max_connections, limit_per_host=self.max_connections)
+        self.session = aiohttp.ClientSession(connector=connector)
+
+    async def close(self):
+        if self.session:
+            await self.session.close()
+
+    async def post(self, api_server_url, path, payload, timeout, retries=0, coalesce=False):
+        if not coalesce:
+            return await self._send(api_server_url, path, payload, timeout, retries)
+
+        key = singleflight.make_key("POST", api_server_url, path, None, payload, None)
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._send(api_server_url, path, payload, timeout, retries))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        # One caller going away must not cancel the call for the others
+        return await asyncio.shield(task)
+
+    async def _send(self, api_server_url, path, payload, timeout, retries):
+        kwargs = wire.prepare(api_server_url, {"json": payload})
+        circuit_breaker.before_request(api_server_url)
+
+        for attempt in range(retries + 1):
+            try:
+                async with self.session.post(
+                    f"{api_server_url}{path}",
+                    data=kwargs["data"],
+                    headers=kwargs["headers"],
+                    timeout=aiohttp.ClientTimeout(total=timeout)
+                ) as response:
+                    reply = UpstreamReply(response.status, response.headers, await response.read())
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                circuit_breaker.record_failure(api_server_url)
+                if attempt == retries or circuit_breaker.get_state(api_server_url) != circuit_breaker.CLOSED:
+                    raise
+                await asyncio.sleep(circuit_breaker.backoff_delay(attempt))
+                continue
+
+            wire.note_capabilities(api_server_url, reply.headers)
+            if reply.status_code >= 500:
+                circuit_breaker.record_failure(api_server_url)
+            else:
+                circuit_breaker.record_success(api_server_url)
+                health.record_up(api_server_url)
+            return reply
+
+
+class Gateway:
+    """
+    Serves the chat, init and clear calls of the widget from one event loop.
+
+    Requests are authenticated with the browser's Frappe session cookie and
+    answered with the same payloads as the whitelisted methods in api.py,
+    which stay available as the fallback path. Redis lookups run inline on
+    the loop; they are short next to the upstream wait the gateway exists for.
+    Anything that may query the database (settings, roles, permissions, the
+    intent router) runs on a single thread holding the gateway's connection,
+    so a slow query never stalls the loop. Chat and session init calls take
+    a bench-wide admission slot like the whitelisted methods.
+    """
+
+    def __init__(self, max_connections=MAX_CONNECTIONS, site=None, sites_path="."):
+        self.upstream = AsyncUpstream(max_connections)
+        self.in_flight = 0
+        self._settings_version = None
+        self.db_executor = ThreadPoolExecutor(
+            max_workers=1,
+            thread_name_prefix="aida-gateway-db",
+            initializer=self._connect_db,
+            initargs=(site, sites_path)
+        )
+
+    def create_app(self):
+        app = web.Application(client_max_size=MAX_BODY_SIZE)
+        app.router.add_get("/health", self.health)
+        app.router.add_post("/chat", self.chat)
+        app.router.add_post("/init_session", self.init_session)
+        app.router.add_post("/clear_session", self.clear_session)
+        app.on_startup.append(self._on_startup)
+        app.on_cleanup.append(self._on_cleanup)
+        return app
+
+    async def _on_startup(self, app):
+        await self.upstream.start()
+        app["db_refresh"] = asyncio.ensure_future(self._refresh_db())
+
+    async def _on_cleanup(self, app):
+        app["db_refresh"].cancel()
+        await self.upstream.close()
+        self.db_executor.shutdown(wait=False)
+
+    @staticmethod
+    def _connect_db(site, sites_path):
+        frappe.init(site=site, sites_path=sites_path)
+        frappe.connect()
+
+    async def _run_db(self, fn, *args, **kwargs):
+        """
+        Run fn on the database thread and wait for it without blocking the loop.
+        """
+        return await asyncio.get_running_loop().run_in_executor(self.db_executor, partial(fn, *args, **kwargs))
+
+    @staticmethod
+    def _refresh_connection():
+        try:
+            frappe.db.rollback()
+        except Exception as e:
+            logger.warning(f"AIDA gateway database connection lost, reconnecting: {str(e)}")
+            frappe.connect()
+
+    async def _refresh_db(self):
+        """
+        End the idle transaction now and then, so the connection stays open
+        and later reads don't see an old snapshot.
+        """
+        while True:
+            await asyncio.sleep(DB_REFRESH_INTERVAL)
+            await self._run_db(self._refresh_connection)
+
+    def _load_settings(self):
+        version = get_settings_version()
+        if version != self._settings_version:
+            # Reload from a fresh transaction rather than the connection's old snapshot
+            frappe.db.rollback()
+            self._settings_version = version
+        return get_settings_snapshot()
+
+    async def _settings(self):
+        return await self._run_db(self._load_settings)
+
+    async def _authenticate(self, request):
+        """
+        Returns (user, sid, body). Unauthenticated requests get a 401 the widget
+        answers by retrying through the whitelisted method.
+        """
+        sid = request.cookies.get("sid")
+        user = get_session_user(sid, request.headers.get("X-Frappe-CSRF-Token"))
+        if not user:
+            raise web.HTTPUnauthorized(
+                text=json.dumps({"success": False, "message": "Login required"}),
+                content_type="application/json"
+            )
+        try:
+            body = await request.json() if request.can_read_body else {}
+        except ValueError:
+            raise web.HTTPBadRequest(
+                text=json.dumps({"success": False, "message": "Invalid request body"}),
+                content_type="application/json"
+            )
+        return user, sid, body if isinstance(body, dict) else {}
+
+    async def _handle(self, endpoint, request, handler):
+        start_time = time.time()
+        self.in_flight += 1
+        stats = {"upstream": 0.0}
+        result = None
+        try:
+            user, sid, body = await self._authenticate(request)
+            result = await handler(user, sid, body, stats)
+            return web.json_response(result)
+        finally:
+            self.in_flight -= 1
+            if result is not None:
+                try:
+                    metrics.record(
+                        f"gateway_{endpoint}",
+                        time.time() - start_time,
+                        stats["upstream"],
+                        error=result.get("success") is False,
+                        cache_hit=bool(result.get("cached"))
+                    )
+                except Exception as e:
+                    logger.warning(f"Could not record AIDA metrics for gateway_{endpoint}: {str(e)}")
+
+    async def _post(self, stats, *args, **kwargs):
+        start_time = time.time()
+        try:
+            return await self.upstream.post(*args, **kwargs)
+        finally:
+            stats["upstream"] += time.time() - start_time
+
+    async def _admitted_post(self, user, stats, *args, **kwargs):
+        async with admission.async_slot(user):
+            return await self._post(stats, *args, **kwargs)
+
+    async def health(self, request):
+        return web.json_response({"status": "ok", "in_flight": self.in_flight})
+
+    async def chat(self, request):
+        return await self._handle("chat", request, self._chat)
+
+    async def init_session(self, request):
+        return await self._handle("init", request, self._init_session)
+
+    async def clear_session(self, request):
+        return await self._handle("clear", request, self._clear_session)
+
+    async def _chat(self, user, sid, body, stats):
+        if not allow_request(user):
+            return {"success": False, "message": "Too many requests. Please wait a minute and try again."}
+
+        session_id = body.get("session_id")
+        user_input, error = api._validate_chat_input(session_id, body.get("user_input"))
+        if error:
+            return error
+
+        routed = await self._run_db(api.route_locally, user_input, user)
+        if routed:
+            chat_history.queue_exchange(session_id, user_input, routed["response"], user=user)
+            return {"success": True, "response_data": routed, "routed": True}
+
+        settings = await self._settings()
+        answer_key = None
+        if settings.answer_cache_ttl:
+            # The key holds the user's roles, which may be read from the database
+            answer_key = await self._run_db(answer_cache.make_key, user_input, user=user)
+        if answer_key:
+            cached_answer = answer_cache.lookup(answer_key)
+            if cached_answer is not None:
+                chat_history.queue_exchange(
+                    session_id, user_input, cached_answer.get("response", ""), cached=True, user=user
+                )
+                return {"success": True, "response_data": cached_answer, "cached": True}
+
+        api_server_url = backends.for_session(session_id, backends.pool(settings.api_server_url, settings.backends))
+        down_status = health.known_down(api_server_url)
+        if down_status:
+            return health.down_response(down_status)
+
+        new_session = None
+        try:
+            response = await self._post_chat(stats, api_server_url, session_id, user_input, user)
+
+            # The AIDA server lost the session (e.g. it restarted): start a new one and resend once
+            if response.status_code != 200 and \
+                    agent_sessions.is_session_lost(response.status_code, wire.decode_error(response)):
+                agent_sessions.forget_session(user, sid, session_id=session_id)
+                backends.unpin(session_id, backends.pool(settings.api_server_url, settings.backends))
+                started = await self._init_session(user, sid, {"refresh": 1}, stats)
+                if not started["success"]:
+                    return started
+                new_session = started["session_data"]
+                session_id = new_session.get("session_id")
+                response = await self._post_chat(
+                    stats,
+                    backends.for_session(session_id, backends.pool(settings.api_server_url, settings.backends)),
+                    session_id,
+                    user_input,
+                    user
+                )
+        except CircuitOpenError as e:
+            return api._circuit_open_response(e)
+        except admission.AdmissionRejected as e:
+            return admission.busy_response(e)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.error(f"AIDA gateway chat failed for user {user}: {str(e)}")
+            return {"success": False, "message": "An error occurred while processing your request"}
+
+        if response.status_code != 200:
+            logger.warning(f"AIDA API returned status {response.status_code}")
+            error_data = wire.decode_error(response)
+            return {"success": False, "message": error_data.get("error", f"Chat failed: {response.status_code}")}
+
+        response_data = wire.decode(response)
+        if answer_key:
+            answer_cache.store(answer_key, response_data, settings.answer_cache_ttl)
+        chat_history.queue_exchange(session_id, user_input, response_data.get("response", ""), user=user)
+        result = {"success": True, "response_data": response_data}
+        if new_session:
+            result["session_data"] = new_session
+        return result
+
+    async def _post_chat(self, stats, api_server_url, session_id, user_input, user):
+        return await self._admitted_post(
+            user,
+            stats,
+            api_server_url,
+            "/chat",
+            api.build_chat_payload(session_id, user_input, user),
+            timeout=60,
+            retries=2,
+            coalesce=True
+        )
+
+    async def _init_session(self, user, sid, body, stats):
+        if not body.get("refresh"):
+            session_data = agent_sessions.get_session(user, sid)
+            if session_data:
+                return {"success": True, "session_data": session_data, "cached": True}
+
+        settings_data = (await self._settings()).as_dict()
+        pairs = backends.pool(settings_data["api_server_url"], settings_data["backends"])
+        api_server_url = backends.for_new_session(f"{user}:{sid}", pairs)
+        try:
+            response = await self._admitted_post(
+                user,
+                stats,
+                api_server_url,
+                "/init_session",
+                api.build_init_payload(settings_data, user, sid),
+                timeout=30,
+                retries=1,
+                coalesce=True
+            )
+        except CircuitOpenError as e:
+            return api._circuit_open_response(e)
+        except admission.AdmissionRejected as e:
+            return admission.busy_response(e)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            return {"success": False, "message": f"Failed to initialize session: {str(e) or type(e).__name__}"}
+
+        if response.status_code != 200:
+            error_data = wire.decode_error(response)
+            return {
+                "success": False,
+                "message": error_data.get("error", f"Failed to initialize session: {response.status_code}")
+            }
+
+        session_data = wire.decode(response)
+        backends.pin(session_data.get("session_id"), api_server_url, pairs)
+        agent_sessions.register_session(user, sid, session_data, api_server_url)
+        return {"success": True, "session_data": session_data}
+
+    async def _clear_session(self, user, sid, body, stats):
+        session_id = body.get("session_id")
+        settings = await self._settings()
+        pairs = backends.pool(settings.api_server_url, settings.backends)
+        try:
+            response = await self._post(
+                stats,
+                backends.for_session(session_id, pairs),
+                "/clear_session",
+                {"session_id": session_id},
+                timeout=10,
+                retries=1
+            )
+        except CircuitOpenError as e:
+            return api._circuit_open_response(e)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            return {"success": False, "message": f"Failed to clear session: {str(e) or type(e).__name__}"}
+
+        agent_sessions.forget_session(user, sid, session_id=session_id)
+        backends.unpin(session_id, pairs)
+        return {
+            "success": response.status_code == 200,
+            "message": "Session cleared" if response.status_code == 200 else "Failed to clear session"
+        }
+
+
+def serve(site, host="127.0.0.1", port=DEFAULT_PORT, max_connections=MAX_CONNECTIONS):
+    """
+    Run the gateway for one site until interrupted. Started by the
+    `bench --site <site> aida-gateway` command.
+    """
+    if aiohttp is None:
+        raise RuntimeError("The AIDA gateway needs aiohttp: pip install aida_agent_app[gateway]")
+
+    # The loop thread only needs the site's config and Redis; the database
+    # connection is opened on the gateway's database thread
+    frappe.init(site=site)
+    try:
+        app = Gateway(max_connections, site, frappe.local.sites_path).create_app()
+        logger.info(f"AIDA gateway for {site} listening on {host}:{port}")
+        web.run_app(app, host=host, port=port, access_log=None, print=None, backlog=2048)
+    finally:
+        frappe.destroy()
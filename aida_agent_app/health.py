@@ -0,0 +1,133 @@
+import time
+import hashlib
+import logging
+import frappe
+from aida_agent_app import upstream, wire
+from aida_agent_app.settings import get_settings_snapshot
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+STATUS_KEY = "aida_upstream_health:{}"
+RECHECK_KEY = "aida_upstream_recheck:{}"
+
+UP = "up"
+DOWN = "down"
+
+PROBE_TIMEOUT = 5
+# The prober runs every minute; a status it hasn't refreshed for this long is ignored
+STATUS_TTL = 3 * 60
+PROBE_INTERVAL = 60
+# Once a down status is this old, one request at a time is let through to see
+# whether the server is back, so recovery isn't only noticed by the prober
+RECHECK_AFTER = 30
+
+
+def _status_key(api_server_url):
+    return STATUS_KEY.format(hashlib.sha1(api_server_url.encode("utf-8")).hexdigest()[:12])
+
+
+def get_status(api_server_url):
+    """
+    Last probe result for a server, shared by all workers through Redis,
+    or None when it hasn't been probed recently.
+    """
+    # expires=True skips the per-request memo, so a fresh result is always read
+    return frappe.cache().get_value(_status_key(api_server_url), expires=True)
+
+
+def check(api_server_url, pool_size=None):
+    """
+    Probe /health now and store the result for every worker.
+    Any failure, including an open circuit, counts as down.
+    """
+    start_time = time.time()
+    status = {"status": DOWN, "latency_ms": None, "active_sessions": None, "server_status": {}, "error": None}
+    try:
+        # Workers checking at once after a deploy share one probe
+        response = upstream.get(api_server_url, "/health", pool_size=pool_size, coalesce=True, timeout=PROBE_TIMEOUT)
+        status["latency_ms"] = round((time.time() - start_time) * 1000, 1)
+
+        if response.status_code == 200:
+            server_status = wire.decode(response)
+            if not isinstance(server_status, dict):
+                server_status = {}
+            status.update(
+                status=UP,
+                active_sessions=server_status.get("active_sessions"),
+                server_status=server_status
+            )
+        else:
+            status["error"] = f"Server returned status code: {response.status_code}"
+    except Exception as e:
+        status["error"] = str(e) or type(e).__name__
+
+    status.update(api_server_url=api_server_url, checked_at=time.time())
+    frappe.cache().set_value(_status_key(api_server_url), status, expires_in_sec=STATUS_TTL)
+    return status
+
+
+def get_or_check(api_server_url, pool_size=None):
+    """
+    Recent probe result, probing now only when there is none.
+    """
+    return get_status(api_server_url) or check(api_server_url, pool_size)
+
+
+def down_response(status):
+    """
+    Immediate answer for a user request while the prober sees the server down.
+    """
+    age = max(int(time.time() - status.get("checked_at", 0)), 0)
+    return {
+        "success": False,
+        "message": f"AIDA server is currently unavailable (checked {age}s ago). Please try again shortly.",
+        "retry_after": max(PROBE_INTERVAL - age, 1)
+    }
+
+
+def known_down(api_server_url, recheck=True):
+    """
+    The stored status when the last probe found the server down, else None.
+    After RECHECK_AFTER seconds one caller per interval gets None and goes
+    to the server; if it answers, record_up clears the status. With
+    recheck=False that turn is only looked at, not taken, so routing can ask
+    without using up the turn of the request that actually goes out.
+    """
+    status = get_status(api_server_url)
+    if not status or status.get("status") != DOWN:
+        return None
+
+    if time.time() - status.get("checked_at", 0) >= RECHECK_AFTER:
+        cache = frappe.cache()
+        recheck_key = cache.make_key(RECHECK_KEY.format(_status_key(api_server_url)))
+        if not recheck:
+            if not cache.exists(recheck_key):
+                return None
+        elif cache.set(recheck_key, 1, nx=True, ex=RECHECK_AFTER):
+            return None
+    return status
+
+
+def record_up(api_server_url):
+    """
+    Called when the server answered a request: drop a stored down status so
+    requests aren't turned away until the next probe.
+    """
+    status = get_status(api_server_url)
+    if status and status.get("status") == DOWN:
+        frappe.cache().delete_value(_status_key(api_server_url))
+        logger.info(f"AIDA server {api_server_url} answered again, cleared its down status")
+
+
+def probe_upstream():
+    """
+    Scheduler job: refresh the health status of every configured AIDA server.
+    """
+    from aida_agent_app import backends
+
+    settings = get_settings_snapshot()
+    for api_server_url in backends.urls(settings.api_server_url, settings.backends):
+        status = check(api_server_url, settings.connection_pool_size)
+        if status["status"] == DOWN:
+            logger.warning(f"AIDA server {api_server_url} is down: {status['error']}")
@@ -12,12 +12,13 @@ app_license = "MIT"
 # ------------------
 
 # include js, css files in header of desk.html
-app_include_css = "/assets/aida_agent_app/css/aida_agent.css"
-app_include_js = "/assets/aida_agent_app/js/aida_agent.js"
+# Only the loader is included; it fetches the chat and lead panel chunks on first use
+app_include_css = "/assets/aida_agent_app/css/aida_loader.css"
+app_include_js = "/assets/aida_agent_app/js/aida_loader.js"
 
 # include js, css files in header of web template
-web_include_css = "/assets/aida_agent_app/css/aida_agent.css"
-web_include_js = "/assets/aida_agent_app/js/aida_agent.js"
+web_include_css = "/assets/aida_agent_app/css/aida_loader.css"
+web_include_js = "/assets/aida_agent_app/js/aida_loader.js"
 
 # include custom scss in every website theme (without file extension ".scss")
 # website_theme_scss = "aida_agent_app/public/scss/website"
@@ -67,6 +68,16 @@ web_include_js = "/assets/aida_agent_app/js/aida_agent.js"
 # before_install = "aida_agent_app.install.before_install"
 # after_install = "aida_agent_app.install.after_install"
 
+after_install = "aida_agent_app.doctype_index.build_index"
+
+# New DocTypes, reports and pages are synced on migrate
+after_migrate = [
+	"aida_agent_app.intent_router.invalidate",
+	"aida_agent_app.doctype_index.build_index",
+	# Warm caches and pre-answer common questions so the first hour after a deploy isn't slow
+	"aida_agent_app.warmup.enqueue_warm_up"
+]
+
 # Uninstallation
 # ------------
 
@@ -111,6 +122,39 @@ web_include_js = "/assets/aida_agent_app/js/aida_agent.js"
 #	}
 # }
 
+# Keep the AIDA lead index current and stop AIDA lead runs from inserting duplicates
+doc_events = {
+	"Lead": {
+		"before_insert": "aida_agent_app.lead_index.before_lead_insert",
+		"after_insert": "aida_agent_app.lead_index.after_lead_insert",
+		"on_trash": "aida_agent_app.lead_index.on_lead_trash"
+	},
+	# Changed DocTypes invalidate the local intent router's vocabulary and update
+	# their own entries in the DocType discovery index
+	"DocType": {
+		"on_update": ["aida_agent_app.intent_router.invalidate", "aida_agent_app.doctype_index.on_doctype_update"],
+		"on_trash": ["aida_agent_app.intent_router.invalidate", "aida_agent_app.doctype_index.on_doctype_trash"],
+		"after_rename": "aida_agent_app.doctype_index.on_doctype_rename"
+	},
+	"Custom Field": {
+		"on_update": "aida_agent_app.doctype_index.on_custom_field_change",
+		# after_delete, so the field is gone when its DocType is re-read
+		"after_delete": "aida_agent_app.doctype_index.on_custom_field_change"
+	},
+	"Report": {
+		"on_update": "aida_agent_app.intent_router.invalidate",
+		"on_trash": "aida_agent_app.intent_router.invalidate"
+	},
+	"Page": {
+		"on_update": "aida_agent_app.intent_router.invalidate",
+		"on_trash": "aida_agent_app.intent_router.invalidate"
+	},
+	"Workspace": {
+		"on_update": "aida_agent_app.intent_router.invalidate",
+		"on_trash": "aida_agent_app.intent_router.invalidate"
+	}
+}
+
 # Scheduled Tasks
 # ---------------
 
@@ -132,6 +176,15 @@ web_include_js = "/assets/aida_agent_app/js/aida_agent.js"
 #	],
 # }
 
+# Keep the cached AIDA server health status fresh for every worker
+scheduler_events = {
+	"cron": {
+		"* * * * *": [
+			"aida_agent_app.health.probe_upstream"
+		]
+	}
+}
+
 # Testing
 # -------
 
@@ -166,7 +219,11 @@ boot_session = "aida_agent_app.boot.boot_session"
 
 # Request Events
 # ----------------
-# before_request = ["aida_agent_app.utils.before_request"]
+before_request = ["aida_agent_app.upstream.warm_up_connections"]
+
+# Release the user's AIDA agent session on logout
+on_logout = "aida_agent_app.agent_sessions.on_logout"
+
 # after_request = ["aida_agent_app.utils.after_request"]
 
 # Job Events
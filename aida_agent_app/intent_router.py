@@ -0,0 +1,281 @@
+import re
+import logging
+import threading
+from typing import NamedTuple
+from urllib.parse import quote
+import frappe
+from frappe.utils import cint, get_url
+from aida_agent_app.answer_cache import normalize_question
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = "aida_intent_vocabulary_version"
+VOCABULARY_KEY = "aida_intent_vocabulary"
+
+DOCTYPE = "DocType"
+REPORT = "Report"
+PAGE = "Page"
+WORKSPACE = "Workspace"
+
+NAVIGATE = "navigate"
+NEW = "new"
+
+# Phrasings of "take me there" and "start a new one"; anything else goes to the agent
+PREFIX = r"(?:(?:please|pls|can you|could you|kindly) )?"
+NAVIGATE_VERBS = (
+    r"(?:open|show|show me|view|go to|goto|take me to|navigate to|bring up|find|"
+    r"where is|where are|where can i find|where do i find|how do i get to|how do i open)"
+)
+NEW_VERBS = r"(?:new|create|add|make|start)"
+ARTICLE = r"(?:the |my |all |a |an )?"
+KINDS = r"(?:list|form|page|report|workspace|doctype)"
+# Most messages are real questions; they are told apart without loading the vocabulary
+INTENT_START = re.compile(rf"^{PREFIX}(?:{NEW_VERBS}|{NAVIGATE_VERBS}) ")
+
+# Per-process vocabularies keyed by site: site -> (version, vocabulary, compiled pattern)
+_vocabularies = {}
+_lock = threading.Lock()
+
+
+class Target(NamedTuple):
+    """A place in the desk a phrase can send the user to."""
+    kind: str
+    name: str
+    label: str
+    issingle: int = 0
+    roles: tuple = ()
+
+
+def plural_forms(phrase):
+    """
+    The phrase and its English plural, so "open sales invoices" and
+    "where are the stock entries" match too.
+    """
+    if phrase.endswith("y") and not phrase.endswith(("ay", "ey", "oy", "uy")):
+        return (phrase, phrase[:-1] + "ies")
+    if phrase.endswith(("s", "x", "ch", "sh")):
+        return (phrase, phrase + "es")
+    return (phrase, phrase + "s")
+
+
+def _slug(name):
+    return frappe.scrub(name).replace("_", "-")
+
+
+def _has_role_map(parenttype):
+    roles = {}
+    for row in frappe.get_all("Has Role", filters={"parenttype": parenttype}, fields=["parent", "role"]):
+        roles.setdefault(row.parent, set()).add(row.role)
+    return roles
+
+
+def build_vocabulary():
+    """
+    Map each normalized name or label a user might type to the place it
+    opens: DocTypes, query reports, pages and workspaces, plus the labels
+    workspaces give their links and shortcuts.
+    """
+    vocabulary = {}
+
+    def add(phrase, target):
+        phrase = normalize_question(phrase)
+        if phrase:
+            for form in plural_forms(phrase):
+                # The first target for a phrase wins, DocTypes being added first
+                vocabulary.setdefault(form, target)
+
+    doctypes = {}
+    for row in frappe.get_all(DOCTYPE, filters={"istable": 0}, fields=["name", "issingle"]):
+        doctypes[row.name] = Target(DOCTYPE, row.name, row.name, issingle=cint(row.issingle))
+        add(row.name, doctypes[row.name])
+
+    report_roles = _has_role_map(REPORT)
+    reports = {}
+    for row in frappe.get_all(
+        REPORT, filters={"disabled": 0, "report_type": ["in", ["Script Report", "Query Report"]]}, fields=["name"]
+    ):
+        reports[row.name] = Target(REPORT, row.name, row.name, roles=tuple(report_roles.get(row.name, ())))
+        add(row.name, reports[row.name])
+
+    page_roles = _has_role_map(PAGE)
+    pages = {}
+    for row in frappe.get_all(PAGE, fields=["name", "title"]):
+        pages[row.name] = Target(PAGE, row.name, row.title or row.name, roles=tuple(page_roles.get(row.name, ())))
+        add(pages[row.name].label, pages[row.name])
+
+    workspace_roles = _has_role_map(WORKSPACE)
+    for row in frappe.get_all(WORKSPACE, fields=["name"]):
+        add(row.name, Target(WORKSPACE, row.name, row.name, roles=tuple(workspace_roles.get(row.name, ()))))
+
+    targets = {DOCTYPE: doctypes, REPORT: reports, PAGE: pages}
+    links = frappe.get_all(
+        "Workspace Link", filters={"type": "Link"}, fields=["label", "link_to", "link_type"]
+    ) + frappe.get_all(
+        "Workspace Shortcut", fields=["label", "link_to", "type as link_type"]
+    )
+    for row in links:
+        target = targets.get(row.link_type, {}).get(row.link_to)
+        if target and row.label:
+            add(row.label, target)
+
+    return vocabulary
+
+
+def _trie_pattern(phrases):
+    """
+    One regex alternation for all phrases, factored into a trie so shared
+    prefixes such as "sales " are only tried once.
+    """
+    trie = {}
+    for phrase in phrases:
+        node = trie
+        for char in phrase:
+            node = node.setdefault(char, {})
+        node[""] = True
+
+    def render(node):
+        end = node.pop("", False)
+        branches = [re.escape(char) + render(child) for char, child in sorted(node.items())]
+        node[""] = end
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 and len(branches[0]) == 1 else f"(?:{'|'.join(branches)})"
+        return f"(?:{body})?" if end else body
+
+    return render(trie)
+
+
+def compile_router(vocabulary):
+    """
+    Compile the navigation grammar around the vocabulary. A trailing "list"
+    or "form" is accepted.
+    """
+    targets = _trie_pattern(vocabulary)
+    return re.compile(
+        rf"^{PREFIX}(?:(?P<new>{NEW_VERBS}) (?:a |an )?(?:new )?|{NAVIGATE_VERBS} {ARTICLE})"
+        rf"(?P<target>{targets})(?: {KINDS})?(?: please)?$"
+    )
+
+
+def _version_key():
+    return frappe.cache().make_key(VERSION_KEY)
+
+
+def invalidate(doc=None, method=None):
+    """
+    doc_events and after_migrate hook: rebuild the vocabulary in every worker.
+    """
+    frappe.cache().incr(_version_key())
+
+
+def _load_vocabulary(version):
+    """
+    The vocabulary another worker (or the warm-up) built for this version,
+    else a fresh build, which is then shared through Redis.
+    """
+    shared = frappe.cache().get_value(VOCABULARY_KEY)
+    if shared and shared.get("version") == version:
+        try:
+            return {phrase: Target(*target) for phrase, target in shared["vocabulary"].items()}
+        except TypeError:
+            # Vocabulary written by an older release with different fields
+            pass
+
+    vocabulary = build_vocabulary()
+    frappe.cache().set_value(
+        VOCABULARY_KEY, {"version": version, "vocabulary": {phrase: tuple(target) for phrase, target in vocabulary.items()}}
+    )
+    return vocabulary
+
+
+def get_router():
+    """
+    The site's vocabulary and compiled pattern, rebuilt when a DocType,
+    report, page or workspace changes.
+
+    Held in process memory; the vocabulary is also shared through Redis, so
+    a new worker only compiles the pattern.
+    """
+    site = frappe.local.site
+    version = cint(frappe.cache().get(_version_key()))
+
+    cached = _vocabularies.get(site)
+    if cached and cached[0] == version:
+        return cached[1], cached[2]
+
+    with _lock:
+        cached = _vocabularies.get(site)
+        if cached and cached[0] == version:
+            return cached[1], cached[2]
+
+        vocabulary = _load_vocabulary(version)
+        pattern = compile_router(vocabulary)
+        _vocabularies[site] = (version, vocabulary, pattern)
+        logger.info(f"Compiled AIDA intent router with {len(vocabulary)} phrases for {site}")
+        return vocabulary, pattern
+
+
+def _is_permitted(target, intent, user):
+    if target.kind == DOCTYPE:
+        return frappe.has_permission(target.name, "create" if intent == NEW else "read", user=user)
+    # Reports, pages and workspaces without roles are open to every desk user
+    return not target.roles or bool(set(target.roles) & set(frappe.get_roles(user)))
+
+
+def _route(target, intent):
+    if target.kind == DOCTYPE:
+        if intent == NEW and not target.issingle:
+            return f"/app/{_slug(target.name)}/new"
+        return f"/app/{_slug(target.name)}"
+    if target.kind == REPORT:
+        return f"/app/query-report/{quote(target.name)}"
+    if target.kind == PAGE:
+        return f"/app/{target.name}"
+    return f"/app/{_slug(target.name)}"
+
+
+def route(user_input, user=None):
+    """
+    Answer a navigation or "open a new form" request locally.
+
+    Returns response data in the shape of an agent reply, with the route to
+    open, or None when the message should go to the agent.
+    """
+    text = normalize_question(user_input)
+    if not text or not INTENT_START.match(text):
+        return None
+
+    vocabulary, pattern = get_router()
+    match = pattern.match(text)
+    if not match:
+        return None
+
+    target = vocabulary.get(match.group("target"))
+    intent = NEW if match.group("new") else NAVIGATE
+    if not target or (intent == NEW and target.kind != DOCTYPE):
+        return None
+
+    user = user or frappe.session.user
+    if frappe.get_cached_value("User", user, "user_type") != "System User":
+        # Portal users have no desk to be sent to
+        return None
+    if not _is_permitted(target, intent, user):
+        # Let the agent explain what the user can and can't do
+        return None
+
+    path = _route(target, intent)
+    url = get_url(path)
+    if intent == NEW and not target.issingle:
+        response = f"You can create a new {target.label} here: {url}"
+    else:
+        response = f"You can open {target.label} here: {url}"
+
+    return {
+        "response": response,
+        "route": path,
+        "intent": intent,
+        "target": {"type": target.kind, "name": target.name},
+        # Answers depend on the user's permissions, so they are never shared
+        "cacheable": False
+    }
@@ -0,0 +1,288 @@
+import re
+import logging
+from urllib.parse import urlparse
+import frappe
+from frappe import _
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+INDEX_KEY = "aida_lead_index:{}"
+BUILT_KEY = "aida_lead_index_built"
+# Sets of a build in progress, renamed over INDEX_KEY when it completes
+BUILD_KEY = "aida_lead_index_build:{}:{}"
+ACTIVE_JOB_KEY = "aida_lead_job_active:{}"
+# Sent by the AIDA server with the REST Lead inserts it makes for a lead job
+JOB_HEADER = "X-AIDA-Lead-Job"
+SKIPPED_KEY = "aida_lead_job_skipped:{}"
+
+# Rebuilt daily so deleted or edited Leads drop out of the index
+INDEX_TTL = 24 * 60 * 60
+BUILD_PAGE_SIZE = 5000
+
+FIELDS = ("phone", "email_domain", "website", "company_name")
+LEAD_FIELDS = ("phone", "mobile_no", "email_id", "website", "company_name", "lead_name")
+
+# Shared mail providers say nothing about which business a lead is
+FREE_MAIL_DOMAINS = {
+    "gmail.com", "googlemail.com", "yahoo.com", "hotmail.com", "outlook.com", "live.com",
+    "icloud.com", "aol.com", "proton.me", "protonmail.com", "msn.com", "ymail.com"
+}
+COMPANY_SUFFIXES = re.compile(
+    r"\b(llc|l\.l\.c|inc|incorporated|ltd|limited|co|corp|corporation|company|plc|gmbh|pvt)\b\.?"
+)
+
+
+def normalize_phone(value):
+    digits = re.sub(r"\D", "", value or "")
+    # Compare national numbers so "+1 (555) 010-0000" matches "555-010-0000"
+    return digits[-10:] if len(digits) >= 7 else None
+
+
+def normalize_email_domain(value):
+    if not value or "@" not in value:
+        return None
+    domain = value.rsplit("@", 1)[1].strip().lower()
+    return None if not domain or domain in FREE_MAIL_DOMAINS else domain
+
+
+def normalize_website(value):
+    value = (value or "").strip().lower()
+    if not value:
+        return None
+    host = urlparse(value if "//" in value else f"//{value}").hostname or ""
+    host = host[4:] if host.startswith("www.") else host
+    return host or None
+
+
+def normalize_company_name(value):
+    value = (value or "").lower().replace("&", " and ")
+    value = COMPANY_SUFFIXES.sub(" ", value)
+    value = re.sub(r"[^a-z0-9]+", " ", value).strip()
+    return value or None
+
+
+def lead_keys(lead):
+    """
+    Normalised (field, value) pairs identifying a lead. Accepts a Lead
+    document or a plain dict, as sent by the AIDA server.
+    """
+    get = lead.get
+    keys = set()
+    for phone in (get("phone"), get("mobile_no")):
+        normalized = normalize_phone(phone)
+        if normalized:
+            keys.add(("phone", normalized))
+
+    for field, value in (
+        ("email_domain", normalize_email_domain(get("email_id") or get("email"))),
+        ("website", normalize_website(get("website"))),
+        ("company_name", normalize_company_name(get("company_name") or get("lead_name")))
+    ):
+        if value:
+            keys.add((field, value))
+    return keys
+
+
+def _index_key(field):
+    return frappe.cache().make_key(INDEX_KEY.format(field))
+
+
+def _build_key(build_id, field):
+    return frappe.cache().make_key(BUILD_KEY.format(build_id, field))
+
+
+def ensure_index():
+    """
+    Build the index from the Lead table when it is missing or expired. The
+    sets are filled under temporary keys and renamed over the live ones, so
+    duplicate checks keep using the old index until the new one is complete.
+    """
+    cache = frappe.cache()
+    built_key = cache.make_key(BUILT_KEY)
+    if cache.get(built_key):
+        return
+
+    build_id = frappe.generate_hash(length=10)
+    last_name = None
+    total = 0
+    while True:
+        # Page by name rather than offset so leads inserted meanwhile don't shift the pages
+        rows = frappe.get_all(
+            "Lead",
+            filters={"name": [">", last_name]} if last_name else None,
+            fields=["name", *LEAD_FIELDS],
+            order_by="name asc",
+            page_length=BUILD_PAGE_SIZE
+        )
+        pipe = cache.pipeline(transaction=False)
+        for row in rows:
+            for field, value in lead_keys(row):
+                pipe.sadd(_build_key(build_id, field), value)
+        for field in FIELDS:
+            # An abandoned build doesn't leave its sets behind
+            pipe.expire(_build_key(build_id, field), INDEX_TTL)
+        pipe.execute()
+
+        total += len(rows)
+        if len(rows) < BUILD_PAGE_SIZE:
+            break
+        last_name = rows[-1].name
+
+    pipe = cache.pipeline(transaction=False)
+    for field in FIELDS:
+        pipe.exists(_build_key(build_id, field))
+    filled = pipe.execute()
+
+    pipe = cache.pipeline(transaction=False)
+    for field, exists in zip(FIELDS, filled):
+        if exists:
+            pipe.rename(_build_key(build_id, field), _index_key(field))
+        else:
+            # Redis drops empty sets, so there is nothing to rename
+            pipe.delete(_index_key(field))
+    pipe.set(built_key, 1, ex=INDEX_TTL)
+    pipe.execute()
+    logger.info(f"Built AIDA lead index from {total} leads")
+
+
+def invalidate_index():
+    frappe.cache().delete(frappe.cache().make_key(BUILT_KEY))
+
+
+def _existing_keys(keys):
+    """
+    The subset of (field, value) pairs already in the index, in one round trip.
+    """
+    keys = sorted(keys)
+    if not keys:
+        return set()
+
+    cache = frappe.cache()
+    pipe = cache.pipeline(transaction=False)
+    for field, value in keys:
+        pipe.sismember(_index_key(field), value)
+    return {key for key, found in zip(keys, pipe.execute()) if found}
+
+
+def find_duplicate(lead):
+    """
+    Return the field an existing Lead shares with this one, or None.
+    """
+    existing = _existing_keys(lead_keys(lead))
+    return min(existing)[0] if existing else None
+
+
+def add_leads(leads):
+    cache = frappe.cache()
+    if not cache.get(cache.make_key(BUILT_KEY)):
+        # Nothing to update; the next build reads these leads from the table
+        return
+    pipe = cache.pipeline(transaction=False)
+    for lead in leads:
+        for field, value in lead_keys(lead):
+            pipe.sadd(_index_key(field), value)
+    pipe.execute()
+
+
+def add_lead(lead):
+    add_leads([lead])
+
+
+def filter_leads(leads):
+    """
+    Split leads into (new, duplicates), also catching repeats within the
+    list. The whole list is checked against the index in one round trip.
+    """
+    lead_key_sets = [lead_keys(lead) if isinstance(lead, dict) else set() for lead in leads]
+    existing = _existing_keys(set().union(*lead_key_sets))
+
+    new, duplicates = [], []
+    seen = set(existing)
+    for lead, keys in zip(leads, lead_key_sets):
+        if keys & seen:
+            duplicates.append(lead)
+        else:
+            new.append(lead)
+        seen |= keys
+    return new, duplicates
+
+
+def mark_job_active(user, job_id, timeout):
+    """
+    Turn the insert guard on for REST Lead inserts the AIDA server makes for
+    this job, on the user's behalf.
+    """
+    cache = frappe.cache()
+    cache.set(cache.make_key(ACTIVE_JOB_KEY.format(job_id)), user, ex=timeout)
+
+
+def mark_job_done(user, job_id):
+    frappe.cache().delete(frappe.cache().make_key(ACTIVE_JOB_KEY.format(job_id)))
+
+
+def pop_skipped(job_id):
+    """
+    Number of duplicate inserts the guard rejected for a job.
+    """
+    cache = frappe.cache()
+    key = cache.make_key(SKIPPED_KEY.format(job_id))
+    pipe = cache.pipeline()
+    pipe.get(key)
+    pipe.delete(key)
+    skipped, _deleted = pipe.execute()
+    return int(skipped or 0)
+
+
+def _job_user(job_id):
+    user = frappe.cache().get(frappe.cache().make_key(ACTIVE_JOB_KEY.format(job_id)))
+    if isinstance(user, bytes):
+        user = user.decode()
+    return user
+
+
+def _request_job():
+    """
+    The lead job a REST Lead insert was made for, from its JOB_HEADER, or None.
+    """
+    request = getattr(frappe.local, "request", None)
+    if not request or not request.path.startswith("/api/resource/Lead"):
+        return None
+    return request.headers.get(JOB_HEADER)
+
+
+def before_lead_insert(doc, method=None):
+    """
+    Lead before_insert hook: reject REST inserts of leads that already exist
+    when the AIDA server makes them for a running lead job of the same user,
+    so its Places results don't pile up as duplicates. Inserts without the
+    job header, from the desk or other integrations, are never blocked.
+    """
+    job_id = _request_job()
+    if not job_id or _job_user(job_id) != frappe.session.user:
+        return
+
+    match = find_duplicate(doc)
+    if match:
+        cache = frappe.cache()
+        key = cache.make_key(SKIPPED_KEY.format(job_id))
+        cache.incr(key)
+        cache.expire(key, INDEX_TTL)
+        frappe.throw(
+            _("Lead {0} already exists (matching {1})").format(doc.get("lead_name") or "", match.replace("_", " ")),
+            frappe.DuplicateEntryError
+        )
+
+
+def after_lead_insert(doc, method=None):
+    if frappe.flags.aida_bulk_lead_insert:
+        # Bulk inserts add the whole chunk to the index at once
+        return
+    try:
+        add_lead(doc)
+    except Exception as e:
+        logger.warning(f"Could not add lead {doc.name} to the AIDA lead index: {str(e)}")
+
+
+def on_lead_trash(doc, method=None):
+    invalidate_index()
@@ -0,0 +1,684 @@
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import frappe
+import requests
+from aida_agent_app import upstream, backends, circuit_breaker, metrics, lead_index, wire
+from aida_agent_app.settings import get_settings_snapshot
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+LEAD_QUEUE = "long"
+LEAD_JOB_TIMEOUT = 1800
+UPSTREAM_TIMEOUT = 120
+MAX_BATCH_QUERIES = 50
+DEFAULT_BATCH_CONCURRENCY = 4
+READ_CHUNK_SIZE = 64 * 1024
+# Where a /create_leads response may carry its leads (server created) or candidates (bulk insert mode)
+LEAD_PATHS = ("result.leads", "leads", "candidates")
+# Leads inserted and committed together in bulk insert mode
+LEAD_INSERT_CHUNK = 100
+# Lead chunks a batch's pool threads may have parsed ahead of the job's main thread, per thread
+BATCH_CHUNKS_AHEAD = 2
+# How often a pool thread waiting to hand over a chunk checks whether the job stopped
+BATCH_PUT_TIMEOUT = 0.5
+
+LEADS_EVENT = "leads"
+DONE_EVENT = "done"
+
+PROGRESS_EVENT = "aida_lead_progress"
+JOB_STATUS_TTL = 24 * 60 * 60
+
+STATUS_KEY = "aida_lead_job:{}"
+CANCEL_KEY = "aida_lead_job_cancel:{}"
+
+
+class LeadJobCancelled(Exception):
+    pass
+
+
+def get_job_status(job_id):
+    # expires=True reads Redis every time; the per-request memo would hide
+    # updates made by other workers while a job is running
+    return frappe.cache().get_value(STATUS_KEY.format(job_id), expires=True)
+
+
+def set_job_status(job_id, **values):
+    """
+    Merge values into the stored job status and return the result.
+    """
+    status = get_job_status(job_id) or {"job_id": job_id}
+    status.update(values)
+    status["updated_at"] = time.time()
+    frappe.cache().set_value(STATUS_KEY.format(job_id), status, expires_in_sec=JOB_STATUS_TTL)
+    return status
+
+
+def publish_progress(user, job_id, **values):
+    values["job_id"] = job_id
+    frappe.publish_realtime(PROGRESS_EVENT, values, user=user)
+
+
+def request_cancel(job_id):
+    frappe.cache().set_value(CANCEL_KEY.format(job_id), 1, expires_in_sec=JOB_STATUS_TTL)
+
+
+def is_cancelled(job_id):
+    return bool(frappe.cache().get_value(CANCEL_KEY.format(job_id), expires=True))
+
+
+def check_cancelled(job_id):
+    if is_cancelled(job_id):
+        raise LeadJobCancelled()
+
+
+def start_lead_job(business_type, location, count):
+    """
+    Queue a lead creation run on the long queue and return its job id.
+    """
+    user = frappe.session.user
+    _check_create_permission(user)
+    job_id = frappe.generate_hash(length=16)
+
+    set_job_status(
+        job_id,
+        status="queued",
+        user=user,
+        business_type=business_type,
+        location=location,
+        count=count
+    )
+
+    frappe.enqueue(
+        "aida_agent_app.leads.run_lead_job",
+        queue=LEAD_QUEUE,
+        timeout=LEAD_JOB_TIMEOUT,
+        job_name=f"aida_leads_{job_id}",
+        job_id=job_id,
+        business_type=business_type,
+        location=location,
+        count=count,
+        user=user,
+        sid=frappe.session.sid
+    )
+
+    return job_id
+
+
+def start_lead_batch_job(queries):
+    """
+    Queue a batch of (business_type, location, count) queries as one job and return its id.
+    """
+    user = frappe.session.user
+    _check_create_permission(user)
+    job_id = frappe.generate_hash(length=16)
+
+    set_job_status(job_id, status="queued", user=user, batch=True, total=len(queries))
+
+    frappe.enqueue(
+        "aida_agent_app.leads.run_lead_batch_job",
+        queue=LEAD_QUEUE,
+        timeout=LEAD_JOB_TIMEOUT,
+        job_name=f"aida_leads_{job_id}",
+        job_id=job_id,
+        queries=queries,
+        user=user,
+        sid=frappe.session.sid
+    )
+
+    return job_id
+
+
+def _iter_body(response, job_id=None):
+    """
+    The response body in chunks. With a job id, a cancel request aborts the
+    download between chunks without waiting for the whole payload.
+    """
+    for chunk in response.iter_content(chunk_size=READ_CHUNK_SIZE):
+        if job_id:
+            check_cancelled(job_id)
+        yield chunk
+
+
+def _lead_label(lead):
+    if isinstance(lead, dict):
+        return lead.get("lead_name") or lead.get("company_name") or lead.get("name") or ""
+    return str(lead)
+
+
+def _build_payload(settings, user, sid, business_type, location, count, job_id=None):
+    payload = {
+        "erpnext_url": settings.erpnext_url,
+        "username": user,
+        "password": sid,
+        "google_api_key": settings.google_api_key,
+        "business_type": business_type,
+        "location": location,
+        "count": count
+    }
+    if settings.bulk_insert_leads:
+        # The server only searches; it never needs the user's session
+        del payload["password"]
+        payload["return_candidates"] = True
+    elif job_id:
+        # The server must echo these on its Lead inserts; the duplicate guard only checks inserts
+        # carrying the header, so a server that drops them creates duplicates (see README)
+        payload["erpnext_headers"] = {lead_index.JOB_HEADER: job_id}
+    return payload
+
+
+# Lead field -> candidate keys the AIDA server may use for it
+CANDIDATE_FIELDS = {
+    "lead_name": ("lead_name", "name", "title"),
+    "company_name": ("company_name", "name", "title"),
+    "email_id": ("email_id", "email"),
+    "phone": ("phone", "phone_number"),
+    "mobile_no": ("mobile_no", "mobile"),
+    "website": ("website", "url"),
+    "city": ("city",),
+    "state": ("state",),
+    "country": ("country",)
+}
+
+
+# Keys of a lead or Places candidate that Lead fields, the duplicate check and
+# progress labels read; the rest (reviews, photos, opening hours...) is dropped
+# as soon as each lead is parsed
+COMPACT_KEYS = frozenset(key for keys in CANDIDATE_FIELDS.values() for key in keys)
+
+
+def compact_lead(lead):
+    if not isinstance(lead, dict):
+        return lead
+    return {key: value for key, value in lead.items() if key in COMPACT_KEYS and value}
+
+
+def _lead_chunks(stream):
+    """
+    Compact leads from a wire.DocumentStream, LEAD_INSERT_CHUNK at a time.
+    """
+    chunk = []
+    for _path, lead in stream:
+        chunk.append(compact_lead(lead))
+        if len(chunk) >= LEAD_INSERT_CHUNK:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _candidate_to_lead(candidate, meta):
+    lead = {"doctype": "Lead"}
+    for fieldname, keys in CANDIDATE_FIELDS.items():
+        if not meta.has_field(fieldname):
+            continue
+        value = next((candidate[key] for key in keys if candidate.get(key)), None)
+        if value:
+            lead[fieldname] = value
+    return lead
+
+
+def _check_create_permission(user):
+    """
+    Checked before a job is queued, so a user without access gets an error
+    instead of a failed job. The job's inserts then skip the check.
+    """
+    if not frappe.has_permission("Lead", "create", user=user):
+        raise frappe.PermissionError(f"User {user} is not allowed to create Leads")
+
+
+def _prepare_lead(candidate, meta):
+    """
+    Build a Lead and run what insert() runs before writing the row: defaults,
+    naming, timestamps, the before_insert/validate hooks and mandatory checks.
+    """
+    doc = frappe.new_doc("Lead")
+    doc.update(_candidate_to_lead(candidate, meta))
+    doc.flags.ignore_permissions = True
+    doc.flags.in_insert = True
+    doc.set_new_name()
+    doc.set_user_and_timestamp()
+    doc.run_method("before_insert")
+    doc.run_method("before_validate")
+    doc.run_method("validate")
+    doc._validate_mandatory()
+    doc.run_method("before_save")
+    return doc
+
+
+def _write_leads(docs):
+    """
+    Write prepared Leads with one multi-row INSERT.
+    """
+    rows = [doc.get_valid_dict(convert_dates_to_str=True) for doc in docs]
+    fields = list(rows[0])
+    frappe.db.bulk_insert("Lead", fields, [[row.get(field) for field in fields] for row in rows])
+
+
+def _after_write(doc):
+    doc.flags.in_insert = False
+    doc.run_method("after_insert")
+    doc.run_method("on_update")
+    doc.run_method("on_change")
+
+
+def insert_leads(job_id, user, candidates):
+    """
+    Insert candidate leads returned by the AIDA server, skipping ones that
+    already exist. Leads are written LEAD_INSERT_CHUNK at a time with one
+    multi-row insert and one commit per chunk, and the lead index is updated
+    once per chunk. A candidate that fails validation is left out on its own.
+    """
+    new, duplicates = lead_index.filter_leads([c for c in candidates if isinstance(c, dict)])
+    chunks = (new[start:start + LEAD_INSERT_CHUNK] for start in range(0, len(new), LEAD_INSERT_CHUNK))
+    result = _insert_chunks(job_id, user, chunks, len(new))
+    result["skipped_duplicates"] = len(duplicates)
+    return result
+
+
+def insert_streamed_leads(job_id, user, candidate_chunks, total):
+    """
+    Like insert_leads, for candidates still being parsed: each chunk is
+    checked and inserted as it arrives, so the whole list is never held.
+    The lead index already holds the leads of earlier chunks, so repeats
+    across chunks are caught too.
+    """
+    skipped = 0
+
+    def new_chunks():
+        nonlocal skipped
+        for chunk in candidate_chunks:
+            new, duplicates = lead_index.filter_leads([c for c in chunk if isinstance(c, dict)])
+            skipped += len(duplicates)
+            yield new
+
+    result = _insert_chunks(job_id, user, new_chunks(), total)
+    result["skipped_duplicates"] = skipped
+    return result
+
+
+def _insert_chunks(job_id, user, chunks, total):
+    """
+    Each chunk's Leads are validated one by one, written together with
+    frappe.db.bulk_insert and committed, then their after_insert and
+    on_update hooks run. No Version rows are written for them, as with
+    any insert of a new document.
+    """
+    meta = frappe.get_meta("Lead")
+    created = []
+    errors = []
+    failed = 0
+
+    def fail(candidate, e):
+        nonlocal failed
+        failed += 1
+        if len(errors) < 20:
+            errors.append(f"{_lead_label(candidate)}: {str(e)}")
+
+    frappe.flags.aida_bulk_lead_insert = True
+    try:
+        for chunk in chunks:
+            check_cancelled(job_id)
+            inserted = []
+            for candidate in chunk:
+                try:
+                    inserted.append(_prepare_lead(candidate, meta))
+                except Exception as e:
+                    fail(candidate, e)
+
+            if inserted:
+                frappe.db.savepoint("aida_lead_insert")
+                try:
+                    _write_leads(inserted)
+                except Exception as e:
+                    frappe.db.rollback(save_point="aida_lead_insert")
+                    for doc in inserted:
+                        fail(doc.as_dict(), e)
+                    inserted = []
+
+                for doc in inserted:
+                    try:
+                        _after_write(doc)
+                    except Exception as e:
+                        # The Lead is already written; only the hook's own work is lost
+                        logger.warning(f"AIDA lead job {job_id}: hooks failed for Lead {doc.name}: {str(e)}")
+
+            frappe.db.commit()
+            lead_index.add_leads(inserted)
+            created.extend(doc.name for doc in inserted)
+            publish_progress(
+                user, job_id, status="running", created=len(created), total=max(total, len(created)),
+                lead=_lead_label(inserted[-1].as_dict()) if inserted else ""
+            )
+    finally:
+        frappe.flags.aida_bulk_lead_insert = False
+
+    if failed:
+        logger.warning(f"AIDA lead job {job_id}: {failed} candidates could not be inserted")
+
+    return {
+        "created_count": len(created),
+        "created": created,
+        "failed_count": failed,
+        "errors": errors
+    }
+
+
+def _forward_leads(job_id, user, lead_chunks, total):
+    """
+    Pass the leads the AIDA server created on to the user a chunk at a time
+    and return how many there were.
+    """
+    forwarded = 0
+    for chunk in lead_chunks:
+        forwarded += len(chunk)
+        publish_progress(
+            user, job_id, status="running", created=forwarded, total=max(total, forwarded),
+            lead=_lead_label(chunk[-1]), leads=[_lead_label(lead) for lead in chunk]
+        )
+    return forwarded
+
+
+def _start_duplicate_guard(settings, user, job_id):
+    """
+    Make sure the lead index is built. When the AIDA server creates the
+    leads, have the Lead insert hook reject the duplicates it sends for this
+    job; in bulk insert mode the job filters candidates itself.
+    """
+    lead_index.ensure_index()
+    if not settings.bulk_insert_leads:
+        lead_index.mark_job_active(user, job_id, LEAD_JOB_TIMEOUT)
+
+
+def _run_query(session, api_server_url, payload, emit):
+    """
+    Run one /create_leads query, passing its compact leads to emit a chunk
+    at a time as they are parsed. Called from pool threads, so it only does
+    HTTP work and must not touch frappe.local.
+    """
+    start_time = time.time()
+    try:
+        with session.post(
+            f"{api_server_url}/create_leads",
+            timeout=UPSTREAM_TIMEOUT,
+            stream=True,
+            **wire.prepare(api_server_url, {"json": payload})
+        ) as response:
+            wire.note_capabilities(api_server_url, response.headers)
+            if response.status_code == 200:
+                stream = wire.DocumentStream(_iter_body(response), response.headers.get("content-type"), LEAD_PATHS)
+                for chunk in _lead_chunks(stream):
+                    emit(chunk)
+                return {
+                    "success": True,
+                    "result": stream.summary,
+                    "duration": time.time() - start_time
+                }
+
+            error_data = wire.decode_error(response)
+        return {
+            "success": False,
+            "message": error_data.get("error", f"Lead creation failed: {response.status_code}"),
+            "duration": time.time() - start_time,
+            "upstream_error": response.status_code >= 500
+        }
+    except (requests.exceptions.RequestException, ValueError) as e:
+        return {
+            "success": False,
+            "message": f"Lead creation failed: {str(e)}",
+            "duration": time.time() - start_time,
+            "upstream_error": isinstance(e, requests.exceptions.RequestException)
+        }
+
+
+def _put_event(events, stop, event):
+    """
+    Hand an event to the job's main thread, waiting while it catches up,
+    unless the job has stopped.
+    """
+    while not stop.is_set():
+        try:
+            events.put(event, timeout=BATCH_PUT_TIMEOUT)
+            return
+        except queue.Full:
+            continue
+    raise LeadJobCancelled()
+
+
+def _run_batch_query(events, stop, index, session, api_server_url, payload):
+    """
+    Pool thread: run a batch query, putting (index, LEADS_EVENT, chunk) on
+    events for each chunk of leads and (index, DONE_EVENT, result) at the end.
+    """
+    def emit(chunk):
+        _put_event(events, stop, (index, LEADS_EVENT, chunk))
+
+    start_time = time.time()
+    try:
+        result = _run_query(session, api_server_url, payload, emit)
+    except Exception as e:
+        result = {
+            "success": False,
+            "message": f"Lead creation failed: {str(e)}",
+            "duration": time.time() - start_time,
+            "upstream_error": False
+        }
+    _put_event(events, stop, (index, DONE_EVENT, result))
+
+
+def _merge_inserted(total, result):
+    """
+    Add the insert_streamed_leads result of one chunk to a query's totals.
+    """
+    if total is None:
+        return result
+    for key in ("created_count", "failed_count", "skipped_duplicates"):
+        total[key] += result[key]
+    total["created"].extend(result["created"])
+    total["errors"] = (total["errors"] + result["errors"])[:20]
+    return total
+
+
+def _created_count(result):
+    if not isinstance(result, dict):
+        return 0
+    inner = result.get("result")
+    if isinstance(inner, dict):
+        return inner.get("created_count") or 0
+    return result.get("created_count") or 0
+
+
+@metrics.instrument("create_leads_batch_job")
+def run_lead_batch_job(job_id, queries, user, sid):
+    """
+    Background job: fan a batch of lead queries out to the AIDA server on a
+    bounded thread pool and merge the per-query results.
+    """
+    start_time = time.time()
+    settings = get_settings_snapshot()
+    pairs = backends.pool(settings.api_server_url, settings.backends)
+    concurrency = min(settings.lead_batch_concurrency or DEFAULT_BATCH_CONCURRENCY, len(queries))
+    results = [None] * len(queries)
+    routes = [None] * len(queries)
+
+    try:
+        check_cancelled(job_id)
+        # Each query goes to the least busy server, counted until it finishes
+        for index in range(len(queries)):
+            routes[index] = backends.acquire(pairs)
+        for api_server_url in {route[0] for route in routes}:
+            circuit_breaker.before_request(api_server_url)
+        set_job_status(job_id, status="running", started_at=start_time)
+        publish_progress(user, job_id, status="running", completed=0, total=len(queries))
+        _start_duplicate_guard(settings, user, job_id)
+
+        # Pool threads hand their leads over a chunk at a time; inserts and
+        # progress run here, where the site context is
+        events = queue.Queue(maxsize=concurrency * BATCH_CHUNKS_AHEAD)
+        stop = threading.Event()
+        lead_counts = [0] * len(queries)
+        inserted = [None] * len(queries)
+
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="aida-leads") as executor:
+            futures = []
+            try:
+                for index, query in enumerate(queries):
+                    futures.append(executor.submit(
+                        _run_batch_query,
+                        events,
+                        stop,
+                        index,
+                        upstream.get_session(routes[index][0], settings.connection_pool_size),
+                        routes[index][0],
+                        _build_payload(settings, user, sid, *query, job_id=job_id)
+                    ))
+
+                completed = 0
+                while completed < len(queries):
+                    index, event, value = events.get()
+                    business_type, location, count = queries[index]
+
+                    if event == LEADS_EVENT:
+                        lead_counts[index] += len(value)
+                        if settings.bulk_insert_leads:
+                            inserted[index] = _merge_inserted(
+                                inserted[index], insert_streamed_leads(job_id, user, [value], count)
+                            )
+                        continue
+
+                    api_server_url = routes[index][0]
+                    backends.release(routes[index])
+                    routes[index] = None
+                    results[index] = dict(value, business_type=business_type, location=location, count=count)
+                    completed += 1
+
+                    if settings.bulk_insert_leads:
+                        # Leads of a query that broke off part way are still reported
+                        if results[index]["success"] or inserted[index]:
+                            results[index]["result"] = inserted[index] or {
+                                "created_count": 0, "created": [], "failed_count": 0, "errors": [], "skipped_duplicates": 0
+                            }
+                    elif isinstance(results[index].get("result"), dict):
+                        results[index]["result"]["lead_count"] = lead_counts[index]
+
+                    # Pool threads have no site context, so the circuit is updated from here
+                    if results[index].pop("upstream_error", False):
+                        circuit_breaker.record_failure(api_server_url)
+                    else:
+                        circuit_breaker.record_success(api_server_url)
+                    publish_progress(
+                        user, job_id, status="running", completed=completed, total=len(queries),
+                        query=f"{business_type} in {location}", duration=results[index]["duration"]
+                    )
+
+                    if is_cancelled(job_id):
+                        raise LeadJobCancelled()
+            finally:
+                # Queries not started are dropped; running ones stop at their next chunk
+                stop.set()
+                for future in futures:
+                    future.cancel()
+
+        duration = time.time() - start_time
+        result = {
+            "queries": results,
+            "created_count": sum(_created_count(r.get("result")) for r in results),
+            "failed_count": sum(1 for r in results if not r["success"]),
+            "skipped_duplicates": lead_index.pop_skipped(job_id) + sum(
+                r["result"].get("skipped_duplicates", 0)
+                for r in results if isinstance(r.get("result"), dict)
+            ),
+            "duration": duration,
+            "slowest_query_duration": max(r["duration"] for r in results)
+        }
+        logger.info(f"AIDA lead batch {job_id} with {len(queries)} queries completed in {duration:.2f}s")
+        set_job_status(job_id, status="completed", result=result, duration=duration)
+        publish_progress(user, job_id, status="completed", result=result)
+
+    except LeadJobCancelled:
+        set_job_status(job_id, status="cancelled", result={"queries": [r for r in results if r]})
+        publish_progress(user, job_id, status="cancelled")
+    except requests.exceptions.RequestException as e:
+        message = f"Lead creation failed: {str(e)}"
+        set_job_status(job_id, status="failed", message=message)
+        publish_progress(user, job_id, status="failed", message=message)
+    except Exception as e:
+        frappe.log_error(f"Error creating leads: {str(e)}", "AIDA Lead Creation")
+        message = f"Lead creation failed: {str(e)}"
+        set_job_status(job_id, status="failed", message=message)
+        publish_progress(user, job_id, status="failed", message=message)
+    finally:
+        for route in routes:
+            if route:
+                backends.release(route)
+        lead_index.mark_job_done(user, job_id)
+
+
+@metrics.instrument("create_leads_job")
+def run_lead_job(job_id, business_type, location, count, user, sid):
+    """
+    Background job: run one /create_leads request and report progress to the user.
+    """
+    start_time = time.time()
+    settings = get_settings_snapshot()
+    route = None
+
+    try:
+        check_cancelled(job_id)
+        route = backends.acquire(backends.pool(settings.api_server_url, settings.backends))
+        set_job_status(job_id, status="running", started_at=start_time)
+        publish_progress(user, job_id, status="running", created=0, total=count)
+        _start_duplicate_guard(settings, user, job_id)
+
+        payload = _build_payload(settings, user, sid, business_type, location, count, job_id)
+
+        with upstream.post(
+            route[0],
+            "/create_leads",
+            pool_size=settings.connection_pool_size,
+            json=payload,
+            timeout=UPSTREAM_TIMEOUT,
+            stream=True
+        ) as response:
+            content_type = response.headers.get('content-type')
+            if response.status_code != 200:
+                body = b"".join(_iter_body(response, job_id))
+                error_data = wire.loads(body, content_type) if wire.is_structured(content_type) else {}
+                message = error_data.get("error", f"Lead creation failed: {response.status_code}")
+                set_job_status(job_id, status="failed", message=message)
+                publish_progress(user, job_id, status="failed", message=message)
+                return
+
+            # Leads are parsed, compacted and handled a chunk at a time while the body downloads
+            stream = wire.DocumentStream(_iter_body(response, job_id), content_type, LEAD_PATHS)
+            if settings.bulk_insert_leads:
+                result = insert_streamed_leads(job_id, user, _lead_chunks(stream), count)
+            else:
+                lead_count = _forward_leads(job_id, user, _lead_chunks(stream), count)
+                result = stream.summary if isinstance(stream.summary, dict) else {}
+                result.update(lead_count=lead_count, skipped_duplicates=lead_index.pop_skipped(job_id))
+
+        duration = time.time() - start_time
+        logger.info(f"AIDA lead job {job_id} completed in {duration:.2f}s for user {user}")
+        set_job_status(job_id, status="completed", result=result, duration=duration)
+        publish_progress(user, job_id, status="completed", result=result)
+
+    except LeadJobCancelled:
+        set_job_status(job_id, status="cancelled")
+        publish_progress(user, job_id, status="cancelled")
+    except requests.exceptions.RequestException as e:
+        message = f"Lead creation failed: {str(e)}"
+        set_job_status(job_id, status="failed", message=message)
+        publish_progress(user, job_id, status="failed", message=message)
+    except Exception as e:
+        frappe.log_error(f"Error creating leads: {str(e)}", "AIDA Lead Creation")
+        message = f"Lead creation failed: {str(e)}"
+        set_job_status(job_id, status="failed", message=message)
+        publish_progress(user, job_id, status="failed", message=message)
+    finally:
+        if route:
+            backends.release(route)
+        lead_index.mark_job_done(user, job_id)
@@ -0,0 +1,164 @@
+import time
+import functools
+import logging
+import frappe
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+METRICS_KEY = "aida_metrics"
+
+# Histogram bucket upper bounds in seconds
+BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+PHASES = ("total", "upstream", "local")
+COUNTERS = ("requests", "errors", "retries", "timeouts", "cache_hits")
+
+
+def _bucket_index(seconds):
+    for index, bound in enumerate(BUCKETS):
+        if seconds <= bound:
+            return index
+    return len(BUCKETS)
+
+
+def _call_stats():
+    """
+    Per-call upstream statistics collected by upstream.request.
+    """
+    stats = getattr(frappe.local, "aida_call_stats", None)
+    if stats is None:
+        stats = {"upstream": 0.0, "retries": 0, "timeouts": 0}
+        frappe.local.aida_call_stats = stats
+    return stats
+
+
+def record_upstream(seconds, retries=0, timeouts=0):
+    """
+    Called by upstream.request for every call made to the AIDA server.
+    """
+    stats = _call_stats()
+    stats["upstream"] += seconds
+    stats["retries"] += retries
+    stats["timeouts"] += timeouts
+
+
+def record(endpoint, total, upstream, retries=0, timeouts=0, error=False, cache_hit=False):
+    """
+    Add one observation for an endpoint. All workers write to the same Redis
+    hash, so the metrics are aggregated across the bench.
+    """
+    cache = frappe.cache()
+    key = cache.make_key(METRICS_KEY)
+    durations = {"total": total, "upstream": upstream, "local": max(total - upstream, 0)}
+
+    pipe = cache.pipeline(transaction=False)
+    for phase, seconds in durations.items():
+        pipe.hincrby(key, f"{endpoint}|{phase}|{_bucket_index(seconds)}", 1)
+        pipe.hincrbyfloat(key, f"{endpoint}|{phase}|sum", seconds)
+    pipe.hincrby(key, f"{endpoint}|requests", 1)
+    if error:
+        pipe.hincrby(key, f"{endpoint}|errors", 1)
+    if retries:
+        pipe.hincrby(key, f"{endpoint}|retries", retries)
+    if timeouts:
+        pipe.hincrby(key, f"{endpoint}|timeouts", timeouts)
+    if cache_hit:
+        pipe.hincrby(key, f"{endpoint}|cache_hits", 1)
+    pipe.execute()
+
+
+def instrument(endpoint):
+    """
+    Decorator recording latency, split into upstream and local time, plus
+    error, retry, timeout and cache-hit counts for an AIDA endpoint.
+    A result with success False counts as an error.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            frappe.local.aida_call_stats = None
+            start_time = time.time()
+            result = None
+            error = True
+            try:
+                result = fn(*args, **kwargs)
+                error = isinstance(result, dict) and result.get("success") is False
+                return result
+            finally:
+                try:
+                    stats = _call_stats()
+                    record(
+                        endpoint,
+                        time.time() - start_time,
+                        stats["upstream"],
+                        retries=stats["retries"],
+                        timeouts=stats["timeouts"],
+                        error=error,
+                        cache_hit=isinstance(result, dict) and bool(result.get("cached"))
+                    )
+                except Exception as e:
+                    logger.warning(f"Could not record AIDA metrics for {endpoint}: {str(e)}")
+        return wrapper
+    return decorator
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"')
+
+
+def render_prometheus(extra_gauges=None):
+    """
+    Render the aggregated metrics in the Prometheus text exposition format.
+    """
+    # Raw HGETALL: the wrapped hgetall would try to unpickle the counters
+    cache = frappe.cache()
+    raw = cache.execute_command("HGETALL", cache.make_key(METRICS_KEY))
+    values = {}
+    for field, value in _pairs(raw):
+        values[field] = float(value)
+
+    endpoints = sorted({field.split("|", 1)[0] for field in values})
+    lines = [
+        "# HELP aida_request_duration_seconds Latency of AIDA endpoints by phase (total, upstream, local).",
+        "# TYPE aida_request_duration_seconds histogram"
+    ]
+    for endpoint in endpoints:
+        for phase in PHASES:
+            labels = f'endpoint="{_escape(endpoint)}",phase="{phase}"'
+            cumulative = 0
+            for index, bound in enumerate(BUCKETS):
+                cumulative += values.get(f"{endpoint}|{phase}|{index}", 0)
+                lines.append(f'aida_request_duration_seconds_bucket{{{labels},le="{bound}"}} {int(cumulative)}')
+            cumulative += values.get(f"{endpoint}|{phase}|{len(BUCKETS)}", 0)
+            lines.append(f'aida_request_duration_seconds_bucket{{{labels},le="+Inf"}} {int(cumulative)}')
+            lines.append(f'aida_request_duration_seconds_sum{{{labels}}} {values.get(f"{endpoint}|{phase}|sum", 0)}')
+            lines.append(f'aida_request_duration_seconds_count{{{labels}}} {int(cumulative)}')
+
+    for counter in COUNTERS:
+        lines.append(f"# TYPE aida_{counter}_total counter")
+        for endpoint in endpoints:
+            lines.append(
+                f'aida_{counter}_total{{endpoint="{_escape(endpoint)}"}} {int(values.get(f"{endpoint}|{counter}", 0))}'
+            )
+
+    for name, (help_text, samples) in (extra_gauges or {}).items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} gauge")
+        for labels, value in samples:
+            label_text = ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+            lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+
+    return "\n".join(lines) + "\n"
+
+
+def _pairs(raw):
+    if isinstance(raw, dict):
+        items = raw.items()
+    else:
+        items = zip(raw[::2], raw[1::2])
+    for field, value in items:
+        yield (field.decode() if isinstance(field, bytes) else field), value
+
+
+def reset():
+    frappe.cache().delete(frappe.cache().make_key(METRICS_KEY))
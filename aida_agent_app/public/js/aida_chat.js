@@ -0,0 +1,765 @@
+// AIDA Agent chat widget, loaded by aida_loader.js when the chat is first used.
+// Fetches the settings, builds the chat window around the loader's button and loads the other chunks.
+
+class AidaAgent {
+    constructor() {
+        this.sessionId = null;
+        this.isInitialized = false;
+        this.settings = {};
+        this.isLoading = false;
+        this.messageHistory = [];
+        this.messageCache = new Map();
+        this.retryCount = 0;
+        this.maxRetries = 3;
+        this.debounceTimer = null;
+        this.debounceDelay = 300;
+        this.streams = new Map();
+        this.streamTimeout = 90000;
+        this.leadJobId = null;
+        this.leadPollTimer = null;
+        this.leadPollInterval = 3000;
+        this.historyBefore = null;
+        this.hasMoreHistory = true;
+        this.historyLoaded = false;
+        this.historyLoading = false;
+        this.historyPageSize = 20;
+        this.gatewayUrl = (typeof frappe !== 'undefined' && frappe.boot?.aida_agent?.gateway_url) || '';
+        
+        this.sessionReady = null;
+        
+        this.ready = this.init();
+    }
+    
+    async init() {
+        try {
+            // Load settings
+            await this.loadSettings();
+            
+            // Create widget
+            this.createWidget();
+            
+            // Listen for streamed replies
+            this.setupRealtime();
+            
+            // Initialize session; the chat can open while this is in flight
+            this.sessionReady = this.initSession();
+            
+            console.log('AIDA Agent initialized successfully');
+        } catch (error) {
+            console.error('Failed to initialize AIDA Agent:', error);
+        }
+    }
+    
+    async loadSettings() {
+        try {
+            const response = await frappe.call({
+                method: 'aida_agent_app.aida_agent_app.api.get_settings'
+            });
+            
+            if (response.message && response.message.success) {
+                this.settings = response.message.settings;
+            } else {
+                throw new Error('Failed to load settings');
+            }
+        } catch (error) {
+            console.error('Error loading settings:', error);
+            // Use default settings
+            this.settings = {
+                api_server_url: 'http://localhost:5000',
+                erpnext_url: window.location.origin,
+                enable_onboarding: 1,
+                enable_lead_creation: 1,
+                widget_position: 'bottom-right',
+                widget_theme: 'light'
+            };
+        }
+    }
+    
+    createWidget() {
+        // The loader has already rendered the widget container and the chat button
+        const widget = document.getElementById('aida-chat-widget');
+        widget.className = `aida-chat-widget ${this.settings.widget_position} ${this.settings.widget_theme}`;
+        
+        // Create chat window HTML
+        const windowHTML = `
+            <div class="aida-chat-window" id="aida-chat-window">
+                <div class="aida-chat-header">
+                    <h3>AIDA AI Assistant</h3>
+                    <button class="close-btn" id="aida-chat-close">
+                        <i class="fa fa-times"></i>
+                    </button>
+                </div>
+                
+                <div class="aida-chat-messages" id="aida-chat-messages">
+                    <div class="aida-message bot">
+                        <div class="aida-message-content">
+                            Hello! I'm AIDA, your AI assistant. I can help you with:
+                            <br>• Creating and managing ERPNext records
+                            <br>• Step-by-step guidance for any task
+                            <br>• Lead generation and outreach
+                            <br><br>How can I assist you today?
+                        </div>
+                    </div>
+                    <div id="aida-chat-history"></div>
+                </div>
+                
+                <div class="aida-chat-input">
+                    <input type="text" id="aida-message-input" placeholder="Type your message..." maxlength="2000">
+                    <button id="aida-send-button">
+                        <i class="fa fa-paper-plane"></i>
+                    </button>
+                </div>
+            </div>
+        `;
+        
+        // Add chat window to the widget
+        widget.insertAdjacentHTML('beforeend', windowHTML);
+        
+        // Add event listeners
+        this.addEventListeners();
+    }
+    
+    addEventListeners() {
+        // The chat toggle is bound by the loader
+        
+        // Chat close
+        document.getElementById('aida-chat-close').addEventListener('click', () => {
+            this.closeChat();
+        });
+        
+        // Load older messages when scrolled to the top
+        document.getElementById('aida-chat-messages').addEventListener('scroll', (e) => {
+            if (e.target.scrollTop < 40) {
+                this.loadHistory();
+            }
+        });
+        
+        // Send message
+        document.getElementById('aida-send-button').addEventListener('click', () => {
+            this.sendMessage();
+        });
+        
+        // Enhanced input handling with debouncing
+        const messageInput = document.getElementById('aida-message-input');
+        
+        // Debounced input validation
+        messageInput.addEventListener('input', (e) => {
+            clearTimeout(this.debounceTimer);
+            this.debounceTimer = setTimeout(() => {
+                this.validateInput(e.target.value);
+            }, this.debounceDelay);
+        });
+        
+        // Enter key to send
+        messageInput.addEventListener('keypress', (e) => {
+            if (e.key === 'Enter' && !e.shiftKey) {
+                e.preventDefault();
+                this.sendMessage();
+            }
+        });
+        
+        // Add focus management for accessibility
+        messageInput.addEventListener('focus', () => {
+            document.getElementById('aida-chat-widget').classList.add('aida-focused');
+        });
+        
+        messageInput.addEventListener('blur', () => {
+            document.getElementById('aida-chat-widget').classList.remove('aida-focused');
+        });
+    }
+    
+    async initSession(refresh = false) {
+        try {
+            const response = await this.callGateway(
+                '/init_session', refresh ? { refresh: 1 } : {}, 'aida_agent_app.aida_agent_app.api.init_agent_session'
+            );
+            
+            if (response.message && response.message.success) {
+                this.sessionId = response.message.session_data.session_id;
+                this.isInitialized = true;
+                console.log('AIDA session initialized:', this.sessionId);
+                return true;
+            } else {
+                throw new Error(response.message?.message || 'Failed to initialize session');
+            }
+        } catch (error) {
+            console.error('Session initialization failed:', error);
+            this.showError('Failed to connect to AIDA AI. Please check your settings.');
+            return false;
+        }
+    }
+    
+    toggleChat() {
+        const chatWindow = document.getElementById('aida-chat-window');
+        const chatButton = document.getElementById('aida-chat-toggle');
+        
+        if (chatWindow.classList.contains('show')) {
+            this.closeChat();
+        } else {
+            chatWindow.classList.add('show');
+            chatButton.classList.add('active');
+            document.getElementById('aida-message-input').focus();
+            
+            if (!this.historyLoaded) {
+                this.loadHistory();
+            }
+        }
+    }
+    
+    async loadHistory() {
+        if (this.historyLoading || !this.hasMoreHistory) return;
+        if (typeof frappe === 'undefined' || frappe.session?.user === 'Guest') return;
+        
+        this.historyLoading = true;
+        try {
+            const response = await frappe.call({
+                method: 'aida_agent_app.aida_agent_app.api.get_chat_history',
+                args: {
+                    before: this.historyBefore,
+                    limit: this.historyPageSize
+                }
+            });
+            
+            const page = response.message;
+            if (!page || !page.success) return;
+            
+            const messagesContainer = document.getElementById('aida-chat-messages');
+            const historyContainer = document.getElementById('aida-chat-history');
+            const previousHeight = messagesContainer.scrollHeight;
+            
+            // Older pages go above what is already shown
+            const fragment = document.createDocumentFragment();
+            page.messages.forEach((message) => {
+                fragment.appendChild(this.createHistoryElement(message));
+            });
+            historyContainer.insertBefore(fragment, historyContainer.firstChild);
+            
+            if (this.historyLoaded) {
+                // Keep the message the user was reading in place
+                messagesContainer.scrollTop += messagesContainer.scrollHeight - previousHeight;
+            } else {
+                messagesContainer.scrollTop = messagesContainer.scrollHeight;
+            }
+            
+            this.historyBefore = page.next_before;
+            this.hasMoreHistory = page.has_more;
+            this.historyLoaded = true;
+        } catch (error) {
+            console.error('Failed to load chat history:', error);
+        } finally {
+            this.historyLoading = false;
+        }
+    }
+    
+    createHistoryElement(message) {
+        const type = message.role === 'user' ? 'user' : 'bot';
+        const messageDiv = document.createElement('div');
+        messageDiv.className = `aida-message ${type} history`;
+        
+        const contentDiv = document.createElement('div');
+        contentDiv.className = 'aida-message-content';
+        if (type === 'bot') {
+            contentDiv.innerHTML = this.processMessageContent(message.message || '');
+        } else {
+            contentDiv.textContent = message.message || '';
+        }
+        
+        messageDiv.appendChild(contentDiv);
+        return messageDiv;
+    }
+    
+    closeChat() {
+        const chatWindow = document.getElementById('aida-chat-window');
+        const chatButton = document.getElementById('aida-chat-toggle');
+        
+        chatWindow.classList.remove('show');
+        chatButton.classList.remove('active');
+    }
+    
+    async openLeadPanel() {
+        // The lead panel is a separate chunk, fetched the first time it is opened
+        await window.loadAida('leads');
+        this.showLeadPanel();
+    }
+    
+    async sendMessage() {
+        const input = document.getElementById('aida-message-input');
+        const message = input.value.trim();
+        
+        if (!message || this.isLoading) return;
+        
+        if (!this.isInitialized && this.sessionReady) {
+            // The chat was opened before the session finished starting
+            await this.sessionReady;
+        }
+        
+        if (!this.isInitialized) {
+            this.showError('AIDA is not connected. Please refresh the page.');
+            return;
+        }
+        
+        // Check cache first
+        const cacheKey = message.toLowerCase().trim();
+        if (this.messageCache.has(cacheKey)) {
+            const cachedResponse = this.messageCache.get(cacheKey);
+            input.value = '';
+            this.addMessage(message, 'user');
+            this.addMessage(cachedResponse, 'bot');
+            return;
+        }
+        
+        // Clear input
+        input.value = '';
+        
+        // Add user message
+        this.addMessage(message, 'user');
+        
+        // Check for lead creation intent
+        if (this.isLeadCreationQuery(message)) {
+            this.addMessage('I can help you create leads! Let me open the lead generation panel for you.', 'bot');
+            setTimeout(() => this.openLeadPanel(), 1000);
+            return;
+        }
+        
+        if (this.isStreamingEnabled()) {
+            this.sendStreamingMessage(message, cacheKey);
+            return;
+        }
+        
+        // Show loading
+        this.showLoading();
+        
+        try {
+            const response = await this.sendMessageWithRetry(message);
+            
+            this.hideLoading();
+            
+            if (response && response.message && response.message.success) {
+                if (response.message.session_data) {
+                    // The server replaced a session the AIDA server had lost
+                    this.sessionId = response.message.session_data.session_id;
+                }
+                const botResponse = response.message.response_data.response;
+                this.addMessage(botResponse, 'bot');
+                
+                // Cache the response
+                this.messageCache.set(cacheKey, botResponse);
+                
+                // Limit cache size
+                if (this.messageCache.size > 50) {
+                    const firstKey = this.messageCache.keys().next().value;
+                    this.messageCache.delete(firstKey);
+                }
+                
+                this.retryCount = 0; // Reset retry count on success
+            } else if (response && response.message && response.message.retry_after) {
+                // Busy or temporarily unavailable: the server says when to try again
+                this.addMessage(response.message.message, 'bot');
+            } else {
+                this.handleError('Sorry, I encountered an error. Please try again.');
+            }
+        } catch (error) {
+            this.hideLoading();
+            console.error('Chat error:', error);
+            this.handleError('Sorry, I\'m having trouble connecting. Please try again later.');
+        }
+    }
+    
+    async sendMessageWithRetry(message, attempt = 1) {
+        try {
+            return await this.callGateway(
+                '/chat',
+                {
+                    session_id: this.sessionId,
+                    user_input: message
+                },
+                'aida_agent_app.aida_agent_app.api.chat_with_agent',
+                { timeout: 30000 }
+            );
+        } catch (error) {
+            if (attempt < this.maxRetries && this.isRetryableError(error)) {
+                console.warn(`Attempt ${attempt} failed, retrying...`, error);
+                await this.delay(1000 * attempt); // Exponential backoff
+                return this.sendMessageWithRetry(message, attempt + 1);
+            }
+            throw error;
+        }
+    }
+    
+    async callGateway(path, args, method, options = {}) {
+        // Use the async gateway when the site has one; the whitelisted method
+        // is the fallback when it is down or can't see the session
+        if (this.gatewayUrl) {
+            try {
+                const response = await fetch(`${this.gatewayUrl}${path}`, {
+                    method: 'POST',
+                    credentials: 'same-origin',
+                    headers: {
+                        'Content-Type': 'application/json',
+                        'X-Frappe-CSRF-Token': frappe.csrf_token
+                    },
+                    body: JSON.stringify(args)
+                });
+                
+                if (response.ok) {
+                    // Same shape as a frappe.call response
+                    return { message: await response.json() };
+                }
+                console.warn(`AIDA gateway returned ${response.status}, using the API instead`);
+            } catch (error) {
+                console.warn('AIDA gateway unavailable, using the API instead:', error);
+            }
+        }
+        
+        return frappe.call({ method: method, args: args, ...options });
+    }
+    
+    setupRealtime() {
+        // Lead progress events are handled by the lead panel chunk
+        if (!this.isStreamingEnabled()) return;
+        
+        frappe.realtime.on('aida_chat_chunk', (data) => this.handleStreamChunk(data));
+        frappe.realtime.on('aida_chat_done', (data) => this.handleStreamDone(data));
+    }
+    
+    isRealtimeAvailable() {
+        return typeof frappe !== 'undefined' &&
+               frappe.realtime && typeof frappe.realtime.on === 'function';
+    }
+    
+    isStreamingEnabled() {
+        return Boolean(this.settings.enable_streaming) && this.isRealtimeAvailable();
+    }
+    
+    async sendStreamingMessage(message, cacheKey, resent = false) {
+        // Register the stream before the call so no early chunk is missed
+        const streamId = Math.random().toString(36).slice(2) + Date.now().toString(36);
+        const stream = { text: '', contentDiv: null, cacheKey: cacheKey, message: message, resent: resent, timer: null };
+        stream.timer = setTimeout(() => {
+            this.handleStreamDone({
+                stream_id: streamId,
+                success: false,
+                message: 'Sorry, the response took too long. Please try again.'
+            });
+        }, this.streamTimeout);
+        this.streams.set(streamId, stream);
+        
+        this.showLoading();
+        
+        try {
+            const response = await frappe.call({
+                method: 'aida_agent_app.aida_agent_app.api.chat_with_agent_stream',
+                args: {
+                    session_id: this.sessionId,
+                    user_input: message,
+                    stream_id: streamId
+                }
+            });
+            
+            if (!response.message || !response.message.success) {
+                this.handleStreamDone({
+                    stream_id: streamId,
+                    success: false,
+                    message: response.message?.message
+                });
+            } else if (response.message.response_data) {
+                // Answered from the server-side cache, nothing will be streamed
+                this.handleStreamDone({
+                    stream_id: streamId,
+                    success: true,
+                    response: response.message.response_data.response
+                });
+            }
+        } catch (error) {
+            console.error('Chat stream error:', error);
+            this.handleStreamDone({
+                stream_id: streamId,
+                success: false,
+                message: 'Sorry, I\'m having trouble connecting. Please try again later.'
+            });
+        }
+    }
+    
+    handleStreamChunk(data) {
+        const stream = this.streams.get(data.stream_id);
+        if (!stream) return;
+        
+        if (!stream.contentDiv) {
+            // First chunk replaces the loading indicator
+            const loadingMessage = document.getElementById('aida-loading-message');
+            if (loadingMessage) {
+                loadingMessage.remove();
+            }
+            stream.contentDiv = this.createMessageElement('bot');
+        }
+        
+        stream.text += data.text;
+        stream.contentDiv.textContent = stream.text;
+        
+        const messagesContainer = document.getElementById('aida-chat-messages');
+        messagesContainer.scrollTop = messagesContainer.scrollHeight;
+    }
+    
+    handleStreamDone(data) {
+        const stream = this.streams.get(data.stream_id);
+        if (!stream) return;
+        
+        clearTimeout(stream.timer);
+        this.streams.delete(data.stream_id);
+        this.hideLoading();
+        
+        if (!data.success) {
+            if (stream.contentDiv) {
+                stream.contentDiv.parentNode.remove();
+            }
+            if (data.session_lost && !stream.resent) {
+                // The AIDA server lost the session (e.g. it restarted): start a new one and resend once
+                this.resendWithNewSession(stream);
+                return;
+            }
+            this.handleError(data.message || 'Sorry, I encountered an error. Please try again.');
+            return;
+        }
+        
+        const botResponse = data.response || stream.text;
+        if (!stream.contentDiv) {
+            stream.contentDiv = this.createMessageElement('bot');
+        }
+        stream.contentDiv.innerHTML = this.processMessageContent(botResponse);
+        this.messageHistory.push({ content: botResponse, type: 'bot', timestamp: new Date() });
+        
+        // Cache the response
+        this.messageCache.set(stream.cacheKey, botResponse);
+        if (this.messageCache.size > 50) {
+            const firstKey = this.messageCache.keys().next().value;
+            this.messageCache.delete(firstKey);
+        }
+        
+        this.retryCount = 0;
+    }
+    
+    async resendWithNewSession(stream) {
+        if (await this.initSession(true)) {
+            this.sendStreamingMessage(stream.message, stream.cacheKey, true);
+        }
+    }
+    
+    isRetryableError(error) {
+        // Retry on network errors, timeouts, and 5xx server errors
+        return error.name === 'NetworkError' || 
+               error.message.includes('timeout') ||
+               (error.status >= 500 && error.status < 600);
+    }
+    
+    delay(ms) {
+        return new Promise(resolve => setTimeout(resolve, ms));
+    }
+    
+    handleError(message) {
+        this.addMessage(message, 'bot');
+        this.retryCount++;
+        
+        if (this.retryCount >= this.maxRetries) {
+            this.addMessage('I\'m experiencing persistent issues. Please refresh the page and try again.', 'bot');
+        }
+    }
+    
+    isLeadCreationQuery(message) {
+        const leadKeywords = [
+            'create leads', 'generate leads', 'find leads', 'lead generation',
+            'find businesses', 'search businesses', 'prospect', 'prospecting'
+        ];
+        
+        const lowerMessage = message.toLowerCase();
+        return leadKeywords.some(keyword => lowerMessage.includes(keyword));
+    }
+    
+    createMessageElement(type) {
+        const messagesContainer = document.getElementById('aida-chat-messages');
+        
+        const messageDiv = document.createElement('div');
+        messageDiv.className = `aida-message ${type}`;
+        
+        const contentDiv = document.createElement('div');
+        contentDiv.className = 'aida-message-content';
+        
+        messageDiv.appendChild(contentDiv);
+        messagesContainer.appendChild(messageDiv);
+        
+        return contentDiv;
+    }
+    
+    addMessage(content, type) {
+        const messagesContainer = document.getElementById('aida-chat-messages');
+        const contentDiv = this.createMessageElement(type);
+        
+        // Process content for clickable links
+        if (type === 'bot') {
+            contentDiv.innerHTML = this.processMessageContent(content);
+        } else {
+            contentDiv.textContent = content;
+        }
+        
+        // Scroll to bottom
+        messagesContainer.scrollTop = messagesContainer.scrollHeight;
+        
+        // Store in history
+        this.messageHistory.push({ content, type, timestamp: new Date() });
+    }
+    
+    processMessageContent(content) {
+        // Convert URLs to clickable links
+        const urlRegex = /(https?:\/\/[^\s]+)/g;
+        return content.replace(urlRegex, '<a href="$1" target="_blank">$1</a>');
+    }
+    
+    showLoading() {
+        this.isLoading = true;
+        const messagesContainer = document.getElementById('aida-chat-messages');
+        
+        const loadingDiv = document.createElement('div');
+        loadingDiv.className = 'aida-message bot';
+        loadingDiv.id = 'aida-loading-message';
+        
+        const contentDiv = document.createElement('div');
+        contentDiv.className = 'aida-message-content';
+        contentDiv.innerHTML = `
+            <div class="aida-loading">
+                <div class="aida-loading-dot"></div>
+                <div class="aida-loading-dot"></div>
+                <div class="aida-loading-dot"></div>
+            </div>
+        `;
+        
+        loadingDiv.appendChild(contentDiv);
+        messagesContainer.appendChild(loadingDiv);
+        messagesContainer.scrollTop = messagesContainer.scrollHeight;
+        
+        // Disable send button
+        document.getElementById('aida-send-button').disabled = true;
+    }
+    
+    hideLoading() {
+        this.isLoading = false;
+        const loadingMessage = document.getElementById('aida-loading-message');
+        if (loadingMessage) {
+            loadingMessage.remove();
+        }
+        
+        // Enable send button
+        document.getElementById('aida-send-button').disabled = false;
+    }
+    
+    validateInput(value) {
+        const sendBtn = document.getElementById('aida-send-button');
+        const input = document.getElementById('aida-message-input');
+        
+        if (value.trim().length === 0) {
+            sendBtn.disabled = true;
+            sendBtn.classList.add('disabled');
+        } else if (value.length > 2000) {
+            input.setCustomValidity('Message too long (max 2000 characters)');
+            sendBtn.disabled = true;
+            sendBtn.classList.add('disabled');
+        } else {
+            input.setCustomValidity('');
+            sendBtn.disabled = false;
+            sendBtn.classList.remove('disabled');
+        }
+    }
+    
+    showError(message) {
+        this.addMessage(`Error: ${message}`, 'bot');
+    }
+    
+    // Public methods for external access
+    openChat() {
+        const chatWindow = document.getElementById('aida-chat-window');
+        if (!chatWindow.classList.contains('show')) {
+            this.toggleChat();
+        }
+    }
+    
+    sendQuickMessage(message) {
+        const input = document.getElementById('aida-message-input');
+        input.value = message;
+        this.sendMessage();
+    }
+}
+
+// Loaded as a separate script, so the lead panel reaches the class through window
+window.AidaAgent = AidaAgent;
+
+// Chunk loading and the page-wide entry points, replacing the loader's placeholders
+(function () {
+    const chunks = {
+        chat: ['css/aida_agent.css'],
+        leads: ['css/aida_leads.css', 'js/aida_leads.js']
+    };
+    const loading = {};
+    // Chunk URLs carry a content hash so they can be cached for a long time
+    const version = (typeof frappe !== 'undefined' && frappe.boot?.aida_agent?.asset_version) || '';
+
+    function fetchAsset(path) {
+        const url = `/assets/aida_agent_app/${path}${version ? `?v=${version}` : ''}`;
+        loading[url] = loading[url] || new Promise((resolve, reject) => {
+            const css = path.endsWith('.css');
+            const el = document.createElement(css ? 'link' : 'script');
+            if (css) {
+                el.rel = 'stylesheet';
+                el.href = url;
+            } else {
+                el.src = url;
+            }
+            el.onload = resolve;
+            el.onerror = () => {
+                delete loading[url];
+                reject(new Error(`Could not load ${url}`));
+            };
+            document.head.appendChild(el);
+        });
+        return loading[url];
+    }
+
+    async function load(name) {
+        if (name !== 'chat') {
+            await load('chat');
+        }
+        await Promise.all(chunks[name].map(fetchAsset));
+        if (!window.aidaAgent) {
+            window.aidaAgent = new AidaAgent();
+        }
+        await window.aidaAgent.ready;
+        return window.aidaAgent;
+    }
+
+    async function run(name, action) {
+        try {
+            action(await load(name));
+        } catch (error) {
+            console.error('Failed to load AIDA Agent:', error);
+            alert('AIDA Agent is not available. Please refresh the page and try again.');
+        }
+    }
+
+    window.loadAida = load;
+
+    window.toggleAidaChat = function () {
+        return run('chat', (agent) => agent.toggleChat());
+    };
+
+    window.openAidaChat = function () {
+        return run('chat', (agent) => agent.openChat());
+    };
+
+    window.sendAidaMessage = function (message) {
+        return run('chat', (agent) => {
+            agent.openChat();
+            agent.sendQuickMessage(message);
+        });
+    };
+
+    window.openAidaLeads = function () {
+        return run('leads', (agent) => agent.openLeadPanel());
+    };
+})();
@@ -0,0 +1,242 @@
+// AIDA Agent lead panel, loaded by aida_loader.js the first time it is opened
+
+Object.assign(window.AidaAgent.prototype, {
+    createLeadPanel() {
+        // Create lead panel HTML
+        const panelHTML = `
+            <div class="aida-lead-panel" id="aida-lead-panel">
+                <div class="aida-lead-panel-header">
+                    <h3>Lead Generation</h3>
+                    <button class="close-btn" id="aida-lead-close">
+                        <i class="fa fa-times"></i>
+                    </button>
+                </div>
+                
+                <div class="aida-lead-panel-content">
+                    <div id="aida-lead-alerts"></div>
+                    
+                    <div class="aida-form-group">
+                        <label for="business-type">Business Type</label>
+                        <input type="text" id="business-type" placeholder="e.g., restaurants, law firms, dentists">
+                    </div>
+                    
+                    <div class="aida-form-group">
+                        <label for="location">Location</label>
+                        <input type="text" id="location" placeholder="e.g., New York, NY">
+                    </div>
+                    
+                    <div class="aida-form-group">
+                        <label for="lead-count">Number of Leads</label>
+                        <select id="lead-count">
+                            <option value="5">5 leads</option>
+                            <option value="10" selected>10 leads</option>
+                            <option value="20">20 leads</option>
+                            <option value="50">50 leads</option>
+                        </select>
+                    </div>
+                    
+                    <button class="aida-btn" id="create-leads-btn">
+                        <i class="fa fa-users"></i> Create Leads
+                    </button>
+                    
+                    <div class="aida-lead-progress" id="aida-lead-progress"></div>
+                    
+                    <button class="aida-btn secondary" id="cancel-leads-btn" style="display: none;">
+                        <i class="fa fa-stop"></i> Cancel
+                    </button>
+                </div>
+            </div>
+        `;
+        
+        document.getElementById('aida-chat-widget').insertAdjacentHTML('beforeend', panelHTML);
+        
+        // Lead panel close
+        document.getElementById('aida-lead-close').addEventListener('click', () => {
+            this.closeLeadPanel();
+        });
+        
+        // Create leads
+        document.getElementById('create-leads-btn').addEventListener('click', () => {
+            this.createLeads();
+        });
+        
+        // Cancel running lead job
+        document.getElementById('cancel-leads-btn').addEventListener('click', () => {
+            this.cancelLeadJob();
+        });
+        
+        // Lead job progress is pushed over realtime when available
+        if (this.isRealtimeAvailable()) {
+            frappe.realtime.on('aida_lead_progress', (data) => this.handleLeadProgress(data));
+        }
+    },
+    
+    showLeadPanel() {
+        if (!document.getElementById('aida-lead-panel')) {
+            this.createLeadPanel();
+        }
+        document.getElementById('aida-lead-panel').classList.add('show');
+    },
+    
+    closeLeadPanel() {
+        document.getElementById('aida-lead-panel').classList.remove('show');
+    },
+    
+    async createLeads() {
+        const businessType = document.getElementById('business-type').value.trim();
+        const location = document.getElementById('location').value.trim();
+        const count = document.getElementById('lead-count').value;
+        
+        if (!businessType || !location) {
+            this.showLeadAlert('Please fill in both business type and location.', 'error');
+            return;
+        }
+        
+        const createBtn = document.getElementById('create-leads-btn');
+        createBtn.disabled = true;
+        createBtn.innerHTML = '<i class="fa fa-spinner fa-spin"></i> Creating Leads...';
+        
+        try {
+            const response = await frappe.call({
+                method: 'aida_agent_app.aida_agent_app.api.create_leads',
+                args: {
+                    business_type: businessType,
+                    location: location,
+                    count: count
+                }
+            });
+            
+            if (response.message && response.message.success) {
+                this.leadJobId = response.message.job_id;
+                this.setLeadProgress('Searching for businesses...');
+                document.getElementById('cancel-leads-btn').style.display = '';
+                
+                // Poll when realtime updates are not available
+                if (!this.isRealtimeAvailable()) {
+                    this.leadPollTimer = setInterval(() => this.pollLeadJob(), this.leadPollInterval);
+                }
+            } else {
+                throw new Error(response.message?.message || 'Failed to create leads');
+            }
+        } catch (error) {
+            console.error('Lead creation error:', error);
+            this.showLeadAlert(
+                `Failed to create leads: ${error.message}`,
+                'error'
+            );
+            this.resetLeadPanel();
+        }
+    },
+    
+    async pollLeadJob() {
+        if (!this.leadJobId) return;
+        
+        try {
+            const response = await frappe.call({
+                method: 'aida_agent_app.aida_agent_app.api.get_lead_job_status',
+                args: { job_id: this.leadJobId }
+            });
+            
+            if (response.message && response.message.success) {
+                this.handleLeadProgress(response.message.job);
+            }
+        } catch (error) {
+            console.error('Lead job status error:', error);
+        }
+    },
+    
+    handleLeadProgress(data) {
+        if (!data || data.job_id !== this.leadJobId) return;
+        
+        if (data.status === 'running') {
+            if (data.lead) {
+                this.setLeadProgress(`Created ${data.created} of ${data.total}: ${data.lead}`);
+            } else {
+                this.setLeadProgress('Searching for businesses...');
+            }
+        } else if (data.status === 'completed') {
+            const result = data.result || {};
+            const skipped = result.skipped_duplicates
+                ? ` Skipped ${result.skipped_duplicates} already in ERPNext.`
+                : '';
+            this.showLeadAlert(
+                `Successfully created ${result.result?.created_count ?? result.created_count ?? 0} leads!${skipped}`,
+                'success'
+            );
+            
+            // Clear form
+            document.getElementById('business-type').value = '';
+            document.getElementById('location').value = '';
+            this.resetLeadPanel();
+            
+            // Close panel after delay
+            setTimeout(() => this.closeLeadPanel(), 2000);
+        } else if (data.status === 'failed') {
+            this.showLeadAlert(`Failed to create leads: ${data.message}`, 'error');
+            this.resetLeadPanel();
+        } else if (data.status === 'cancelled') {
+            this.showLeadAlert('Lead creation cancelled.', 'error');
+            this.resetLeadPanel();
+        }
+    },
+    
+    async cancelLeadJob() {
+        if (!this.leadJobId) return;
+        
+        const cancelBtn = document.getElementById('cancel-leads-btn');
+        cancelBtn.disabled = true;
+        
+        try {
+            const response = await frappe.call({
+                method: 'aida_agent_app.aida_agent_app.api.cancel_lead_job',
+                args: { job_id: this.leadJobId }
+            });
+            
+            if (response.message && response.message.success) {
+                this.setLeadProgress('Cancelling...');
+            } else {
+                cancelBtn.disabled = false;
+            }
+        } catch (error) {
+            console.error('Lead job cancel error:', error);
+            cancelBtn.disabled = false;
+        }
+    },
+    
+    setLeadProgress(message) {
+        document.getElementById('aida-lead-progress').textContent = message;
+    },
+    
+    resetLeadPanel() {
+        this.leadJobId = null;
+        clearInterval(this.leadPollTimer);
+        this.leadPollTimer = null;
+        this.setLeadProgress('');
+        
+        const cancelBtn = document.getElementById('cancel-leads-btn');
+        cancelBtn.style.display = 'none';
+        cancelBtn.disabled = false;
+        
+        const createBtn = document.getElementById('create-leads-btn');
+        createBtn.disabled = false;
+        createBtn.innerHTML = '<i class="fa fa-users"></i> Create Leads';
+    },
+    
+    showLeadAlert(message, type) {
+        const alertsContainer = document.getElementById('aida-lead-alerts');
+        
+        const alertDiv = document.createElement('div');
+        alertDiv.className = `aida-alert ${type}`;
+        alertDiv.textContent = message;
+        
+        alertsContainer.innerHTML = '';
+        alertsContainer.appendChild(alertDiv);
+        
+        // Auto-remove after 5 seconds
+        setTimeout(() => {
+            if (alertDiv.parentNode) {
+                alertDiv.remove();
+            }
+        }, 5000);
+    }
+});
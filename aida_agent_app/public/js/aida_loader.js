@@ -0,0 +1,38 @@
+// AIDA Agent loader: the chat button; the widget (aida_chat.js) loads on first use and replaces these entry points
+
+(function () {
+    // Frappe versions this script's URL on every build; the widget shares it
+    const src = document.currentScript.src.replace('aida_loader.js', 'aida_chat.js');
+    let script;
+
+    const defer = (name) => (...args) => {
+        script = script || new Promise((resolve, reject) => {
+            const el = document.createElement('script');
+            el.src = src;
+            el.onload = resolve;
+            el.onerror = () => {
+                script = null;
+                reject(new Error(`Could not load ${src}`));
+            };
+            document.head.appendChild(el);
+        });
+        return script.then(() => window[name](...args));
+    };
+
+    ['openAidaChat', 'sendAidaMessage', 'openAidaLeads', 'toggleAidaChat', 'loadAida'].forEach((name) => {
+        window[name] = defer(name);
+    });
+
+    frappe.ready(() => {
+        const user = frappe.session?.user || frappe.boot?.user?.name;
+        if (!user || user === 'Guest' || document.getElementById('aida-chat-widget')) return;
+
+        document.body.insertAdjacentHTML('beforeend', `<div id="aida-chat-widget" class="aida-chat-widget ${frappe.boot?.aida_agent?.widget_position || 'bottom-right'}"><button class="aida-chat-button" id="aida-chat-toggle"><i class="fa fa-comments"></i></button></div>`);
+        const button = document.getElementById('aida-chat-toggle');
+        // Start fetching as soon as the user reaches for the button
+        button.addEventListener('pointerenter', () => window.loadAida('chat').catch(() => {}), { once: true });
+        button.addEventListener('click', () => window.toggleAidaChat().catch(() => {
+            alert('AIDA Agent is not available. Please refresh the page and try again.');
+        }));
+    });
+})();
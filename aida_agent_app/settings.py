@@ -0,0 +1,149 @@
+import threading
+import logging
+from typing import NamedTuple
+import frappe
+from frappe.utils import cint, get_site_url
+from aida_agent_app import upstream
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+SETTINGS_DOCTYPE = "AIDA Agent Settings"
+BACKEND_DOCTYPE = "AIDA Agent Backend"
+VERSION_KEY = "aida_agent_settings_version"
+SNAPSHOT_KEY = "aida_agent_settings_snapshot"
+
+# Per-process snapshots keyed by site: site -> (version, AidaSettings)
+_snapshots = {}
+_lock = threading.Lock()
+
+
+class AidaSettings(NamedTuple):
+    """Immutable view of AIDA Agent Settings shared by every request in a worker."""
+    api_server_url: str
+    erpnext_url: str
+    google_api_key: str
+    mongo_uri: str
+    enable_onboarding: int
+    enable_lead_creation: int
+    widget_position: str
+    widget_theme: str
+    connection_pool_size: int
+    enable_streaming: int
+    lead_batch_concurrency: int
+    bulk_insert_leads: int
+    answer_cache_ttl: int
+    # Enabled (url, weight) rows of the server pool; empty means api_server_url alone
+    backends: tuple = ()
+
+    def as_dict(self):
+        return dict(self._asdict())
+
+
+def default_settings():
+    """
+    Settings used when the AIDA Agent Settings document has not been saved yet.
+    """
+    return AidaSettings(
+        api_server_url="http://localhost:5000",
+        erpnext_url=get_site_url(frappe.local.site),
+        google_api_key="",
+        mongo_uri="",
+        enable_onboarding=1,
+        enable_lead_creation=1,
+        widget_position="bottom-right",
+        widget_theme="light",
+        connection_pool_size=upstream.DEFAULT_POOL_SIZE,
+        enable_streaming=0,
+        lead_batch_concurrency=4,
+        bulk_insert_leads=0,
+        answer_cache_ttl=86400,
+        backends=()
+    )
+
+
+def _version_key():
+    return frappe.cache().make_key(VERSION_KEY)
+
+
+def get_settings_version():
+    """
+    Current settings version shared by all workers through Redis.
+    """
+    return cint(frappe.cache().get(_version_key()))
+
+
+def bump_settings_version():
+    """
+    Invalidate every cached snapshot, in this process and in all other workers.
+    """
+    frappe.cache().incr(_version_key())
+    frappe.cache().delete_value(SNAPSHOT_KEY)
+    _snapshots.pop(frappe.local.site, None)
+
+
+def _load_backends():
+    rows = frappe.get_all(
+        BACKEND_DOCTYPE,
+        filters={"parenttype": SETTINGS_DOCTYPE, "parentfield": "backends", "enabled": 1},
+        fields=["url", "weight"],
+        order_by="idx asc"
+    )
+    return tuple((row.url.rstrip("/"), max(cint(row.weight), 1)) for row in rows if row.url)
+
+
+def _load_settings():
+    """
+    Read the settings with a query on tabSingles and one for the server pool,
+    without building the document.
+    """
+    values = frappe.db.get_singles_dict(SETTINGS_DOCTYPE)
+    defaults = default_settings()
+    return AidaSettings(
+        api_server_url=values.get("api_server_url") or defaults.api_server_url,
+        erpnext_url=values.get("erpnext_url") or defaults.erpnext_url,
+        google_api_key=values.get("google_api_key") or "",
+        mongo_uri=values.get("mongo_uri") or "",
+        enable_onboarding=cint(values.get("enable_onboarding", 1)),
+        enable_lead_creation=cint(values.get("enable_lead_creation", 1)),
+        widget_position=values.get("widget_position") or defaults.widget_position,
+        widget_theme=values.get("widget_theme") or defaults.widget_theme,
+        connection_pool_size=cint(values.get("connection_pool_size")) or defaults.connection_pool_size,
+        enable_streaming=cint(values.get("enable_streaming")),
+        lead_batch_concurrency=cint(values.get("lead_batch_concurrency")) or defaults.lead_batch_concurrency,
+        bulk_insert_leads=cint(values.get("bulk_insert_leads")),
+        answer_cache_ttl=cint(values.get("answer_cache_ttl", defaults.answer_cache_ttl)),
+        backends=_load_backends()
+    )
+
+
+def get_settings_snapshot():
+    """
+    Get the settings snapshot for the current site.
+
+    The snapshot is held in process memory and in Redis; both are reused until
+    the settings version is bumped, so a request normally costs one Redis GET.
+    """
+    site = frappe.local.site
+    version = get_settings_version()
+
+    cached = _snapshots.get(site)
+    if cached and cached[0] == version:
+        return cached[1]
+
+    with _lock:
+        snapshot = None
+        shared = frappe.cache().get_value(SNAPSHOT_KEY)
+        if shared and shared.get("version") == version:
+            try:
+                snapshot = AidaSettings(**shared["settings"])
+            except TypeError:
+                # Snapshot written by an older release with different fields
+                snapshot = None
+
+        if snapshot is None:
+            snapshot = _load_settings()
+            frappe.cache().set_value(SNAPSHOT_KEY, {"version": version, "settings": snapshot.as_dict()})
+
+        _snapshots[site] = (version, snapshot)
+        return snapshot
@@ -0,0 +1,100 @@
+import json
+import time
+import hashlib
+import logging
+import frappe
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+LOCK_KEY = "aida_flight_lock:{}"
+RESULT_KEY = "aida_flight_result:{}:{}"
+
+# Followers only need the result long enough to pick it up
+RESULT_TTL = 10
+POLL_INTERVAL = 0.02
+MAX_POLL_INTERVAL = 0.25
+
+_FAILED = "__failed__"
+
+
+def make_key(*parts):
+    """
+    Key for a flight from its endpoint and payload. Payload dicts are
+    serialised with sorted keys so equal payloads give the same key.
+    """
+    raw = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def run(key, fn, wait_timeout, publish=None):
+    """
+    Run fn once for all workers asking for the same key at the same time.
+
+    The first caller becomes the leader and runs fn; callers arriving while
+    it is in flight wait up to wait_timeout seconds and share its result.
+    When the leader fails or the wait runs out, a follower calls fn itself.
+
+    The leader gets fn's own return value. Followers get publish(result)
+    when publish is given, which must be picklable.
+    """
+    cache = frappe.cache()
+    lock_key = cache.make_key(LOCK_KEY.format(key))
+    token = frappe.generate_hash(length=12)
+
+    if cache.set(lock_key, token, nx=True, ex=int(wait_timeout) + 5):
+        return _lead(key, token, lock_key, fn, publish)
+
+    leader_token = cache.get(lock_key)
+    if not leader_token:
+        # The leader finished between our two commands; make our own call
+        return fn()
+
+    if isinstance(leader_token, bytes):
+        leader_token = leader_token.decode()
+
+    result = _wait(key, leader_token, wait_timeout)
+    if result is _FAILED:
+        return fn()
+    return result
+
+
+def _lead(key, token, lock_key, fn, publish):
+    cache = frappe.cache()
+    result_key = RESULT_KEY.format(key, token)
+    try:
+        result = fn()
+    except Exception:
+        cache.set_value(result_key, _FAILED, expires_in_sec=RESULT_TTL)
+        cache.delete(lock_key)
+        raise
+
+    # Publish before releasing the lock so no follower misses the result
+    try:
+        shared = {"result": publish(result) if publish else result}
+        cache.set_value(result_key, shared, expires_in_sec=RESULT_TTL)
+    except Exception as e:
+        logger.warning(f"Could not share result of AIDA request {key}: {str(e)}")
+        cache.set_value(result_key, _FAILED, expires_in_sec=RESULT_TTL)
+    cache.delete(lock_key)
+    return result
+
+
+def _wait(key, token, wait_timeout):
+    cache = frappe.cache()
+    result_key = RESULT_KEY.format(key, token)
+    deadline = time.time() + wait_timeout
+    interval = POLL_INTERVAL
+
+    while time.time() < deadline:
+        # expires=True skips the per-request memo, which would keep returning the first miss
+        shared = cache.get_value(result_key, expires=True)
+        if shared is not None:
+            if shared == _FAILED:
+                return _FAILED
+            return shared["result"]
+        time.sleep(interval)
+        interval = min(interval * 2, MAX_POLL_INTERVAL)
+
+    logger.info(f"Gave up waiting for in-flight AIDA request {key} after {wait_timeout}s")
+    return _FAILED
@@ -0,0 +1,177 @@
+import json
+import time
+import logging
+import frappe
+import requests
+from aida_agent_app import upstream, admission, agent_sessions, answer_cache, backends, chat_history, metrics, wire
+from aida_agent_app.circuit_breaker import CircuitOpenError
+from aida_agent_app.settings import get_settings_snapshot
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+CHUNK_EVENT = "aida_chat_chunk"
+DONE_EVENT = "aida_chat_done"
+
+# Streams run on the short queue so they don't hold up long-running default jobs;
+# the timeout covers the connect and read timeouts plus a slow tail of tokens
+STREAM_QUEUE = "short"
+STREAM_JOB_TIMEOUT = 90
+CONNECT_TIMEOUT = 10
+READ_TIMEOUT = 60
+
+# Tokens are batched so a long answer doesn't turn into one socket message per token
+FLUSH_INTERVAL = 0.05
+FLUSH_SIZE = 200
+
+# Answer cache flags a server may send on its events, usually the last one
+STREAM_FLAGS = ("cacheable", "session_dependent")
+
+
+def iter_stream_text(response, flags=None):
+    """
+    Yield text fragments from a server-sent event stream.
+
+    Each event is a "data:" line holding either plain text or a JSON object
+    with the fragment under "token", "delta" or "response". "[DONE]" ends
+    the stream. With a flags dict, the STREAM_FLAGS of JSON events are
+    collected into it, later events overriding earlier ones.
+    """
+    for line in response.iter_lines(decode_unicode=True):
+        if not line or not line.startswith("data:"):
+            continue
+
+        data = line[5:].strip()
+        if data == "[DONE]":
+            break
+
+        try:
+            event = json.loads(data)
+        except ValueError:
+            yield data
+            continue
+
+        if isinstance(event, dict):
+            if flags is not None:
+                flags.update((key, event[key]) for key in STREAM_FLAGS if key in event)
+            text = event.get("token") or event.get("delta") or event.get("response") or ""
+        else:
+            text = str(event)
+
+        if text:
+            yield text
+
+
+def _publish(event, message, user):
+    frappe.publish_realtime(event, message, user=user)
+
+
+@metrics.instrument("chat_stream_job")
+def stream_chat(stream_id, session_id, user_input, user, site_url, answer_key=None):
+    """
+    Background job: relay a streamed /chat reply to the user's realtime room.
+    Older servers that answer with a finished JSON body are relayed as a single chunk.
+    """
+    start_time = time.time()
+    settings = get_settings_snapshot()
+    payload = {
+        "session_id": session_id,
+        "user_input": user_input,
+        "user": user,
+        "site": site_url,
+        "stream": True
+    }
+
+    collected = []
+    buffer = []
+    seq = 0
+    last_flush = time.time()
+
+    def flush():
+        nonlocal seq, last_flush
+        if buffer:
+            _publish(CHUNK_EVENT, {"stream_id": stream_id, "seq": seq, "text": "".join(buffer)}, user)
+            seq += 1
+            buffer.clear()
+        last_flush = time.time()
+
+    pairs = backends.pool(settings.api_server_url, settings.backends)
+    try:
+        # The slot is held for the whole stream, as the call holds the AIDA server that long
+        with admission.slot(user), upstream.post(
+            backends.for_session(session_id, pairs),
+            "/chat",
+            pool_size=settings.connection_pool_size,
+            json=payload,
+            timeout=(CONNECT_TIMEOUT, READ_TIMEOUT),
+            stream=True,
+            headers={"Accept": "text/event-stream, application/json"}
+        ) as response:
+            if response.status_code != 200:
+                # The widget starts a new session and resends once when the server lost this one
+                session_lost = agent_sessions.is_session_lost(response.status_code, wire.decode_error(response))
+                if session_lost:
+                    backends.unpin(session_id, pairs)
+                _publish(DONE_EVENT, {
+                    "stream_id": stream_id,
+                    "success": False,
+                    "message": f"Chat failed: {response.status_code}",
+                    "session_lost": session_lost
+                }, user)
+                return
+
+            response_data = None
+            flags = {}
+            if "text/event-stream" in response.headers.get("content-type", ""):
+                for text in iter_stream_text(response, flags):
+                    collected.append(text)
+                    buffer.append(text)
+                    if time.time() - last_flush >= FLUSH_INTERVAL or sum(map(len, buffer)) >= FLUSH_SIZE:
+                        flush()
+                flush()
+            else:
+                response_data = wire.decode(response)
+                text = response_data.get("response", "")
+                collected.append(text)
+                buffer.append(text)
+                flush()
+
+        if answer_key and response_data is not None:
+            answer_cache.store(answer_key, response_data, settings.answer_cache_ttl)
+        elif answer_key and flags.get("cacheable") is True and not flags.get("session_dependent"):
+            # A streamed reply is only shared when the server marked it shareable
+            answer_cache.store(answer_key, {"response": "".join(collected), **flags}, settings.answer_cache_ttl)
+
+        # Already in a background job, so the history is written here directly
+        try:
+            chat_history.record_exchange(user, session_id, user_input, "".join(collected))
+        except Exception as e:
+            logger.warning(f"Could not save AIDA chat history for user {user}: {str(e)}")
+
+        duration = time.time() - start_time
+        logger.info(f"AIDA chat stream completed in {duration:.2f}s for user {user}")
+        _publish(DONE_EVENT, {"stream_id": stream_id, "success": True, "response": "".join(collected)}, user)
+
+    except admission.AdmissionRejected as e:
+        _publish(DONE_EVENT, dict(admission.busy_response(e), stream_id=stream_id), user)
+    except CircuitOpenError as e:
+        _publish(DONE_EVENT, {
+            "stream_id": stream_id,
+            "success": False,
+            "message": f"AIDA server is temporarily unavailable. Please retry in {e.retry_after} seconds.",
+            "retry_after": e.retry_after
+        }, user)
+    except requests.exceptions.RequestException as e:
+        logger.warning(f"AIDA chat stream failed for user {user}: {str(e)}")
+        _publish(DONE_EVENT, {
+            "stream_id": stream_id,
+            "success": False,
+            "message": "Sorry, I'm having trouble connecting. Please try again later."
+        }, user)
+    except Exception as e:
+        frappe.log_error(f"Error in AIDA chat stream: {str(e)}", "AIDA Agent Chat")
+        _publish(DONE_EVENT, {
+            "stream_id": stream_id,
+            "success": False,
+            "message": "An error occurred while processing your request"
+        }, user)
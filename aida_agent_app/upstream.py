@@ -0,0 +1,243 @@
+import time
+import threading
+import logging
+import frappe
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from aida_agent_app import circuit_breaker, metrics, singleflight, wire
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+DEFAULT_POOL_SIZE = 10
+WARM_UP_TIMEOUT = 5
+# Wait before a worker retries a warm-up whose settings read failed
+WARM_UP_RETRY_INTERVAL = 60
+# Longest a coalesced request waits on another worker's call when no timeout is given
+COALESCE_WAIT = 30
+
+# Per-worker pooled sessions keyed by api_server_url, and the urls each site uses
+_sessions = {}
+_site_urls = {}
+# site -> time of the last failed warm-up
+_warm_up_failures = {}
+_lock = threading.Lock()
+
+
+def _build_session(pool_size):
+    """
+    Build a keep-alive session with a connection pool of the given size.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update({"Connection": "keep-alive", "Accept-Encoding": wire.accept_encoding_header()})
+    return session
+
+
+def _set_site_urls(site, urls):
+    """
+    Record the servers a site uses and close the pools no site uses any more.
+    Called with _lock held.
+    """
+    previous = _site_urls.get(site, frozenset())
+    _site_urls[site] = urls
+
+    in_use = frozenset().union(*_site_urls.values())
+    for url in previous - in_use:
+        stale = _sessions.pop(url, None)
+        if stale:
+            stale[1].close()
+            logger.info(f"Closed AIDA connection pool for {url}")
+
+
+def use_backends(urls):
+    """
+    Register the server pool configured for the current site, so pools of
+    servers removed from it are closed.
+    """
+    site = getattr(frappe.local, "site", None)
+    urls = frozenset(urls)
+    if _site_urls.get(site) == urls:
+        return
+
+    with _lock:
+        _set_site_urls(site, urls)
+
+
+def get_session(api_server_url, pool_size=None):
+    """
+    Get the pooled session for an AIDA server URL, rebuilding it when the
+    URL or pool size configured for the current site has changed.
+    """
+    pool_size = int(pool_size or DEFAULT_POOL_SIZE)
+    site = getattr(frappe.local, "site", None)
+
+    with _lock:
+        site_urls = _site_urls.get(site, frozenset())
+        if api_server_url not in site_urls:
+            # With a single server a new URL replaces it; a registered pool only grows
+            _set_site_urls(site, site_urls | {api_server_url} if len(site_urls) > 1 else frozenset((api_server_url,)))
+
+        entry = _sessions.get(api_server_url)
+        if entry and entry[0] == pool_size:
+            return entry[1]
+
+        if entry:
+            entry[1].close()
+
+        session = _build_session(pool_size)
+        _sessions[api_server_url] = (pool_size, session)
+        return session
+
+
+def _snapshot(response):
+    return (response.status_code, dict(response.headers), response.content, response.url,
+            response.encoding, response.reason)
+
+
+def _restore(snapshot):
+    status_code, headers, content, url, encoding, reason = snapshot
+    response = requests.Response()
+    response.status_code = status_code
+    response.headers = CaseInsensitiveDict(headers)
+    response._content = content
+    response.url = url
+    response.encoding = encoding
+    response.reason = reason
+    return response
+
+
+def _timeout_seconds(timeout):
+    if isinstance(timeout, (tuple, list)):
+        return sum(t or 0 for t in timeout)
+    return timeout or COALESCE_WAIT
+
+
+def request(method, api_server_url, path, pool_size=None, retries=0, coalesce=False, **kwargs):
+    """
+    Send a request to the AIDA server over the pooled session.
+
+    Fails fast with CircuitOpenError while the server's circuit is open.
+    Connection errors are retried up to `retries` times with jittered
+    exponential backoff; 5xx responses count as failures but are returned.
+
+    With coalesce, identical requests in flight from any worker share one
+    upstream call (see singleflight). Not available for streamed requests.
+    """
+    if not coalesce or kwargs.get("stream"):
+        return _send(method, api_server_url, path, pool_size, retries, **kwargs)
+
+    key = singleflight.make_key(
+        method, api_server_url, path, kwargs.get("params"), kwargs.get("json"), kwargs.get("data")
+    )
+    led = False
+
+    def send():
+        nonlocal led
+        led = True
+        return _send(method, api_server_url, path, pool_size, retries, **kwargs)
+
+    start_time = time.time()
+    result = singleflight.run(key, send, _timeout_seconds(kwargs.get("timeout")) * (retries + 1), publish=_snapshot)
+    if led:
+        return result
+
+    # Time spent waiting on the leader's call is upstream time for this request too
+    metrics.record_upstream(time.time() - start_time)
+    return _restore(result)
+
+
+def _send(method, api_server_url, path, pool_size=None, retries=0, **kwargs):
+    session = get_session(api_server_url, pool_size)
+    kwargs = wire.prepare(api_server_url, kwargs)
+    circuit_breaker.before_request(api_server_url)
+
+    for attempt in range(retries + 1):
+        start_time = time.time()
+        try:
+            response = session.request(method, f"{api_server_url}{path}", **kwargs)
+        except requests.exceptions.RequestException as e:
+            metrics.record_upstream(
+                time.time() - start_time,
+                retries=1 if attempt else 0,
+                timeouts=1 if isinstance(e, requests.exceptions.Timeout) else 0
+            )
+            circuit_breaker.record_failure(api_server_url)
+            if attempt == retries or circuit_breaker.get_state(api_server_url) != circuit_breaker.CLOSED:
+                raise
+            time.sleep(circuit_breaker.backoff_delay(attempt))
+            continue
+
+        # With stream=True this covers time to headers; the body read is counted as local time
+        metrics.record_upstream(time.time() - start_time, retries=1 if attempt else 0)
+        wire.note_capabilities(api_server_url, response.headers)
+
+        if response.status_code >= 500:
+            circuit_breaker.record_failure(api_server_url)
+        else:
+            # health imports this module, so it is imported here
+            from aida_agent_app import health
+
+            circuit_breaker.record_success(api_server_url)
+            health.record_up(api_server_url)
+        return response
+
+
+def get(api_server_url, path, pool_size=None, retries=0, coalesce=False, **kwargs):
+    return request("GET", api_server_url, path, pool_size=pool_size, retries=retries, coalesce=coalesce, **kwargs)
+
+
+def post(api_server_url, path, pool_size=None, retries=0, coalesce=False, **kwargs):
+    return request("POST", api_server_url, path, pool_size=pool_size, retries=retries, coalesce=coalesce, **kwargs)
+
+
+def _probe(session, api_server_url):
+    try:
+        response = session.get(f"{api_server_url}/health", timeout=WARM_UP_TIMEOUT)
+        wire.note_capabilities(api_server_url, response.headers)
+    except requests.exceptions.RequestException as e:
+        logger.warning(f"AIDA connection warm-up failed for {api_server_url}: {str(e)}")
+
+
+def warm_up(api_server_url, pool_size=None):
+    """
+    Open a connection to the AIDA server so the first user request reuses it.
+    """
+    _probe(get_session(api_server_url, pool_size), api_server_url)
+
+
+def warm_up_connections():
+    """
+    before_request hook: warm the connection pool the first time a worker
+    serves a site. The probe runs in a background thread so the request
+    that triggers it is not delayed.
+    """
+    site = getattr(frappe.local, "site", None)
+    if not site or site in _site_urls:
+        return
+    if time.time() - _warm_up_failures.get(site, 0) < WARM_UP_RETRY_INTERVAL:
+        return
+
+    try:
+        from aida_agent_app import backends
+        from aida_agent_app.api import get_settings
+
+        settings = get_settings()["settings"]
+        pool_size = settings.get("connection_pool_size")
+        probes = [
+            (get_session(api_server_url, pool_size), api_server_url)
+            for api_server_url in backends.urls(settings["api_server_url"], settings.get("backends"))
+        ]
+    except Exception as e:
+        # Back off instead of re-reading the settings on every request
+        _warm_up_failures[site] = time.time()
+        logger.warning(f"Could not prepare AIDA connection pool: {str(e)}")
+        return
+
+    _warm_up_failures.pop(site, None)
+
+    for session, api_server_url in probes:
+        threading.Thread(target=_probe, args=(session, api_server_url), daemon=True).start()
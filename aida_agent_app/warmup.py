@@ -0,0 +1,299 @@
+import time
+import logging
+from collections import Counter
+import frappe
+from frappe.utils import add_days, cint, now_datetime
+from aida_agent_app import (
+    upstream, agent_sessions, answer_cache, backends, chat_history, doctype_index, health, intent_router, lead_index,
+    wire
+)
+from aida_agent_app.api import build_init_payload, build_chat_payload
+from aida_agent_app.settings import get_settings_snapshot
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+WARM_UP_QUEUE = "long"
+WARM_UP_JOB_TIMEOUT = 30 * 60
+# Migrations within this long of a warm-up that asked questions don't ask them again
+WARM_UP_COOLDOWN = 6 * 60 * 60
+COOLDOWN_KEY = "aida_warm_up_answers"
+
+DEFAULT_QUESTION_COUNT = 20
+DEFAULT_PROFILE_COUNT = 3
+# Chat history read to find the most asked questions
+HISTORY_DAYS = 30
+HISTORY_SCAN_LIMIT = 20000
+PROFILE_SCAN_LIMIT = 200
+
+INIT_TIMEOUT = 30
+CHAT_TIMEOUT = 60
+
+# Asked when the site has little or no chat history yet
+DEFAULT_QUESTIONS = (
+    "How do I create a new customer?",
+    "How to make a sales invoice?",
+    "How do I set up a new item?",
+    "How to create a purchase order?"
+)
+
+
+def top_questions(limit=DEFAULT_QUESTION_COUNT, days=HISTORY_DAYS):
+    """
+    The most asked cacheable questions of the last days, topped up with the
+    default questions, and how many of them each user asked.
+    """
+    rows = frappe.get_all(
+        chat_history.MESSAGE_DOCTYPE,
+        filters={"role": "user", "creation": [">=", add_days(now_datetime(), -days)]},
+        fields=["user", "message"],
+        order_by="creation desc",
+        limit_page_length=HISTORY_SCAN_LIMIT
+    )
+
+    counts = Counter()
+    phrasing = {}
+    askers = Counter()
+    for row in rows:
+        if not answer_cache.is_cacheable_question(row.message):
+            continue
+        normalized = answer_cache.normalize_question(row.message)
+        counts[normalized] += 1
+        # The most recent phrasing is the one asked
+        phrasing.setdefault(normalized, row.message)
+        askers[row.user] += 1
+
+    questions = [phrasing[normalized] for normalized, _count in counts.most_common(limit)]
+    for question in DEFAULT_QUESTIONS:
+        if len(questions) >= limit:
+            break
+        if answer_cache.normalize_question(question) not in counts:
+            questions.append(question)
+    return questions, askers
+
+
+def top_profile_users(askers, limit=DEFAULT_PROFILE_COUNT):
+    """
+    One user for each of the role profiles that ask the most. Answers are
+    cached per role profile, so each is warmed as a user who has it. Without
+    chat history, the most recently active desk users are used.
+    """
+    if not askers:
+        askers = Counter(frappe.get_all(
+            "User",
+            filters={"enabled": 1, "user_type": "System User", "name": ["not in", ["Administrator", "Guest"]]},
+            order_by="last_active desc",
+            limit_page_length=PROFILE_SCAN_LIMIT,
+            pluck="name"
+        ))
+
+    profiles = Counter()
+    users = {}
+    for user, count in askers.most_common():
+        if user == "Guest":
+            continue
+        profile = answer_cache.role_profile(user)
+        profiles[profile] += count
+        # The user who asks the most stands for the profile
+        users.setdefault(profile, user)
+    return [users[profile] for profile, _count in profiles.most_common(limit)]
+
+
+def warm_indexes():
+    """
+    Load the settings snapshot and build the lookup structures shared through
+    Redis, so the first chat after a deploy doesn't build them.
+    """
+    get_settings_snapshot()
+    vocabulary, _pattern = intent_router.get_router()
+    # Already in a worker, so build here rather than queueing another job
+    doctype_index.ensure_index(background=False)
+    lead_index.ensure_index()
+    return {
+        "intent_phrases": len(vocabulary),
+        "doctypes_indexed": doctype_index.indexed_count()
+    }
+
+
+def warm_connections():
+    """
+    Probe every AIDA server, opening a pooled connection and refreshing the
+    health status all workers read.
+    """
+    settings = get_settings_snapshot()
+    servers = {}
+    for api_server_url in backends.urls(settings.api_server_url, settings.backends):
+        status = health.check(api_server_url, settings.connection_pool_size)
+        servers[api_server_url] = {
+            "status": status["status"],
+            "latency_ms": status["latency_ms"],
+            "error": status["error"]
+        }
+    return {"servers": servers}
+
+
+def _is_clean_answer(response_data):
+    """
+    The warm-up has no browser session of the user to send, so a reply
+    reporting an error or failed access must not be cached for everyone
+    with the role profile; only plain answers are kept.
+    """
+    return answer_cache.is_cacheable_answer(response_data) and not response_data.get("error") \
+        and response_data.get("success") is not False
+
+
+def _resolve(user, questions, settings):
+    """
+    Ask the questions without a cached answer as the user, in one agent
+    session, and cache the answers. Returns (answered, already_cached, failed).
+    """
+    keys = [(question, answer_cache.make_key(question, user)) for question in questions]
+    missing = [(question, key) for question, key in keys if key and not answer_cache.has_answer(key)]
+    cached = len(keys) - len(missing)
+    if not missing:
+        return 0, cached, 0
+
+    pairs = backends.pool(settings.api_server_url, settings.backends)
+    api_server_url = backends.for_new_session(f"{user}:warm-up", pairs)
+    if health.known_down(api_server_url):
+        return 0, cached, len(missing)
+
+    response = upstream.post(
+        api_server_url,
+        "/init_session",
+        pool_size=settings.connection_pool_size,
+        retries=1,
+        json=build_init_payload(settings.as_dict(), user, frappe.session.sid),
+        timeout=INIT_TIMEOUT
+    )
+    session_id = wire.decode(response).get("session_id") if response.status_code == 200 else None
+    if not session_id:
+        logger.warning(f"AIDA warm-up could not start a session for {user}: {response.status_code}")
+        return 0, cached, len(missing)
+
+    backends.pin(session_id, api_server_url, pairs)
+    answered = failed = 0
+    try:
+        for question, key in missing:
+            try:
+                response = upstream.post(
+                    api_server_url,
+                    "/chat",
+                    pool_size=settings.connection_pool_size,
+                    json=build_chat_payload(session_id, question, user),
+                    timeout=CHAT_TIMEOUT
+                )
+                response_data = wire.decode(response) if response.status_code == 200 else None
+                if _is_clean_answer(response_data):
+                    answer_cache.store(key, response_data, settings.answer_cache_ttl)
+                    answered += 1
+                else:
+                    failed += 1
+            except Exception as e:
+                logger.warning(f"AIDA warm-up question failed: {str(e)}")
+                failed += 1
+    finally:
+        agent_sessions.clear_upstream_session(session_id)
+    return answered, cached, failed
+
+
+def warm_answers(question_count=DEFAULT_QUESTION_COUNT, profile_count=DEFAULT_PROFILE_COUNT):
+    """
+    Put answers to the most asked onboarding questions in the shared answer
+    cache for the most common role profiles. Chat history is not written.
+    """
+    settings = get_settings_snapshot()
+    if not settings.answer_cache_ttl or not question_count:
+        return {"questions": 0, "answered": 0, "already_cached": 0, "failed": 0, "users": []}
+
+    questions, askers = top_questions(question_count)
+    users = top_profile_users(askers, profile_count)
+
+    totals = Counter()
+    current_user = frappe.session.user
+    try:
+        for user in users:
+            # As in the benchmark driver, the user's name stands in for a browser session
+            frappe.set_user(user)
+            try:
+                answered, cached, failed = _resolve(user, questions, settings)
+            except Exception as e:
+                logger.warning(f"AIDA warm-up failed for {user}: {str(e)}")
+                answered, cached, failed = 0, 0, len(questions)
+            totals.update(answered=answered, already_cached=cached, failed=failed)
+    finally:
+        frappe.set_user(current_user)
+
+    return {
+        "questions": len(questions),
+        "answered": totals["answered"],
+        "already_cached": totals["already_cached"],
+        "failed": totals["failed"],
+        "users": users
+    }
+
+
+def warm_up(question_count=DEFAULT_QUESTION_COUNT, profile_count=DEFAULT_PROFILE_COUNT):
+    """
+    Build local indexes, open connections to the AIDA servers and pre-answer
+    the most asked questions, timing each stage. A failed stage is reported
+    and the next one still runs.
+    """
+    start_time = time.time()
+    report = {"site": frappe.local.site, "stages": {}}
+    for name, stage, kwargs in (
+        ("indexes", warm_indexes, {}),
+        ("connections", warm_connections, {}),
+        ("answers", warm_answers, {"question_count": question_count, "profile_count": profile_count})
+    ):
+        stage_start = time.time()
+        try:
+            result = stage(**kwargs)
+        except Exception as e:
+            logger.warning(f"AIDA warm-up stage {name} failed: {str(e)}", exc_info=True)
+            result = {"error": str(e)}
+        result["seconds"] = round(time.time() - stage_start, 3)
+        report["stages"][name] = result
+
+    report["seconds"] = round(time.time() - start_time, 3)
+    logger.info(f"AIDA warm-up of {report['site']} finished in {report['seconds']}s")
+    return report
+
+
+def format_report(report):
+    """
+    The warm-up report as lines for the terminal.
+    """
+    lines = [f"AIDA warm-up of {report['site']}: {report['seconds']}s"]
+    for name, result in report["stages"].items():
+        details = ", ".join(f"{key}={value}" for key, value in result.items() if key not in ("seconds", "servers"))
+        lines.append(f"  {name}: {result['seconds']}s ({details})" if details else f"  {name}: {result['seconds']}s")
+        if name == "connections":
+            for api_server_url, status in result.get("servers", {}).items():
+                latency = f"{status['latency_ms']} ms" if status["latency_ms"] is not None else status["error"]
+                lines.append(f"    {api_server_url}: {status['status']} ({latency})")
+    return "\n".join(lines)
+
+
+def enqueue_warm_up():
+    """
+    after_migrate hook: warm up in a background worker once the deploy is done.
+    Indexes and connections are always warmed. Questions are asked at most
+    once per WARM_UP_COOLDOWN, and never with aida_warm_up_questions set to 0
+    in site_config.json.
+    """
+    try:
+        question_count = cint(frappe.conf.get("aida_warm_up_questions", DEFAULT_QUESTION_COUNT))
+        cache = frappe.cache()
+        if question_count and not cache.set(cache.make_key(COOLDOWN_KEY), 1, nx=True, ex=WARM_UP_COOLDOWN):
+            question_count = 0
+
+        frappe.enqueue(
+            "aida_agent_app.warmup.warm_up",
+            queue=WARM_UP_QUEUE,
+            timeout=WARM_UP_JOB_TIMEOUT,
+            question_count=question_count
+        )
+    except Exception as e:
+        # A missed warm-up only means a slower first hour
+        logger.warning(f"Could not queue the AIDA warm-up: {str(e)}")
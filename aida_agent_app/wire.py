@@ -0,0 +1,255 @@
+import gzip
+import json
+import logging
+from urllib3.util.request import ACCEPT_ENCODING
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ijson
+    from ijson.common import ObjectBuilder
+except ImportError:
+    ijson = None
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+JSON_TYPE = "application/json"
+MSGPACK_TYPE = "application/x-msgpack"
+
+# Response header listing the request encodings an AIDA server accepts,
+# e.g. "gzip, msgpack". Servers that don't send it get plain JSON bodies.
+CAPABILITIES_HEADER = "X-AIDA-Encodings"
+
+# Small bodies cost more CPU to compress than they save on the wire
+COMPRESS_MIN_SIZE = 1024
+COMPRESS_LEVEL = 5
+
+# Request encodings each AIDA server URL has advertised, per worker process
+_capabilities = {}
+
+
+def accept_header():
+    """
+    Accept header for upstream calls: msgpack when it can be decoded here,
+    with JSON as the fallback every server understands.
+    """
+    if msgpack is not None:
+        return f"{MSGPACK_TYPE}, {JSON_TYPE};q=0.9"
+    return JSON_TYPE
+
+
+def accept_encoding_header():
+    """
+    Every content-coding urllib3 can decode here: gzip and deflate always,
+    br and zstd when brotli or zstandard is installed.
+    """
+    return ACCEPT_ENCODING
+
+
+def note_capabilities(api_server_url, headers):
+    value = headers.get(CAPABILITIES_HEADER)
+    if value is None:
+        return
+    _capabilities[api_server_url] = frozenset(
+        encoding.strip().lower() for encoding in value.split(",") if encoding.strip()
+    )
+
+
+def get_capabilities(api_server_url):
+    return _capabilities.get(api_server_url, frozenset())
+
+
+def prepare(api_server_url, kwargs):
+    """
+    Encode the request for the server: a json= payload becomes msgpack when
+    the server accepts it and is gzipped when large enough and accepted.
+    Returns new requests keyword arguments.
+    """
+    kwargs = dict(kwargs)
+    headers = dict(kwargs.pop("headers", None) or {})
+    headers.setdefault("Accept", accept_header())
+
+    payload = kwargs.pop("json", None)
+    if payload is not None:
+        capabilities = get_capabilities(api_server_url)
+        if msgpack is not None and "msgpack" in capabilities:
+            body = msgpack.packb(payload, use_bin_type=True)
+            headers["Content-Type"] = MSGPACK_TYPE
+        else:
+            body = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+            headers["Content-Type"] = JSON_TYPE
+
+        if "gzip" in capabilities and len(body) >= COMPRESS_MIN_SIZE:
+            body = gzip.compress(body, COMPRESS_LEVEL)
+            headers["Content-Encoding"] = "gzip"
+        kwargs["data"] = body
+
+    kwargs["headers"] = headers
+    return kwargs
+
+
+def _media_type(content_type):
+    return (content_type or "").split(";", 1)[0].strip().lower()
+
+
+def is_structured(content_type):
+    return _media_type(content_type) in (JSON_TYPE, MSGPACK_TYPE)
+
+
+def loads(body, content_type):
+    """
+    Decode a response body by its content type. Transfer compression has
+    already been undone by urllib3.
+    """
+    if _media_type(content_type) == MSGPACK_TYPE:
+        if msgpack is None:
+            raise ValueError("AIDA server sent msgpack but the msgpack package is not installed")
+        return msgpack.unpackb(body, raw=False)
+    if orjson is not None:
+        return orjson.loads(body)
+    return json.loads(body)
+
+
+class _ChunkReader:
+    """
+    File-like view of an iterator of byte chunks, for parsers that read().
+    """
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._buffer = b""
+
+    def read(self, size=-1):
+        if not self._buffer:
+            self._buffer = next((chunk for chunk in self._chunks if chunk), b"")
+        if size is None or size < 0:
+            data, self._buffer = self._buffer + b"".join(self._chunks), b""
+        else:
+            data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+
+def _pop_path(document, path):
+    """
+    Remove and return the list at a dotted path such as "result.leads",
+    or [] when there is none.
+    """
+    *parents, key = path.split(".")
+    for parent in parents:
+        document = document.get(parent) if isinstance(document, dict) else None
+    if isinstance(document, dict) and isinstance(document.get(key), list):
+        return document.pop(key)
+    return []
+
+
+class DocumentStream:
+    """
+    Parse a response body as it is read, handing out the items of the
+    arrays at the given dotted paths one at a time instead of building the
+    whole document. Iterate for (path, item) pairs; once done, `summary`
+    holds the rest of the document without those arrays.
+
+    JSON is streamed when ijson is installed and msgpack arrays at the top
+    level when msgpack is. Otherwise the body is decoded whole and the items
+    are handed out from it.
+    """
+
+    def __init__(self, chunks, content_type, paths):
+        self.chunks = chunks
+        self.content_type = content_type
+        self.paths = tuple(paths)
+        self.summary = None
+
+    def __iter__(self):
+        media_type = _media_type(self.content_type)
+        if media_type == MSGPACK_TYPE and msgpack is not None:
+            return self._iter_msgpack()
+        if media_type != MSGPACK_TYPE and ijson is not None:
+            return self._iter_json()
+        return self._iter_whole()
+
+    def _iter_whole(self):
+        document = loads(b"".join(self.chunks), self.content_type)
+        yield from self._iter_rest(document)
+
+    def _iter_rest(self, document):
+        for path in self.paths:
+            for item in _pop_path(document, path):
+                yield path, item
+        self.summary = document
+
+    def _iter_json(self):
+        item_prefixes = {f"{path}.item": path for path in self.paths}
+        summary = ObjectBuilder()
+        item = path = None
+        depth = 0
+
+        # Floats rather than Decimals, so items can be stored and published as they are
+        for prefix, event, value in ijson.parse(_ChunkReader(self.chunks), use_float=True):
+            if item is not None:
+                item.event(event, value)
+                if event in ("start_map", "start_array"):
+                    depth += 1
+                elif event in ("end_map", "end_array"):
+                    depth -= 1
+                if not depth:
+                    yield path, item.value
+                    item = None
+            elif prefix in item_prefixes:
+                path = item_prefixes[prefix]
+                if event in ("start_map", "start_array"):
+                    item = ObjectBuilder()
+                    item.event(event, value)
+                    depth = 1
+                else:
+                    yield path, value
+            else:
+                summary.event(event, value)
+
+        document = getattr(summary, "value", None)
+        # Drop the arrays, now empty, that were handed out
+        for path in self.paths:
+            _pop_path(document, path)
+        self.summary = document
+
+    def _iter_msgpack(self):
+        unpacker = msgpack.Unpacker(_ChunkReader(self.chunks), raw=False)
+        top_level = {path for path in self.paths if "." not in path}
+        document = {}
+        for _index in range(unpacker.read_map_header()):
+            key = unpacker.unpack()
+            if key in top_level:
+                for _item in range(unpacker.read_array_header()):
+                    yield key, unpacker.unpack()
+            else:
+                document[key] = unpacker.unpack()
+        # Arrays nested deeper arrive with their parent
+        yield from self._iter_rest(document)
+
+
+def decode(response):
+    if _media_type(response.headers.get("content-type")) == MSGPACK_TYPE:
+        return loads(response.content, MSGPACK_TYPE)
+    return response.json()
+
+
+def decode_error(response):
+    """
+    Error details from a failed response, or {} when the body isn't JSON or msgpack.
+    """
+    if not is_structured(response.headers.get("content-type")):
+        return {}
+    try:
+        data = decode(response)
+    except ValueError:
+        return {}
+    return data if isinstance(data, dict) else {}
@@ -1,5 +1,6 @@
 import frappe
 from frappe import _
+from aida_agent_app.settings import get_settings_snapshot, default_settings
 
 def get_context(context):
     """
@@ -14,20 +15,16 @@ def get_context(context):
     
     # Get AIDA Agent settings
     try:
-        settings = frappe.get_single("AIDA Agent Settings")
-        context.settings = {
-            "widget_position": settings.get("widget_position", "bottom-right"),
-            "widget_theme": settings.get("widget_theme", "light"),
-            "enable_onboarding": settings.get("enable_onboarding", 1),
-            "enable_lead_creation": settings.get("enable_lead_creation", 1)
-        }
-    except:
-        # Default settings if document doesn't exist
-        context.settings = {
-            "widget_position": "bottom-right",
-            "widget_theme": "light",
-            "enable_onboarding": 1,
-            "enable_lead_creation": 1
-        }
+        settings = get_settings_snapshot()
+    except Exception:
+        # Default settings if settings can't be read
+        settings = default_settings()
+    
+    context.settings = {
+        "widget_position": settings.widget_position,
+        "widget_theme": settings.widget_theme,
+        "enable_onboarding": settings.enable_onboarding,
+        "enable_lead_creation": settings.enable_lead_creation
+    }
     
     return context
\ No newline at end of file
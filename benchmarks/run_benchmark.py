@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+Load-test the AIDA entry points against the stub AIDA server.
+
+Run from the bench's sites directory with the app installed:
+
+    cd frappe-bench/sites
+    ../env/bin/python ../apps/aida_agent_app/benchmarks/run_benchmark.py \
+        --site mysite.local --concurrency 16 --requests 500 --latency-ms 200
+
+The site's AIDA server URL is pointed at the stub for the duration of the run,
+with the server pool and bulk lead inserts turned off, and restored afterwards. Results are printed (or written with --output) as JSON
+with p50/p95/p99 latency, throughput and worker occupancy per endpoint.
+"""
+
+import os
+import sys
+import json
+import time
+import queue
+import argparse
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import frappe
+from stub_server import StubConfig, start_stub_server
+
+ENDPOINTS = ("test_connection", "init_agent_session", "chat_with_agent", "create_leads", "clear_agent_session")
+BENCH_SESSION_ID = "aida-benchmark-session"
+
+
+def _undecorated(fn):
+    # Skip @rate_limit, which needs an HTTP request to identify the caller;
+    # the metrics wrapper underneath is kept so its overhead is measured too
+    return getattr(fn, "__wrapped__", fn)
+
+
+def _call(endpoint, index):
+    """
+    Run one call of an endpoint inside an initialised frappe context.
+    Returns True when the call succeeded.
+    """
+    from aida_agent_app import api, leads
+
+    if endpoint == "test_connection":
+        result = api.test_connection()
+    elif endpoint == "init_agent_session":
+        result = api.init_agent_session()
+    elif endpoint == "chat_with_agent":
+        result = _undecorated(api.chat_with_agent)(BENCH_SESSION_ID, f"Benchmark message {index}")
+    elif endpoint == "clear_agent_session":
+        result = api.clear_agent_session(BENCH_SESSION_ID)
+    elif endpoint == "create_leads":
+        # create_leads only queues; run the job body in-process so the upstream call is measured
+        job_id = f"bench{index}{frappe.generate_hash(length=8)}"
+        leads.run_lead_job(job_id, "Restaurant", "Benchmark City", 10, frappe.session.user, frappe.session.sid)
+        result = {"success": (leads.get_job_status(job_id) or {}).get("status") == "completed"}
+    else:
+        raise ValueError(f"Unknown endpoint: {endpoint}")
+
+    return isinstance(result, dict) and result.get("success") is not False
+
+
+def percentile(sorted_values, pct):
+    """
+    Nearest-rank percentile of an already sorted list.
+    """
+    if not sorted_values:
+        return 0.0
+    rank = max(int(round(pct / 100.0 * len(sorted_values))) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def summarize(endpoint, samples, wall_time, concurrency):
+    latencies = sorted(duration for duration, _ in samples)
+    errors = sum(1 for _, ok in samples if not ok)
+    busy = sum(latencies)
+    return {
+        "endpoint": endpoint,
+        "requests": len(samples),
+        "errors": errors,
+        "error_rate": round(errors / len(samples), 4) if samples else 0.0,
+        "concurrency": concurrency,
+        "wall_time": round(wall_time, 4),
+        "throughput_rps": round(len(samples) / wall_time, 2) if wall_time else 0.0,
+        "latency": {
+            "mean": round(busy / len(latencies), 4) if latencies else 0.0,
+            "p50": round(percentile(latencies, 50), 4),
+            "p95": round(percentile(latencies, 95), 4),
+            "p99": round(percentile(latencies, 99), 4),
+            "max": round(latencies[-1], 4) if latencies else 0.0
+        },
+        # Share of the available worker time spent inside calls
+        "worker_occupancy": round(busy / (wall_time * concurrency), 4) if wall_time else 0.0
+    }
+
+
+def _worker(args, work, samples, lock, ready):
+    frappe.init(site=args.site, sites_path=args.sites_path)
+    frappe.connect()
+    frappe.set_user(args.user)
+    ready.wait()
+    try:
+        while True:
+            try:
+                endpoint, index = work.get_nowait()
+            except queue.Empty:
+                return
+
+            start = time.perf_counter()
+            try:
+                ok = _call(endpoint, index)
+            except Exception:
+                ok = False
+            duration = time.perf_counter() - start
+            frappe.db.rollback()
+
+            with lock:
+                samples.append((duration, ok))
+    finally:
+        frappe.destroy()
+
+
+def run_endpoint(args, endpoint):
+    work = queue.Queue()
+    for index in range(args.requests):
+        work.put((endpoint, index))
+
+    samples = []
+    lock = threading.Lock()
+    ready = threading.Event()
+    threads = [
+        threading.Thread(target=_worker, args=(args, work, samples, lock, ready), daemon=True)
+        for _ in range(args.concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+
+    # Workers connect before the clock starts so setup isn't counted
+    time.sleep(1)
+    start = time.perf_counter()
+    ready.set()
+    for thread in threads:
+        thread.join()
+    wall_time = time.perf_counter() - start
+
+    return summarize(endpoint, samples, wall_time, args.concurrency)
+
+
+def _point_site_at(api_server_url, bulk_insert_leads=0, enabled_backends=()):
+    """
+    Send the site's AIDA traffic to api_server_url and return the previous
+    (api_server_url, bulk_insert_leads, enabled_backends) so it can be restored.
+    Pool servers not in enabled_backends are disabled, so no request bypasses
+    the stub; bulk lead inserts are off by default because they commit each
+    chunk, which the per-call rollback cannot undo.
+    """
+    from aida_agent_app.settings import SETTINGS_DOCTYPE, BACKEND_DOCTYPE, bump_settings_version
+
+    pool_filters = {"parenttype": SETTINGS_DOCTYPE, "parentfield": "backends"}
+    previous = (
+        frappe.db.get_single_value(SETTINGS_DOCTYPE, "api_server_url"),
+        frappe.db.get_single_value(SETTINGS_DOCTYPE, "bulk_insert_leads"),
+        tuple(frappe.get_all(BACKEND_DOCTYPE, filters={**pool_filters, "enabled": 1}, pluck="name"))
+    )
+    frappe.db.set_single_value(SETTINGS_DOCTYPE, "api_server_url", api_server_url)
+    frappe.db.set_single_value(SETTINGS_DOCTYPE, "bulk_insert_leads", bulk_insert_leads)
+    frappe.db.set_value(BACKEND_DOCTYPE, pool_filters, "enabled", 0)
+    if enabled_backends:
+        frappe.db.set_value(BACKEND_DOCTYPE, {"name": ["in", list(enabled_backends)]}, "enabled", 1)
+    frappe.db.commit()
+    bump_settings_version()
+    return previous
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the AIDA Agent API entry points")
+    parser.add_argument("--site", required=True)
+    parser.add_argument("--sites-path", default=".")
+    parser.add_argument("--user", default="Administrator")
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS),
+                        help="Comma separated list of: " + ", ".join(ENDPOINTS))
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200, help="Requests per endpoint")
+    parser.add_argument("--server-url", default=None,
+                        help="Use an already running AIDA server instead of starting the stub")
+    parser.add_argument("--latency-ms", type=float, default=100)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--payload-bytes", type=int, default=512)
+    parser.add_argument("--encodings", default="gzip,msgpack",
+                        help="Encodings the stub advertises; empty to compare against plain JSON")
+    parser.add_argument("--output", default=None, help="Write the JSON report to this file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    endpoints = [name.strip() for name in args.endpoints.split(",") if name.strip()]
+    unknown = set(endpoints) - set(ENDPOINTS)
+    if unknown:
+        raise SystemExit(f"Unknown endpoints: {', '.join(sorted(unknown))}")
+
+    stub = None
+    server_url = args.server_url
+    if not server_url:
+        config = StubConfig(
+            latency_ms=args.latency_ms,
+            jitter_ms=args.jitter_ms,
+            error_rate=args.error_rate,
+            payload_bytes=args.payload_bytes,
+            encodings=[e.strip() for e in args.encodings.split(",") if e.strip()]
+        )
+        stub, server_url = start_stub_server(config=config)
+
+    frappe.init(site=args.site, sites_path=args.sites_path)
+    frappe.connect()
+    previous = _point_site_at(server_url)
+
+    report = {
+        "server_url": server_url,
+        "stub": None,
+        "config": {
+            "concurrency": args.concurrency,
+            "requests_per_endpoint": args.requests,
+            "latency_ms": args.latency_ms,
+            "jitter_ms": args.jitter_ms,
+            "error_rate": args.error_rate,
+            "payload_bytes": args.payload_bytes,
+            "encodings": args.encodings
+        },
+        "results": []
+    }
+    try:
+        for endpoint in endpoints:
+            report["results"].append(run_endpoint(args, endpoint))
+    finally:
+        _point_site_at(*previous)
+        frappe.destroy()
+        if stub:
+            report["stub"] = stub.stats.as_dict()
+            stub.shutdown()
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
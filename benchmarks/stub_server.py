@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Stub AIDA API server for benchmarks.
+
+Serves /health, /init_session, /chat, /create_leads and /clear_session with
+configurable latency, error rate and payload size, so the ERPNext side can be
+measured without a real agent or LLM behind it.
+
+    python benchmarks/stub_server.py --port 5055 --latency-ms 250 --error-rate 0.01
+"""
+
+import gzip
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+MSGPACK_TYPE = "application/x-msgpack"
+
+
+class StubConfig:
+    def __init__(self, latency_ms=100, jitter_ms=0, error_rate=0.0, payload_bytes=512,
+                 leads_per_request=None, stream_chunks=20, encodings=("gzip", "msgpack")):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.payload_bytes = payload_bytes
+        self.leads_per_request = leads_per_request
+        self.stream_chunks = stream_chunks
+        # Encodings advertised and used; empty behaves like an older JSON-only server
+        self.encodings = tuple(e for e in encodings if e != "msgpack" or msgpack is not None)
+
+
+class StubStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = {}
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def start(self, path):
+        with self.lock:
+            self.requests[path] = self.requests.get(path, 0) + 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def finish(self, sent, received):
+        with self.lock:
+            self.in_flight -= 1
+            self.bytes_sent += sent
+            self.bytes_received += received
+
+    def as_dict(self):
+        with self.lock:
+            return {
+                "requests": dict(self.requests),
+                "bytes_sent": self.bytes_sent,
+                "bytes_received": self.bytes_received,
+                "max_in_flight": self.max_in_flight
+            }
+
+
+def _filler(size):
+    return ("lorem ipsum dolor sit amet " * (size // 27 + 1))[:size]
+
+
+def _make_lead(index, config):
+    return {
+        "lead_name": f"Stub Business {index}",
+        "company_name": f"Stub Business {index} LLC",
+        "phone": f"+1 555 01{index:04d}",
+        "email_id": f"info@stub{index}.example.com",
+        "website": f"https://stub{index}.example.com",
+        "address": _filler(min(config.payload_bytes, 200)),
+        "notes": _filler(config.payload_bytes)
+    }
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    server_version = "AIDAStub/1.0"
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def config(self):
+        return self.server.config
+
+    def _sleep(self):
+        delay = self.config.latency_ms + random.uniform(-self.config.jitter_ms, self.config.jitter_ms)
+        time.sleep(max(delay, 0) / 1000.0)
+
+    def _read_body(self):
+        """
+        Returns (payload, bytes read off the wire).
+        """
+        length = int(self.headers.get("Content-Length") or 0)
+        if not length:
+            return {}, 0
+        raw = self.rfile.read(length)
+        body = gzip.decompress(raw) if self.headers.get("Content-Encoding") == "gzip" else raw
+        try:
+            if self.headers.get("Content-Type", "").startswith(MSGPACK_TYPE):
+                return msgpack.unpackb(body, raw=False), length
+            return json.loads(body), length
+        except ValueError:
+            return {}, length
+
+    def _send_json(self, status, data):
+        accept = self.headers.get("Accept", "")
+        if "msgpack" in self.config.encodings and MSGPACK_TYPE in accept:
+            body = msgpack.packb(data, use_bin_type=True)
+            content_type = MSGPACK_TYPE
+        else:
+            body = json.dumps(data).encode("utf-8")
+            content_type = "application/json"
+
+        gzipped = "gzip" in self.config.encodings and "gzip" in self.headers.get("Accept-Encoding", "") \
+            and len(body) >= 1024
+        if gzipped:
+            body = gzip.compress(body, 5)
+
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        if gzipped:
+            self.send_header("Content-Encoding", "gzip")
+        if self.config.encodings:
+            self.send_header("X-AIDA-Encodings", ", ".join(self.config.encodings))
+        self.end_headers()
+        self.wfile.write(body)
+        return len(body)
+
+    def _send_stream(self, text):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        sent = 0
+        step = max(len(text) // self.config.stream_chunks, 1)
+        for start in range(0, len(text), step):
+            event = f"data: {json.dumps({'token': text[start:start + step]})}\n\n".encode("utf-8")
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(event), event))
+            self.wfile.flush()
+            sent += len(event)
+            time.sleep(self.config.latency_ms / 1000.0 / self.config.stream_chunks)
+        done = b"data: [DONE]\n\n"
+        self.wfile.write(b"%x\r\n%s\r\n0\r\n\r\n" % (len(done), done))
+        return sent + len(done)
+
+    def _handle(self, method):
+        path = self.path.split("?", 1)[0]
+        self.server.stats.start(path)
+        sent = 0
+        received = 0
+        try:
+            payload, received = self._read_body() if method == "POST" else ({}, 0)
+            if path == "/health":
+                sent = self._send_json(200, {"status": "healthy", "active_sessions": 0, "mongodb_available": False})
+                return
+
+            self._sleep()
+            if random.random() < self.config.error_rate:
+                sent = self._send_json(500, {"error": "Stub failure"})
+                return
+
+            if path == "/init_session":
+                sent = self._send_json(200, {"session_id": uuid.uuid4().hex, "status": "initialized"})
+            elif path == "/chat":
+                answer = _filler(self.config.payload_bytes)
+                if payload.get("stream"):
+                    sent = self._send_stream(answer)
+                else:
+                    sent = self._send_json(200, {"response": answer})
+            elif path == "/create_leads":
+                count = self.config.leads_per_request or int(payload.get("count") or 10)
+                leads = [_make_lead(i, self.config) for i in range(count)]
+                sent = self._send_json(200, {"result": {"created_count": count, "leads": leads}})
+            elif path == "/clear_session":
+                sent = self._send_json(200, {"status": "cleared"})
+            else:
+                sent = self._send_json(404, {"error": "Not found"})
+        finally:
+            self.server.stats.finish(sent, received)
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+
+def start_stub_server(host="127.0.0.1", port=0, config=None):
+    """
+    Start the stub server on a background thread and return (server, base_url).
+    Port 0 picks a free port.
+    """
+    server = ThreadingHTTPServer((host, port), StubHandler)
+    server.daemon_threads = True
+    server.config = config or StubConfig()
+    server.stats = StubStats()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub AIDA API server for benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5055)
+    parser.add_argument("--latency-ms", type=float, default=100)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--payload-bytes", type=int, default=512)
+    parser.add_argument("--leads-per-request", type=int, default=None)
+    parser.add_argument("--encodings", default="gzip,msgpack",
+                        help="Encodings to advertise; empty for a JSON-only server")
+    args = parser.parse_args()
+
+    config = StubConfig(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        payload_bytes=args.payload_bytes,
+        leads_per_request=args.leads_per_request,
+        encodings=[e.strip() for e in args.encodings.split(",") if e.strip()]
+    )
+    server, url = start_stub_server(args.host, args.port, config)
+    print(f"Stub AIDA server listening on {url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -22,6 +22,9 @@ def install_aida_agent():
         # 3. Build assets
         build_assets()
         
+        # 4. Warm up indexes, connections and common answers
+        warm_up()
+        
         print("✅ AIDA Agent installation completed successfully!")
         print("\n📋 Next steps:")
         print("1. Restart your bench server: bench restart")
@@ -93,6 +96,24 @@ def build_assets():
         print(f"⚠️  Asset building failed: {str(e)}")
         print("   This is not critical - assets may still work")
 
+def warm_up():
+    """
+    Build lookup indexes, open AIDA server connections and pre-answer the
+    most asked questions, so first users don't hit cold paths
+    """
+    try:
+        print("🔥 Warming up AIDA Agent...")
+        
+        from aida_agent_app.warmup import warm_up as run_warm_up, format_report
+        
+        report = run_warm_up()
+        frappe.db.commit()
+        print(format_report(report))
+        
+    except Exception as e:
+        print(f"⚠️  Warm-up failed: {str(e)}")
+        print("   This is not critical - caches fill on first use")
+
 def check_installation():
     """
     Check if AIDA Agent is properly installed
@@ -118,7 +139,7 @@ def check_installation():
     # Check if assets exist
     import os
     css_path = frappe.get_app_path("aida_agent_app", "public", "css", "aida_agent.css")
-    js_path = frappe.get_app_path("aida_agent_app", "public", "js", "aida_agent.js")
+    js_path = frappe.get_app_path("aida_agent_app", "public", "js", "aida_chat.js")
     
     if os.path.exists(css_path):
         print("✅ CSS assets found")
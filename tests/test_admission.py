@@ -0,0 +1,93 @@
+import asyncio
+import unittest
+from unittest.mock import patch, MagicMock
+from aida_agent_app import admission
+
+class TestAdmission(unittest.TestCase):
+    """Test cases for the bench-wide slots for AIDA calls."""
+
+    def setUp(self):
+        self.cache = MagicMock()
+        self.cache.make_key.side_effect = lambda key, shared=False: key
+        self.script = self.cache.register_script.return_value
+        patcher = patch('aida_agent_app.admission.frappe.cache', return_value=self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        conf_patcher = patch('aida_agent_app.admission.frappe.conf', {"gunicorn_workers": 9})
+        conf_patcher.start()
+        self.addCleanup(conf_patcher.stop)
+
+    def test_limits_leave_workers_for_erpnext(self):
+        """Test that running and queued calls use at most two thirds of the workers."""
+        self.assertEqual(admission.limits(), (3, 3))
+
+        with patch('aida_agent_app.admission.frappe.conf', {"aida_max_concurrent_calls": 5}):
+            self.assertEqual(admission.limits(), (5, 5))
+
+    def test_slot_released_after_call(self):
+        """Test that a slot is given back even when the call fails."""
+        self.script.return_value = 1
+
+        with self.assertRaises(ValueError):
+            with admission.slot("test@example.com"):
+                raise ValueError("upstream failed")
+
+        member = self.script.call_args[1]["args"][0]
+        self.assertTrue(member.endswith(":test@example.com"))
+        self.cache.zrem.assert_called_once_with(admission.SLOTS_KEY, member)
+
+    @patch('aida_agent_app.admission.time.sleep')
+    def test_queued_call_admitted(self, mock_sleep):
+        """Test that a queued call runs once a slot frees up."""
+        self.script.side_effect = [0, 0, 1]
+
+        with admission.slot("test@example.com"):
+            pass
+
+        arriving = [call[1]["args"][-1] for call in self.script.call_args_list]
+        self.assertEqual(arriving, [1, 0, 0])
+        self.assertEqual(mock_sleep.call_count, 2)
+
+    @patch('aida_agent_app.admission.asyncio.sleep')
+    def test_async_slot_waits_on_loop(self, mock_sleep):
+        """Test that the gateway's slot waits with asyncio.sleep and is released after the call."""
+        self.script.side_effect = [0, 1]
+
+        async def call():
+            async with admission.async_slot("test@example.com"):
+                pass
+
+        asyncio.run(call())
+
+        mock_sleep.assert_awaited_once_with(admission.POLL_INTERVAL)
+        member = self.script.call_args[1]["args"][0]
+        self.cache.zrem.assert_called_once_with(admission.SLOTS_KEY, member)
+
+    def test_full_queue_rejected_at_once(self):
+        """Test that a full queue answers busy without waiting."""
+        self.script.return_value = -1
+
+        with self.assertRaises(admission.AdmissionRejected) as context:
+            with admission.slot("test@example.com"):
+                self.fail("call ran without a slot")
+
+        self.assertEqual(self.script.call_count, 1)
+        self.assertEqual(admission.busy_response(context.exception)["retry_after"], admission.RETRY_AFTER)
+
+    @patch('aida_agent_app.admission.time.sleep')
+    @patch('aida_agent_app.admission.time.time')
+    def test_wait_is_bounded(self, mock_time, mock_sleep):
+        """Test that a call gives up its place in the queue after MAX_WAIT."""
+        clock = iter([0, 0, 4, 8, 10])
+        mock_time.side_effect = lambda: next(clock)
+        self.script.return_value = 0
+
+        with self.assertRaises(admission.AdmissionRejected):
+            with admission.slot("test@example.com"):
+                pass
+
+        member = self.script.call_args[1]["args"][0]
+        self.cache.zrem.assert_called_once_with(admission.QUEUE_KEY, member)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,38 @@
+import time
+import unittest
+from unittest.mock import patch
+from aida_agent_app import agent_sessions
+
+class TestAgentSessions(unittest.TestCase):
+    """Test cases for the upstream agent session registry."""
+
+    def test_session_lost_detection(self):
+        """Test that only errors about the session itself count as a lost session."""
+        self.assertTrue(agent_sessions.is_session_lost(404, {"error": "Session not found"}))
+        self.assertTrue(agent_sessions.is_session_lost(400, {"detail": "Invalid session_id"}))
+        self.assertTrue(agent_sessions.is_session_lost(410, {}))
+        self.assertFalse(agent_sessions.is_session_lost(404, {}))
+        self.assertFalse(agent_sessions.is_session_lost(400, {"error": "Message too long"}))
+        self.assertFalse(agent_sessions.is_session_lost(500, {"error": "Session store not found"}))
+
+    @patch('aida_agent_app.agent_sessions.frappe.enqueue')
+    @patch('aida_agent_app.agent_sessions.get_settings_version')
+    @patch('aida_agent_app.agent_sessions.frappe.cache')
+    def test_outdated_session_cleared_upstream(self, mock_cache, mock_version, mock_enqueue):
+        """Test that a session from older settings is dropped and released on its server."""
+        mock_version.return_value = 2
+        mock_cache.return_value.get_value.return_value = {
+            "session_data": {"session_id": "upstream123"},
+            "api_server_url": "http://old-aida:5000",
+            "settings_version": 1,
+            "created_at": time.time()
+        }
+
+        self.assertIsNone(agent_sessions.get_session("test@example.com", "sid123"))
+
+        mock_cache.return_value.delete_value.assert_called_once()
+        self.assertEqual(mock_enqueue.call_args[1]["session_id"], "upstream123")
+        self.assertEqual(mock_enqueue.call_args[1]["api_server_url"], "http://old-aida:5000")
+
+if __name__ == '__main__':
+    unittest.main()
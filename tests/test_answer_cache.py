@@ -0,0 +1,40 @@
+import unittest
+from unittest.mock import patch
+from aida_agent_app import answer_cache
+
+class TestAnswerCache(unittest.TestCase):
+    """Test cases for the shared answer cache keys."""
+
+    @patch('aida_agent_app.answer_cache.frappe.get_roles')
+    def test_equivalent_questions_share_key(self, mock_get_roles):
+        """Test that case, punctuation and spacing don't change the key."""
+        mock_get_roles.return_value = ["Sales User", "Employee"]
+
+        first = answer_cache.make_key("How do I create a Sales Invoice?", user="a@example.com")
+        second = answer_cache.make_key("  how do i create a sales   invoice ", user="b@example.com")
+
+        self.assertIsNotNone(first)
+        self.assertEqual(first, second)
+
+    @patch('aida_agent_app.answer_cache.frappe.get_roles')
+    def test_roles_change_key(self, mock_get_roles):
+        """Test that users with different roles don't share answers."""
+        mock_get_roles.side_effect = [["Sales User"], ["Accounts User"]]
+
+        first = answer_cache.make_key("How do I create a payment entry?", user="a@example.com")
+        second = answer_cache.make_key("How do I create a payment entry?", user="b@example.com")
+
+        self.assertNotEqual(first, second)
+
+    def test_non_question_not_cached(self):
+        """Test that commands and session-specific messages bypass the cache."""
+        self.assertIsNone(answer_cache.make_key("create a customer called Acme", user="a@example.com"))
+
+    def test_session_dependent_answer_not_cacheable(self):
+        """Test that answers flagged by the server are never shared."""
+        self.assertFalse(answer_cache.is_cacheable_answer({"response": "Done", "session_dependent": True}))
+        self.assertFalse(answer_cache.is_cacheable_answer({"response": "Done", "cacheable": False}))
+        self.assertTrue(answer_cache.is_cacheable_answer({"response": "Go to Selling > Customer"}))
+
+if __name__ == '__main__':
+    unittest.main()
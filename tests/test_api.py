@@ -2,7 +2,14 @@ import unittest
 import json
 from unittest.mock import patch, MagicMock
 import frappe
-from aida_agent_app.api import get_settings, save_settings, test_connection, chat_with_agent
+import requests
+from aida_agent_app.api import (
+    get_settings, save_settings, test_connection, init_agent_session, chat_with_agent, chat_with_agent_stream,
+    create_leads, create_leads_batch, search_doctypes
+)
+from aida_agent_app.settings import _snapshots
+from aida_agent_app.circuit_breaker import CircuitOpenError
+from aida_agent_app.admission import AdmissionRejected
 
 class TestAidaAgentAPI(unittest.TestCase):
     """Test cases for AIDA Agent API functions."""
@@ -20,33 +27,60 @@ class TestAidaAgentAPI(unittest.TestCase):
             "widget_theme": "light"
         }
     
-    @patch('aida_agent_app.api.frappe.get_single')
-    @patch('aida_agent_app.api.get_site_url')
-    def test_get_settings_success(self, mock_get_site_url, mock_get_single):
+    @patch('aida_agent_app.settings.frappe.cache')
+    @patch('aida_agent_app.settings.frappe.db.get_singles_dict')
+    @patch('aida_agent_app.settings.get_site_url')
+    def test_get_settings_success(self, mock_get_site_url, mock_get_singles_dict, mock_cache):
         """Test successful retrieval of settings."""
         mock_get_site_url.return_value = "http://localhost:8000"
-        mock_settings = MagicMock()
-        mock_settings.get.side_effect = lambda key, default=None: self.test_settings.get(key, default)
-        mock_get_single.return_value = mock_settings
+        mock_get_singles_dict.return_value = self.test_settings
+        mock_cache.return_value.get.return_value = None
+        mock_cache.return_value.get_value.return_value = None
+        _snapshots.clear()
         
         result = get_settings()
         
         self.assertTrue(result["success"])
         self.assertIn("settings", result)
         self.assertEqual(result["settings"]["api_server_url"], "http://localhost:5000")
+        mock_get_singles_dict.assert_called_once_with("AIDA Agent Settings")
     
-    @patch('aida_agent_app.api.frappe.get_single')
-    @patch('aida_agent_app.api.get_site_url')
-    def test_get_settings_exception(self, mock_get_site_url, mock_get_single):
-        """Test get_settings when document doesn't exist."""
+    @patch('aida_agent_app.settings.frappe.cache')
+    @patch('aida_agent_app.settings.frappe.db.get_singles_dict')
+    @patch('aida_agent_app.settings.get_site_url')
+    def test_get_settings_exception(self, mock_get_site_url, mock_get_singles_dict, mock_cache):
+        """Test get_settings when settings can't be read."""
         mock_get_site_url.return_value = "http://localhost:8000"
-        mock_get_single.side_effect = Exception("Document not found")
+        mock_get_singles_dict.side_effect = Exception("Document not found")
+        mock_cache.return_value.get.return_value = None
+        mock_cache.return_value.get_value.return_value = None
+        _snapshots.clear()
         
         result = get_settings()
         
         self.assertTrue(result["success"])
         self.assertEqual(result["settings"]["api_server_url"], "http://localhost:5000")
     
+    @patch('aida_agent_app.settings.frappe.cache')
+    @patch('aida_agent_app.settings.frappe.db.get_singles_dict')
+    def test_get_settings_uses_snapshot(self, mock_get_singles_dict, mock_cache):
+        """Test that settings are read once per settings version."""
+        mock_get_singles_dict.return_value = self.test_settings
+        mock_cache.return_value.get.return_value = b"7"
+        mock_cache.return_value.get_value.return_value = None
+        _snapshots.clear()
+        
+        get_settings()
+        get_settings()
+        
+        mock_get_singles_dict.assert_called_once()
+        
+        # A version bump from another worker forces a reload
+        mock_cache.return_value.get.return_value = b"8"
+        get_settings()
+        
+        self.assertEqual(mock_get_singles_dict.call_count, 2)
+    
     @patch('aida_agent_app.api.frappe.get_single')
     @patch('aida_agent_app.api.frappe.new_doc')
     @patch('aida_agent_app.api.frappe.db.commit')
@@ -98,9 +132,11 @@ class TestAidaAgentAPI(unittest.TestCase):
         with self.assertRaises(frappe.ValidationError):
             save_settings(large_payload)
     
-    @patch('aida_agent_app.api.requests.get')
+    @patch('aida_agent_app.health.frappe.cache')
+    @patch('aida_agent_app.api.health.get_status', return_value=None)
+    @patch('aida_agent_app.api.upstream.get')
     @patch('aida_agent_app.api.get_settings')
-    def test_connection_success(self, mock_get_settings, mock_requests_get):
+    def test_connection_success(self, mock_get_settings, mock_requests_get, mock_get_status, mock_cache):
         """Test successful connection test."""
         mock_get_settings.return_value = {
             "success": True,
@@ -118,9 +154,11 @@ class TestAidaAgentAPI(unittest.TestCase):
         self.assertEqual(result["message"], "Connection successful")
         self.assertIn("server_status", result)
     
-    @patch('aida_agent_app.api.requests.get')
+    @patch('aida_agent_app.health.frappe.cache')
+    @patch('aida_agent_app.api.health.get_status', return_value=None)
+    @patch('aida_agent_app.api.upstream.get')
     @patch('aida_agent_app.api.get_settings')
-    def test_connection_failure(self, mock_get_settings, mock_requests_get):
+    def test_connection_failure(self, mock_get_settings, mock_requests_get, mock_get_status, mock_cache):
         """Test connection test failure."""
         mock_get_settings.return_value = {
             "success": True,
@@ -134,7 +172,7 @@ class TestAidaAgentAPI(unittest.TestCase):
         self.assertFalse(result["success"])
         self.assertIn("Connection failed", result["message"])
     
-    @patch('aida_agent_app.api.requests.post')
+    @patch('aida_agent_app.api.upstream.post')
     @patch('aida_agent_app.api.get_settings')
     @patch('aida_agent_app.api.frappe.utils.sanitize_html')
     @patch('aida_agent_app.api.logger')
@@ -159,6 +197,29 @@ class TestAidaAgentAPI(unittest.TestCase):
         self.assertTrue(result["success"])
         self.assertIn("response_data", result)
     
+    @patch('aida_agent_app.api.upstream.post')
+    @patch('aida_agent_app.api.answer_cache.lookup')
+    @patch('aida_agent_app.api.answer_cache.make_key')
+    @patch('aida_agent_app.api.get_settings')
+    @patch('aida_agent_app.api.frappe.utils.sanitize_html')
+    def test_chat_with_agent_answer_cache_hit(self, mock_sanitize, mock_get_settings, mock_make_key,
+                                              mock_lookup, mock_requests_post):
+        """Test that a cached answer skips the AIDA server."""
+        mock_get_settings.return_value = {
+            "success": True,
+            "settings": dict(self.test_settings, answer_cache_ttl=3600)
+        }
+        mock_sanitize.return_value = "How do I create a sales invoice?"
+        mock_make_key.return_value = "abc123"
+        mock_lookup.return_value = {"response": "Go to Selling > Sales Invoice > New"}
+        
+        result = chat_with_agent("session123", "How do I create a sales invoice?")
+        
+        self.assertTrue(result["success"])
+        self.assertTrue(result["cached"])
+        self.assertEqual(result["response_data"]["response"], "Go to Selling > Sales Invoice > New")
+        mock_requests_post.assert_not_called()
+    
     def test_chat_with_agent_invalid_input(self):
         """Test chat with agent with invalid input."""
         # Test empty message
@@ -182,11 +243,13 @@ class TestAidaAgentAPI(unittest.TestCase):
         self.assertFalse(result["success"])
         self.assertIn("Session ID is required", result["message"])
     
-    @patch('aida_agent_app.api.requests.post')
+    @patch('aida_agent_app.upstream.circuit_breaker')
+    @patch('aida_agent_app.upstream.get_session')
     @patch('aida_agent_app.api.get_settings')
     @patch('aida_agent_app.api.frappe.utils.sanitize_html')
-    @patch('aida_agent_app.api.time.sleep')
-    def test_chat_with_agent_retry_logic(self, mock_sleep, mock_sanitize, mock_get_settings, mock_requests_post):
+    @patch('aida_agent_app.upstream.time.sleep')
+    def test_chat_with_agent_retry_logic(self, mock_sleep, mock_sanitize, mock_get_settings, mock_get_session,
+                                         mock_circuit_breaker):
         """Test chat with agent retry logic."""
         mock_get_settings.return_value = {
             "success": True,
@@ -194,25 +257,280 @@ class TestAidaAgentAPI(unittest.TestCase):
         }
         
         mock_sanitize.return_value = "Hello"
+        mock_circuit_breaker.CLOSED = "closed"
+        mock_circuit_breaker.get_state.return_value = "closed"
+        mock_circuit_breaker.backoff_delay.return_value = 0.1
         
         # First two calls fail, third succeeds
         mock_response_success = MagicMock()
         mock_response_success.status_code = 200
         mock_response_success.json.return_value = {"response": "Success!"}
         
-        mock_requests_post.side_effect = [
-            Exception("Connection error"),
-            Exception("Connection error"),
+        mock_session = mock_get_session.return_value
+        mock_session.request.side_effect = [
+            requests.exceptions.ConnectionError("Connection error"),
+            requests.exceptions.ConnectionError("Connection error"),
             mock_response_success
         ]
         
-        with patch('aida_agent_app.api.frappe.session') as mock_session:
-            mock_session.user = "test@example.com"
+        with patch('aida_agent_app.api.frappe.session') as mock_session_info:
+            mock_session_info.user = "test@example.com"
             result = chat_with_agent("session123", "Hello")
         
         self.assertTrue(result["success"])
-        self.assertEqual(mock_requests_post.call_count, 3)
+        self.assertEqual(mock_session.request.call_count, 3)
         self.assertEqual(mock_sleep.call_count, 2)
+        self.assertEqual(mock_circuit_breaker.record_failure.call_count, 2)
+        mock_circuit_breaker.record_success.assert_called_once()
+    
+    @patch('aida_agent_app.api.upstream.get')
+    @patch('aida_agent_app.api.health.get_status')
+    @patch('aida_agent_app.api.get_settings')
+    def test_connection_uses_probed_status(self, mock_get_settings, mock_get_status, mock_requests_get):
+        """Test that a recent status from the health prober answers without a live call."""
+        mock_get_settings.return_value = {
+            "success": True,
+            "settings": self.test_settings
+        }
+        mock_get_status.return_value = {
+            "status": "down", "error": "Connection refused", "checked_at": 1700000000.0
+        }
+        
+        result = test_connection()
+        
+        self.assertFalse(result["success"])
+        self.assertIn("Connection refused", result["message"])
+        mock_requests_get.assert_not_called()
+    
+    @patch('aida_agent_app.api.upstream.post')
+    @patch('aida_agent_app.api.health.known_down')
+    @patch('aida_agent_app.api.get_settings')
+    @patch('aida_agent_app.api.frappe.utils.sanitize_html')
+    def test_chat_with_agent_known_down(self, mock_sanitize, mock_get_settings, mock_known_down, mock_requests_post):
+        """Test that chat answers at once while the prober sees the server down."""
+        mock_get_settings.return_value = {
+            "success": True,
+            "settings": self.test_settings
+        }
+        mock_sanitize.return_value = "Hello"
+        mock_known_down.return_value = {"status": "down", "error": "timeout", "checked_at": 0}
+        
+        result = chat_with_agent("session123", "Hello")
+        
+        self.assertFalse(result["success"])
+        self.assertIn("retry_after", result)
+        mock_requests_post.assert_not_called()
+    
+    @patch('aida_agent_app.api.upstream.post')
+    @patch('aida_agent_app.api.get_settings')
+    @patch('aida_agent_app.api.frappe.utils.sanitize_html')
+    def test_chat_with_agent_circuit_open(self, mock_sanitize, mock_get_settings, mock_requests_post):
+        """Test that an open circuit fails fast with a retry hint."""
+        mock_get_settings.return_value = {
+            "success": True,
+            "settings": self.test_settings
+        }
+        mock_sanitize.return_value = "Hello"
+        mock_requests_post.side_effect = CircuitOpenError("http://localhost:5000", 12)
+        
+        result = chat_with_agent("session123", "Hello")
+        
+        self.assertFalse(result["success"])
+        self.assertEqual(result["retry_after"], 12)
+
+    @patch('aida_agent_app.api.frappe.enqueue')
+    @patch('aida_agent_app.api.circuit_breaker.raise_if_open')
+    @patch('aida_agent_app.api.backends.for_session')
+    @patch('aida_agent_app.api.get_settings_snapshot')
+    @patch('aida_agent_app.api.route_locally')
+    @patch('aida_agent_app.api.frappe.utils.sanitize_html')
+    def test_chat_stream_circuit_open(self, mock_sanitize, mock_route, mock_snapshot, mock_for_session,
+                                      mock_raise_if_open, mock_enqueue):
+        """Test that a stream isn't queued while the circuit is open."""
+        mock_sanitize.return_value = "Hello"
+        mock_route.return_value = None
+        mock_snapshot.return_value.answer_cache_ttl = 0
+        mock_for_session.return_value = "http://localhost:5000"
+        mock_raise_if_open.side_effect = CircuitOpenError("http://localhost:5000", 12)
+        
+        result = chat_with_agent_stream("session123", "Hello", "abc123")
+        
+        self.assertFalse(result["success"])
+        self.assertEqual(result["retry_after"], 12)
+        mock_enqueue.assert_not_called()
+
+    @patch('aida_agent_app.api.upstream.post')
+    @patch('aida_agent_app.api.chat_history.queue_exchange')
+    @patch('aida_agent_app.api.intent_router.route')
+    @patch('aida_agent_app.api.frappe.utils.sanitize_html')
+    def test_chat_with_agent_routed_locally(self, mock_sanitize, mock_route, mock_queue_exchange, mock_requests_post):
+        """Test that navigation requests are answered without the AIDA server."""
+        mock_sanitize.return_value = "open the customer list"
+        mock_route.return_value = {"response": "You can open Customer here: /app/customer", "route": "/app/customer"}
+        
+        result = chat_with_agent("session123", "open the customer list")
+        
+        self.assertTrue(result["success"])
+        self.assertTrue(result["routed"])
+        self.assertEqual(result["response_data"]["route"], "/app/customer")
+        mock_route.assert_called_once_with("open the customer list", frappe.session.user)
+        mock_queue_exchange.assert_called_once()
+        mock_requests_post.assert_not_called()
+    
+    @patch('aida_agent_app.api.upstream.post')
+    @patch('aida_agent_app.api.admission.slot')
+    @patch('aida_agent_app.api.get_settings')
+    @patch('aida_agent_app.api.frappe.utils.sanitize_html')
+    def test_chat_with_agent_busy(self, mock_sanitize, mock_get_settings, mock_slot, mock_requests_post):
+        """Test that chat answers busy at once when no slot is free."""
+        mock_get_settings.return_value = {
+            "success": True,
+            "settings": self.test_settings
+        }
+        mock_sanitize.return_value = "Hello"
+        mock_slot.side_effect = AdmissionRejected(5)
+        
+        result = chat_with_agent("session123", "Hello")
+        
+        self.assertFalse(result["success"])
+        self.assertTrue(result["busy"])
+        self.assertEqual(result["retry_after"], 5)
+        mock_requests_post.assert_not_called()
+
+    @patch('aida_agent_app.api.upstream.post')
+    @patch('aida_agent_app.api.admission.slot')
+    @patch('aida_agent_app.api.health.known_down')
+    @patch('aida_agent_app.api.agent_sessions.register_session')
+    @patch('aida_agent_app.api.agent_sessions.forget_session')
+    @patch('aida_agent_app.api.get_settings')
+    @patch('aida_agent_app.api.frappe.utils.sanitize_html')
+    def test_chat_with_agent_recovers_lost_session(self, mock_sanitize, mock_get_settings, mock_forget, mock_register,
+                                                   mock_known_down, mock_slot, mock_requests_post):
+        """Test that a session the AIDA server lost is replaced and the message resent once."""
+        mock_get_settings.return_value = {
+            "success": True,
+            "settings": self.test_settings
+        }
+        mock_sanitize.return_value = "Hello"
+        mock_known_down.return_value = None
+        
+        def reply(status_code, body):
+            response = MagicMock()
+            response.status_code = status_code
+            response.headers = {"content-type": "application/json"}
+            response.json.return_value = body
+            return response
+        
+        mock_requests_post.side_effect = [
+            reply(404, {"error": "Session not found"}),
+            reply(200, {"session_id": "upstream456"}),
+            reply(200, {"response": "Hi again"})
+        ]
+        
+        result = chat_with_agent("session123", "Hello")
+        
+        self.assertTrue(result["success"])
+        self.assertEqual(result["session_data"]["session_id"], "upstream456")
+        self.assertEqual(mock_forget.call_args[1]["session_id"], "session123")
+        self.assertEqual(mock_requests_post.call_args_list[1][0][1], "/init_session")
+        self.assertEqual(mock_requests_post.call_args[1]["json"]["session_id"], "upstream456")
+
+    @patch('aida_agent_app.api.upstream.post')
+    @patch('aida_agent_app.api.agent_sessions.get_session')
+    def test_init_agent_session_reuses_live_session(self, mock_get_session, mock_requests_post):
+        """Test that a registered session is returned without calling /init_session."""
+        mock_get_session.return_value = {"session_id": "upstream123"}
+
+        result = init_agent_session()
+
+        self.assertTrue(result["success"])
+        self.assertTrue(result["cached"])
+        self.assertEqual(result["session_data"]["session_id"], "upstream123")
+        mock_requests_post.assert_not_called()
+
+    @patch('aida_agent_app.api.upstream.post')
+    @patch('aida_agent_app.api.agent_sessions.register_session')
+    @patch('aida_agent_app.api.agent_sessions.get_session')
+    @patch('aida_agent_app.api.get_settings')
+    def test_init_agent_session_refresh(self, mock_get_settings, mock_get_session, mock_register,
+                                        mock_requests_post):
+        """Test that refresh skips the registry and registers the new session."""
+        mock_get_settings.return_value = {
+            "success": True,
+            "settings": self.test_settings
+        }
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.json.return_value = {"session_id": "upstream456"}
+        mock_requests_post.return_value = mock_response
+
+        result = init_agent_session(refresh=1)
+
+        self.assertTrue(result["success"])
+        mock_get_session.assert_not_called()
+        mock_register.assert_called_once()
+        self.assertEqual(mock_register.call_args[0][2], {"session_id": "upstream456"})
+
+    @patch('aida_agent_app.api.leads.start_lead_job')
+    def test_create_leads_queues_job(self, mock_start_lead_job):
+        """Test that create_leads returns a job id without calling the server."""
+        mock_start_lead_job.return_value = "job123"
+        
+        result = create_leads("restaurants", "New York", "20")
+        
+        self.assertTrue(result["success"])
+        self.assertEqual(result["job_id"], "job123")
+        mock_start_lead_job.assert_called_once_with("restaurants", "New York", 20)
+    
+    @patch('aida_agent_app.api.leads.start_lead_job')
+    def test_create_leads_invalid_count(self, mock_start_lead_job):
+        """Test create_leads with an out-of-range count."""
+        result = create_leads("restaurants", "New York", 0)
+        
+        self.assertFalse(result["success"])
+        mock_start_lead_job.assert_not_called()
+    
+    @patch('aida_agent_app.api.leads.start_lead_batch_job')
+    def test_create_leads_batch(self, mock_start_batch):
+        """Test that batch queries in both shapes are normalized and queued."""
+        mock_start_batch.return_value = "batch123"
+        queries = [
+            {"business_type": "dentists", "location": "Austin", "count": 5},
+            ["law firms", "Dallas", "10"]
+        ]
+        
+        result = create_leads_batch(json.dumps(queries))
+        
+        self.assertTrue(result["success"])
+        self.assertEqual(result["job_id"], "batch123")
+        mock_start_batch.assert_called_once_with([("dentists", "Austin", 5), ("law firms", "Dallas", 10)])
+    
+    @patch('aida_agent_app.api.leads.start_lead_batch_job')
+    def test_create_leads_batch_too_large(self, mock_start_batch):
+        """Test that oversized batches are rejected."""
+        queries = [["cafes", f"City {i}", 5] for i in range(51)]
+        
+        result = create_leads_batch(queries)
+        
+        self.assertFalse(result["success"])
+        mock_start_batch.assert_not_called()
+
+    @patch('aida_agent_app.api.doctype_index.search')
+    def test_search_doctypes(self, mock_search):
+        """Test that DocType search caps the result count and requires login."""
+        mock_search.return_value = [{"doctype": "Customer", "route": "/app/customer"}]
+        
+        with patch('aida_agent_app.api.frappe.session') as mock_session:
+            mock_session.user = "test@example.com"
+            result = search_doctypes("customer", limit=500)
+        
+        self.assertTrue(result["success"])
+        self.assertEqual(result["results"][0]["doctype"], "Customer")
+        mock_search.assert_called_once_with("customer", limit=50)
+        
+        with patch('aida_agent_app.api.frappe.session') as mock_session:
+            mock_session.user = "Guest"
+            self.assertFalse(search_doctypes("customer")["success"])
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
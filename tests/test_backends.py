@@ -0,0 +1,101 @@
+import time
+import unittest
+from unittest.mock import patch, MagicMock
+from aida_agent_app import backends, circuit_breaker, health
+
+PAIRS = (("http://aida-1:5000", 1), ("http://aida-2:5000", 1), ("http://aida-3:5000", 1))
+
+class TestSessionAffinity(unittest.TestCase):
+    """Test cases for pinning agent sessions to a server of the pool."""
+
+    def test_ring_is_stable_when_a_server_is_added(self):
+        """Test that adding a server only moves keys onto the new server."""
+        keys = [f"session-{i}" for i in range(500)]
+        before = {key: backends.ring_order(key, PAIRS[:2])[0] for key in keys}
+        after = {key: backends.ring_order(key, PAIRS)[0] for key in keys}
+
+        moved = [key for key in keys if before[key] != after[key]]
+        self.assertTrue(moved)
+        self.assertTrue(all(after[key] == "http://aida-3:5000" for key in moved))
+
+    def test_weight_shifts_share(self):
+        """Test that a heavier server owns more of the ring."""
+        pairs = (("http://aida-1:5000", 3), ("http://aida-2:5000", 1))
+        owners = [backends.ring_order(f"session-{i}", pairs)[0] for i in range(2000)]
+
+        self.assertGreater(owners.count("http://aida-1:5000"), 2 * owners.count("http://aida-2:5000"))
+
+    @patch('aida_agent_app.backends.is_available', return_value=True)
+    @patch('aida_agent_app.backends.frappe.cache')
+    def test_pinned_server_wins(self, mock_cache, mock_available):
+        """Test that a session stays on the server it was created on."""
+        owner = backends.ring_order("abc", PAIRS)[0]
+        pinned = next(url for url, _ in PAIRS if url != owner)
+        mock_cache.return_value.get_value.return_value = pinned
+
+        self.assertEqual(backends.for_session("abc", PAIRS), pinned)
+
+    @patch('aida_agent_app.backends.is_available')
+    @patch('aida_agent_app.backends.frappe.cache')
+    def test_fails_over_along_ring(self, mock_cache, mock_available):
+        """Test that a down server's sessions move to the next server on the ring."""
+        mock_cache.return_value.get_value.return_value = None
+        order = backends.ring_order("abc", PAIRS)
+        mock_available.side_effect = lambda url: url != order[0]
+
+        self.assertEqual(backends.for_session("abc", PAIRS), order[1])
+
+    def test_single_server_skips_routing(self):
+        """Test that a pool of one needs no Redis lookups."""
+        pairs = (("http://localhost:5000", 1),)
+
+        self.assertEqual(backends.for_session("abc", pairs), "http://localhost:5000")
+        self.assertEqual(backends.acquire(pairs), ("http://localhost:5000", None))
+
+    @patch('aida_agent_app.backends.circuit_breaker.get_state', return_value=circuit_breaker.CLOSED)
+    @patch('aida_agent_app.health.get_status')
+    @patch('aida_agent_app.backends.frappe.cache')
+    def test_down_server_recovers_behind_pool(self, mock_cache, mock_get_status, mock_get_state):
+        """Test that routing to a long-down server leaves its recheck turn to the request."""
+        pairs = PAIRS[:2]
+        down_url = pairs[0][0]
+        mock_get_status.side_effect = lambda url: (
+            {"status": health.DOWN, "checked_at": time.time() - health.RECHECK_AFTER} if url == down_url else None
+        )
+        taken = set()
+        cache = mock_cache.return_value
+        cache.get_value.return_value = down_url
+        cache.make_key.side_effect = lambda key: key
+        cache.exists.side_effect = lambda key: key in taken
+        cache.set.side_effect = lambda key, value, nx, ex: None if key in taken else taken.add(key) or True
+
+        # The session goes back to its own server and that request gets to try it
+        self.assertEqual(backends.for_session("abc", pairs), down_url)
+        self.assertIsNone(health.known_down(down_url))
+
+        # While that recheck is out, the next request fails over
+        self.assertEqual(backends.for_session("abc", pairs), pairs[1][0])
+
+class TestLeastOutstanding(unittest.TestCase):
+    """Test cases for routing lead jobs to the least busy server."""
+
+    @patch('aida_agent_app.backends.is_available', return_value=True)
+    @patch('aida_agent_app.backends.frappe.cache')
+    def test_picks_fewest_outstanding_per_weight(self, mock_cache, mock_available):
+        """Test that outstanding requests are weighed against server weight."""
+        cache = MagicMock()
+        cache.make_key.side_effect = lambda key: key
+        cache.mget.return_value = [b"4", b"3", b"2"]
+        mock_cache.return_value = cache
+        pairs = (("http://aida-1:5000", 4), ("http://aida-2:5000", 1), ("http://aida-3:5000", 1))
+
+        api_server_url, key = backends.acquire(pairs)
+
+        self.assertEqual(api_server_url, "http://aida-1:5000")
+        cache.pipeline.return_value.incr.assert_called_once_with(key)
+
+        backends.release((api_server_url, key))
+        cache.decr.assert_called_once_with(key)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+import unittest
+from unittest.mock import patch
+import frappe
+from aida_agent_app import chat_history
+
+class TestChatHistory(unittest.TestCase):
+    """Test cases for the paginated chat history."""
+
+    def make_rows(self, ids):
+        return [frappe._dict(name=i, role="user", message=f"Message {i}", cached=0, creation=None) for i in ids]
+
+    @patch('aida_agent_app.chat_history.frappe.get_all')
+    def test_first_page_is_newest_oldest_first(self, mock_get_all):
+        """Test that the first page holds the newest messages in reading order."""
+        mock_get_all.return_value = self.make_rows([10, 9, 8, 7])
+
+        page = chat_history.get_history("test@example.com", limit=3)
+
+        self.assertEqual([m["name"] for m in page["messages"]], [8, 9, 10])
+        self.assertTrue(page["has_more"])
+        self.assertEqual(page["next_before"], 8)
+        kwargs = mock_get_all.call_args[1]
+        self.assertEqual(kwargs["filters"], {"user": "test@example.com"})
+        self.assertEqual(kwargs["order_by"], "name desc")
+        self.assertEqual(kwargs["limit_page_length"], 4)
+
+    @patch('aida_agent_app.chat_history.frappe.get_all')
+    def test_older_page_uses_keyset(self, mock_get_all):
+        """Test that older pages filter by id instead of using an offset."""
+        mock_get_all.return_value = self.make_rows([7, 6])
+
+        page = chat_history.get_history("test@example.com", before="8", limit=3)
+
+        self.assertEqual(mock_get_all.call_args[1]["filters"]["name"], ["<", 8])
+        self.assertFalse(page["has_more"])
+        self.assertIsNone(page["next_before"])
+
+    @patch('aida_agent_app.chat_history.frappe.get_all')
+    def test_page_size_is_capped(self, mock_get_all):
+        """Test that a huge limit can't load the whole history at once."""
+        mock_get_all.return_value = []
+
+        chat_history.get_history("test@example.com", limit=100000)
+
+        self.assertEqual(mock_get_all.call_args[1]["limit_page_length"], chat_history.MAX_PAGE_SIZE + 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,196 @@
+import unittest
+from unittest.mock import patch
+import frappe
+from aida_agent_app import doctype_index
+
+class FakeCache:
+    """Just enough of frappe.cache() for the DocType index."""
+
+    def __init__(self):
+        self.data = {}
+
+    def make_key(self, key):
+        return key
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+    def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+    def zadd(self, key, mapping):
+        self.data.setdefault(key, {}).update(mapping)
+
+    def zrem(self, key, member):
+        self.data.get(key, {}).pop(member, None)
+
+    def zrange(self, key, start, end, withscores=False):
+        members = sorted(self.data.get(key, {}).items(), key=lambda item: (item[1], item[0]))
+        return [(m.encode(), s) for m, s in members] if withscores else [m.encode() for m, s in members]
+
+    def zrangebylex(self, key, low, high, start=0, num=None):
+        return [m.encode() for m in sorted(self.data.get(key, {})) if low[1:] <= m <= high[1:]][start:start + num]
+
+    def hset(self, key, field, value):
+        self.data.setdefault(key, {})[field] = value
+
+    def hmget(self, key, fields):
+        return [self.data.get(key, {}).get(field) for field in fields]
+
+    def hdel(self, key, field):
+        self.data.get(key, {}).pop(field, None)
+
+    def pipeline(self, transaction=True):
+        cache = self
+
+        class Pipeline:
+            calls = []
+
+            def __getattr__(self, name):
+                return lambda *args, **kwargs: self.calls.append((getattr(cache, name), args, kwargs))
+
+            def execute(self):
+                return [method(*args, **kwargs) for method, args, kwargs in self.calls]
+
+        Pipeline.calls = []
+        return Pipeline()
+
+DOCTYPES = [
+    frappe._dict(name="Sales Invoice", module="Accounts", issingle=0),
+    frappe._dict(name="Stock Entry", module="Stock", issingle=0),
+    frappe._dict(name="Customer", module="Selling", issingle=0),
+    frappe._dict(name="Selling Settings", module="Selling", issingle=1)
+]
+FIELDS = [
+    frappe._dict(parent="Sales Invoice", label="Customer"),
+    frappe._dict(parent="Sales Invoice", label="Posting Date"),
+    frappe._dict(parent="Stock Entry", label="Posting Date"),
+    frappe._dict(parent="Customer", label="Tax ID")
+]
+
+class TestDocTypeIndex(unittest.TestCase):
+    """Test cases for the DocType discovery index."""
+
+    def setUp(self):
+        self.cache = FakeCache()
+        self.doctypes = list(DOCTYPES)
+        self.custom_fields = [frappe._dict(parent="Customer", label="Loyalty Tier")]
+        self.denied = set()
+
+        def get_all(doctype, filters=None, fields=None, or_filters=None, page_length=None):
+            rows = {"DocType": self.doctypes, "DocField": FIELDS, "Custom Field": self.custom_fields}[doctype]
+            names = (filters or {}).get("name") or (filters or {}).get("parent") or (filters or {}).get("dt")
+            rows = [row for row in rows if not names or (row.get("name") or row.parent) in names[1]]
+            if or_filters:
+                rows = [row for row in rows if any(like.strip("%") in row.name.lower() for _f, _op, like in or_filters)]
+            return rows
+
+        for target, kwargs in (
+            ("cache", {"return_value": self.cache}),
+            ("get_all", {"side_effect": get_all}),
+            ("enqueue", {}),
+            ("has_permission", {"side_effect": lambda doctype, ptype, user=None: doctype not in self.denied})
+        ):
+            patcher = patch(f'aida_agent_app.doctype_index.frappe.{target}', **kwargs)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = patch('aida_agent_app.doctype_index.get_url', side_effect=lambda path: f"https://erp.example.com{path}")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def names(self, query, **kwargs):
+        return [result["doctype"] for result in doctype_index.search(query, user="test@example.com", **kwargs)]
+
+    def test_stem(self):
+        """Test that plurals are indexed and looked up by their singular."""
+        self.assertEqual(doctype_index.stem("invoices"), "invoice")
+        self.assertEqual(doctype_index.stem("entries"), "entry")
+        self.assertEqual(doctype_index.stem("address"), "address")
+
+    def test_name_outranks_field_label(self):
+        """Test that the DocType named after a word comes before ones with a field of that name."""
+        doctype_index.build_index()
+        self.assertEqual(self.names("customers"), ["Customer", "Sales Invoice"])
+
+    def test_all_words_matching_rank_first(self):
+        """Test that DocTypes matching more of the query come first."""
+        doctype_index.build_index()
+        self.assertEqual(self.names("posting date stock")[0], "Stock Entry")
+
+    def test_partial_last_word(self):
+        """Test that the last word is matched as a prefix while being typed."""
+        doctype_index.build_index()
+        self.assertEqual(self.names("sales inv"), ["Sales Invoice"])
+
+    def test_result_links(self):
+        """Test that results carry the desk route and module."""
+        doctype_index.build_index()
+        result = doctype_index.search("stock entries", user="test@example.com")[0]
+        self.assertEqual(result["route"], "/app/stock-entry")
+        self.assertEqual(result["url"], "https://erp.example.com/app/stock-entry")
+        self.assertEqual(result["module"], "Stock")
+
+    def test_only_readable_doctypes(self):
+        """Test that DocTypes the user can't read are left out."""
+        doctype_index.build_index()
+        self.denied = {"Customer"}
+        self.assertEqual(self.names("customer"), ["Sales Invoice"])
+
+    def test_missing_index_searches_names_and_queues_one_build(self):
+        """Test that a search never builds the index itself, but matches DocType names until it exists."""
+        self.assertEqual(self.names("sales invoices"), ["Sales Invoice"])
+        # Field labels aren't searched without the index
+        self.assertEqual(self.names("posting date"), [])
+
+        doctype_index.frappe.enqueue.assert_called_once()
+        self.assertEqual(doctype_index.frappe.enqueue.call_args[0][0], "aida_agent_app.doctype_index.build_index")
+        self.assertIsNone(self.cache.get(doctype_index.BUILT_KEY))
+
+    def test_stop_words_only(self):
+        """Test that a query with nothing to look up doesn't build the index."""
+        self.assertEqual(self.names("how do I"), [])
+        self.assertIsNone(self.cache.get(doctype_index.BUILT_KEY))
+        doctype_index.frappe.enqueue.assert_not_called()
+
+    def test_update_replaces_terms(self):
+        """Test that an update drops a DocType's old terms and adds the new ones."""
+        doctype_index.build_index()
+        self.custom_fields = [frappe._dict(parent="Customer", label="Credit Rating")]
+
+        doctype_index.on_custom_field_change(frappe._dict(dt="Customer"))
+
+        self.assertEqual(self.names("loyalty"), [])
+        self.assertEqual(self.names("credit rating"), ["Customer"])
+
+    def test_deleted_doctype_removed(self):
+        """Test that a DocType drops out of the index from on_trash, while its row still exists."""
+        doctype_index.build_index()
+
+        doctype_index.on_doctype_trash(frappe._dict(name="Stock Entry"))
+
+        self.assertEqual(self.names("stock entry"), [])
+        self.assertEqual(self.names("posting date"), ["Sales Invoice"])
+
+    def test_deleted_custom_field_removed(self):
+        """Test that a Custom Field's label drops out once the field is deleted."""
+        doctype_index.build_index()
+        self.custom_fields = []
+
+        doctype_index.on_custom_field_change(frappe._dict(dt="Customer"))
+
+        self.assertEqual(self.names("loyalty"), [])
+
+    def test_update_before_build_is_skipped(self):
+        """Test that hooks don't write a partial index before the first build."""
+        doctype_index.on_doctype_update(frappe._dict(name="Customer"))
+        self.assertEqual(self.cache.data, {})
+
+if __name__ == '__main__':
+    unittest.main()
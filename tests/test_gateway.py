@@ -0,0 +1,101 @@
+import asyncio
+import threading
+import unittest
+from unittest.mock import patch, MagicMock
+from aida_agent_app import gateway
+
+class TestGatewaySessions(unittest.TestCase):
+    """Test cases for validating Frappe sessions in the async gateway."""
+
+    def session(self, **data):
+        values = {
+            "user": "test@example.com",
+            "last_updated": "2024-01-01 10:00:00",
+            "session_expiry": "06:00:00",
+            "csrf_token": "token123"
+        }
+        values.update(data)
+        return {"data": values}
+
+    @patch('aida_agent_app.gateway.now', return_value="2024-01-01 11:00:00")
+    @patch('aida_agent_app.gateway.frappe.cache')
+    def test_live_session_returns_user(self, mock_cache, mock_now):
+        """Test that a cached, unexpired session with a matching CSRF token is accepted."""
+        mock_cache.return_value.hget.return_value = self.session()
+
+        self.assertEqual(gateway.get_session_user("sid123", "token123"), "test@example.com")
+        mock_cache.return_value.hget.assert_called_once_with("session", "sid123")
+
+    @patch('aida_agent_app.gateway.now', return_value="2024-01-01 17:00:01")
+    @patch('aida_agent_app.gateway.frappe.cache')
+    def test_expired_session_rejected(self, mock_cache, mock_now):
+        """Test that a session idle for longer than its expiry is rejected."""
+        mock_cache.return_value.hget.return_value = self.session()
+
+        self.assertIsNone(gateway.get_session_user("sid123", "token123"))
+
+    @patch('aida_agent_app.gateway.now', return_value="2024-01-01 11:00:00")
+    @patch('aida_agent_app.gateway.frappe.cache')
+    def test_csrf_mismatch_rejected(self, mock_cache, mock_now):
+        """Test that a request without the session's CSRF token is rejected."""
+        mock_cache.return_value.hget.return_value = self.session()
+
+        self.assertIsNone(gateway.get_session_user("sid123", "wrong"))
+
+    @patch('aida_agent_app.gateway.frappe.cache')
+    def test_unknown_and_guest_sessions_rejected(self, mock_cache):
+        """Test that missing sessions and Guest never reach the AIDA server."""
+        mock_cache.return_value.hget.return_value = None
+        self.assertIsNone(gateway.get_session_user("sid123", "token123"))
+
+        mock_cache.return_value.hget.return_value = self.session(user="Guest")
+        self.assertIsNone(gateway.get_session_user("sid123", "token123"))
+
+        self.assertIsNone(gateway.get_session_user("Guest"))
+
+class TestGatewayRateLimit(unittest.TestCase):
+    """Test cases for the gateway's per-user rate limit."""
+
+    @patch('aida_agent_app.gateway.frappe.cache')
+    def test_limit_applies_per_window(self, mock_cache):
+        """Test that requests beyond the limit are refused and the window key expires."""
+        cache = MagicMock()
+        cache.make_key.side_effect = lambda key: key
+        cache.incr.side_effect = list(range(1, gateway.CHAT_RATE_LIMIT + 2))
+        mock_cache.return_value = cache
+
+        allowed = [gateway.allow_request("test@example.com") for _ in range(gateway.CHAT_RATE_LIMIT + 1)]
+
+        self.assertTrue(all(allowed[:-1]))
+        self.assertFalse(allowed[-1])
+        cache.expire.assert_called_once()
+
+class TestGatewayChat(unittest.TestCase):
+    """Test cases for the gateway's chat handler."""
+
+    @patch('aida_agent_app.gateway.chat_history')
+    @patch('aida_agent_app.gateway.api.route_locally')
+    @patch('aida_agent_app.gateway.allow_request', return_value=True)
+    @patch.object(gateway.Gateway, '_connect_db')
+    def test_router_runs_off_the_loop(self, mock_connect_db, mock_allow, mock_route_locally, mock_history):
+        """Test that the intent router, which may query the database, runs on the database thread."""
+        threads = []
+
+        def route_locally(user_input, user):
+            threads.append(threading.current_thread().name)
+            return {"response": "Opening Leads", "route": "/app/lead"}
+
+        mock_route_locally.side_effect = route_locally
+        gw = gateway.Gateway()
+        self.addCleanup(gw.db_executor.shutdown)
+
+        result = asyncio.run(gw._chat(
+            "test@example.com", "sid123", {"session_id": "session123", "user_input": "open leads"}, {"upstream": 0.0}
+        ))
+
+        self.assertTrue(result["routed"])
+        self.assertTrue(threads[0].startswith("aida-gateway-db"))
+        self.assertNotEqual(threads[0], threading.current_thread().name)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import time
+import unittest
+from unittest.mock import patch, MagicMock
+from aida_agent_app import health
+
+class TestHealthProber(unittest.TestCase):
+    """Test cases for the cached AIDA server health status."""
+
+    @patch('aida_agent_app.health.frappe.cache')
+    @patch('aida_agent_app.health.upstream.get')
+    def test_healthy_server_stored_as_up(self, mock_get, mock_cache):
+        """Test that a 200 from /health is stored with latency and session count."""
+        response = MagicMock()
+        response.status_code = 200
+        response.json.return_value = {"status": "healthy", "active_sessions": 7}
+        mock_get.return_value = response
+
+        status = health.check("http://localhost:5000")
+
+        self.assertEqual(status["status"], health.UP)
+        self.assertEqual(status["active_sessions"], 7)
+        self.assertIsNotNone(status["latency_ms"])
+        key, stored = mock_cache.return_value.set_value.call_args[0]
+        self.assertEqual(stored, status)
+        self.assertEqual(mock_cache.return_value.set_value.call_args[1]["expires_in_sec"], health.STATUS_TTL)
+
+    @patch('aida_agent_app.health.frappe.cache')
+    @patch('aida_agent_app.health.upstream.get')
+    def test_errors_stored_as_down(self, mock_get, mock_cache):
+        """Test that error statuses and connection failures count as down."""
+        response = MagicMock()
+        response.status_code = 503
+        mock_get.return_value = response
+        self.assertEqual(health.check("http://localhost:5000")["status"], health.DOWN)
+
+        mock_get.side_effect = ConnectionError("Connection refused")
+        status = health.check("http://localhost:5000")
+        self.assertEqual(status["status"], health.DOWN)
+        self.assertEqual(status["error"], "Connection refused")
+
+    @patch('aida_agent_app.health.get_status')
+    def test_known_down(self, mock_get_status):
+        """Test that only a recent down status short-circuits user requests."""
+        mock_get_status.return_value = None
+        self.assertIsNone(health.known_down("http://localhost:5000"))
+
+        mock_get_status.return_value = {"status": health.UP}
+        self.assertIsNone(health.known_down("http://localhost:5000"))
+
+        mock_get_status.return_value = {"status": health.DOWN, "checked_at": time.time()}
+        self.assertEqual(health.known_down("http://localhost:5000")["status"], health.DOWN)
+
+    @patch('aida_agent_app.health.frappe.cache')
+    @patch('aida_agent_app.health.get_status')
+    def test_old_down_status_lets_one_recheck_through(self, mock_get_status, mock_cache):
+        """Test that once a down status is old, one request per interval goes to the server."""
+        mock_get_status.return_value = {"status": health.DOWN, "checked_at": time.time() - health.RECHECK_AFTER}
+        mock_cache.return_value.set.side_effect = [True, None]
+
+        self.assertIsNone(health.known_down("http://localhost:5000"))
+        self.assertEqual(health.known_down("http://localhost:5000")["status"], health.DOWN)
+        self.assertTrue(mock_cache.return_value.set.call_args[1]["nx"])
+
+    @patch('aida_agent_app.health.frappe.cache')
+    @patch('aida_agent_app.health.get_status')
+    def test_answered_request_clears_down_status(self, mock_get_status, mock_cache):
+        """Test that a request the server answered clears a down status but keeps an up one."""
+        mock_get_status.return_value = {"status": health.UP}
+        health.record_up("http://localhost:5000")
+        mock_cache.return_value.delete_value.assert_not_called()
+
+        mock_get_status.return_value = {"status": health.DOWN, "checked_at": time.time()}
+        health.record_up("http://localhost:5000")
+        mock_cache.return_value.delete_value.assert_called_once_with(health._status_key("http://localhost:5000"))
+
+if __name__ == '__main__':
+    unittest.main()
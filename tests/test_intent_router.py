@@ -0,0 +1,99 @@
+import unittest
+from unittest.mock import patch, MagicMock
+import frappe
+from aida_agent_app import intent_router
+from aida_agent_app.intent_router import Target
+
+ROWS = {
+    "DocType": [frappe._dict(name="Sales Invoice", issingle=0), frappe._dict(name="Stock Entry", issingle=0),
+                frappe._dict(name="System Settings", issingle=1)],
+    "Report": [frappe._dict(name="General Ledger")],
+    "Page": [frappe._dict(name="point-of-sale", title="Point of Sale")],
+    "Workspace": [frappe._dict(name="Selling")],
+    "Workspace Link": [frappe._dict(label="Invoices", link_to="Sales Invoice", link_type="DocType")],
+    "Workspace Shortcut": [frappe._dict(label="POS", link_to="point-of-sale", link_type="Page")],
+    "Has Role": []
+}
+
+class TestIntentRouter(unittest.TestCase):
+    """Test cases for answering navigation requests without the agent."""
+
+    def setUp(self):
+        with patch('aida_agent_app.intent_router.frappe.get_all', side_effect=lambda doctype, **kwargs: ROWS[doctype]):
+            self.vocabulary = intent_router.build_vocabulary()
+        router = patch(
+            'aida_agent_app.intent_router.get_router',
+            return_value=(self.vocabulary, intent_router.compile_router(self.vocabulary))
+        )
+        router.start()
+        self.addCleanup(router.stop)
+        for target, value in (("get_cached_value", "System User"), ("has_permission", True)):
+            patcher = patch(f'aida_agent_app.intent_router.frappe.{target}', return_value=value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        url = patch('aida_agent_app.intent_router.get_url', side_effect=lambda path: f"https://erp.example.com{path}")
+        url.start()
+        self.addCleanup(url.stop)
+
+    def test_vocabulary_includes_labels_and_plurals(self):
+        """Test that workspace labels and plural forms point at their targets."""
+        self.assertEqual(self.vocabulary["invoices"].name, "Sales Invoice")
+        self.assertEqual(self.vocabulary["stock entries"].name, "Stock Entry")
+        self.assertEqual(self.vocabulary["pos"], Target("Page", "point-of-sale", "Point of Sale"))
+
+    def test_navigation_answered_locally(self):
+        """Test that "open"/"where is" requests get a clickable route."""
+        cases = {
+            "Open the Sales Invoice list": "/app/sales-invoice",
+            "where are my stock entries?": "/app/stock-entry",
+            "Where is the General Ledger": "/app/query-report/General%20Ledger",
+            "take me to selling": "/app/selling",
+            "open POS": "/app/point-of-sale",
+            "open system settings": "/app/system-settings"
+        }
+        for message, route in cases.items():
+            result = intent_router.route(message, "test@example.com")
+            self.assertEqual(result["route"], route, message)
+            self.assertIn(f"https://erp.example.com{route}", result["response"])
+            self.assertFalse(result["cacheable"])
+
+    def test_new_form(self):
+        """Test that "new X" opens a new form, and only for DocTypes."""
+        result = intent_router.route("create a new sales invoice", "test@example.com")
+        self.assertEqual(result["intent"], intent_router.NEW)
+        self.assertEqual(result["route"], "/app/sales-invoice/new")
+
+        self.assertIsNone(intent_router.route("new general ledger", "test@example.com"))
+
+    def test_questions_go_to_agent(self):
+        """Test that how-to and open questions are left to the agent."""
+        for message in ("How do I create a new sales invoice?", "show me sales invoices from last month",
+                        "open the pod bay doors", "Hello"):
+            self.assertIsNone(intent_router.route(message, "test@example.com"), message)
+
+    def test_permission_required(self):
+        """Test that targets the user can't open are left to the agent."""
+        with patch('aida_agent_app.intent_router.frappe.has_permission', return_value=False):
+            self.assertIsNone(intent_router.route("open sales invoices", "test@example.com"))
+
+        with patch('aida_agent_app.intent_router.frappe.get_cached_value', return_value="Website User"):
+            self.assertIsNone(intent_router.route("open sales invoices", "test@example.com"))
+
+    def test_vocabulary_shared_between_workers(self):
+        """Test that a worker reuses the vocabulary another built for the same version."""
+        cache = MagicMock()
+        shared = {"version": 3, "vocabulary": {phrase: tuple(target) for phrase, target in self.vocabulary.items()}}
+        cache.get_value.return_value = shared
+
+        with patch('aida_agent_app.intent_router.frappe.cache', return_value=cache), \
+                patch('aida_agent_app.intent_router.build_vocabulary') as mock_build:
+            self.assertEqual(intent_router._load_vocabulary(3), self.vocabulary)
+            mock_build.assert_not_called()
+
+            mock_build.return_value = self.vocabulary
+            intent_router._load_vocabulary(4)
+            mock_build.assert_called_once()
+            self.assertEqual(cache.set_value.call_args[0][1]["version"], 4)
+
+if __name__ == '__main__':
+    unittest.main()
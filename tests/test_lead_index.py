@@ -0,0 +1,119 @@
+import unittest
+from unittest.mock import patch, MagicMock
+import frappe
+from aida_agent_app import lead_index
+
+class TestLeadIndex(unittest.TestCase):
+    """Test cases for the duplicate-lead index."""
+
+    def test_normalize_phone(self):
+        """Test that formatting and country codes don't hide a match."""
+        self.assertEqual(lead_index.normalize_phone("+1 (555) 010-1234"), "5550101234")
+        self.assertEqual(lead_index.normalize_phone("555.010.1234"), "5550101234")
+        self.assertIsNone(lead_index.normalize_phone("n/a"))
+
+    def test_normalize_email_domain_skips_free_mail(self):
+        """Test that shared mail providers are not used to match businesses."""
+        self.assertEqual(lead_index.normalize_email_domain("Info@Example.COM"), "example.com")
+        self.assertIsNone(lead_index.normalize_email_domain("owner@gmail.com"))
+
+    def test_normalize_website(self):
+        """Test that scheme, www and paths are ignored."""
+        self.assertEqual(lead_index.normalize_website("https://www.Example.com/contact"), "example.com")
+        self.assertEqual(lead_index.normalize_website("example.com"), "example.com")
+
+    def test_normalize_company_name(self):
+        """Test that legal suffixes and punctuation are ignored."""
+        self.assertEqual(
+            lead_index.normalize_company_name("Joe's Pizza, LLC"),
+            lead_index.normalize_company_name("joe s pizza")
+        )
+
+    @patch('aida_agent_app.lead_index._existing_keys')
+    def test_filter_leads(self, mock_existing_keys):
+        """Test that existing leads and repeats within the list are both filtered."""
+        mock_existing_keys.return_value = {("phone", "5550100001")}
+        leads = [
+            {"lead_name": "Old", "phone": "555 010 0001"},
+            {"lead_name": "New", "website": "new.example.com"},
+            {"lead_name": "New Again", "website": "https://www.new.example.com"}
+        ]
+
+        new, duplicates = lead_index.filter_leads(leads)
+
+        self.assertEqual([lead["lead_name"] for lead in new], ["New"])
+        self.assertEqual([lead["lead_name"] for lead in duplicates], ["Old", "New Again"])
+
+    def make_request(self, headers):
+        request = MagicMock()
+        request.path = "/api/resource/Lead"
+        request.headers = headers
+        return request
+
+    @patch('aida_agent_app.lead_index.find_duplicate')
+    @patch('aida_agent_app.lead_index._job_user')
+    @patch('aida_agent_app.lead_index.frappe')
+    def test_guard_ignores_inserts_without_job_header(self, mock_frappe, mock_job_user, mock_find_duplicate):
+        """Test that the user's other REST Lead inserts are not checked while a job runs."""
+        mock_frappe.local.request = self.make_request({})
+        mock_frappe.session.user = "user@example.com"
+        mock_job_user.return_value = "user@example.com"
+
+        lead_index.before_lead_insert(frappe._dict(lead_name="Cafe"))
+
+        mock_find_duplicate.assert_not_called()
+        mock_frappe.throw.assert_not_called()
+
+    @patch('aida_agent_app.lead_index.find_duplicate')
+    @patch('aida_agent_app.lead_index._job_user')
+    @patch('aida_agent_app.lead_index.frappe')
+    def test_guard_rejects_duplicates_sent_for_job(self, mock_frappe, mock_job_user, mock_find_duplicate):
+        """Test that a duplicate the AIDA server sends for a running job is rejected and counted."""
+        mock_frappe.local.request = self.make_request({lead_index.JOB_HEADER: "job1"})
+        mock_frappe.session.user = "user@example.com"
+        mock_job_user.return_value = "user@example.com"
+        mock_find_duplicate.return_value = "phone"
+
+        lead_index.before_lead_insert(frappe._dict(lead_name="Cafe"))
+
+        mock_job_user.assert_called_once_with("job1")
+        mock_frappe.throw.assert_called_once()
+        mock_frappe.cache.return_value.incr.assert_called_once()
+
+        # Another user's inserts can't borrow the job's header
+        mock_frappe.throw.reset_mock()
+        mock_frappe.session.user = "other@example.com"
+        lead_index.before_lead_insert(frappe._dict(lead_name="Cafe"))
+        mock_frappe.throw.assert_not_called()
+
+    @patch('aida_agent_app.lead_index.BUILD_PAGE_SIZE', 2)
+    @patch('aida_agent_app.lead_index.frappe')
+    def test_ensure_index_builds_aside_and_renames(self, mock_frappe):
+        """Test that the index is paged by name and swapped in only once it is complete."""
+        cache = mock_frappe.cache.return_value
+        cache.get.return_value = None
+        cache.make_key.side_effect = lambda key: key
+        pipe = cache.pipeline.return_value
+        # The last execute reports which build sets exist; website has no values
+        pipe.execute.return_value = [1, 1, 0, 1]
+        mock_frappe.generate_hash.return_value = "b1"
+        mock_frappe.get_all.side_effect = [
+            [frappe._dict(name="LEAD-1", phone="5550100001"), frappe._dict(name="LEAD-2", email_id="a@cafe.com")],
+            [frappe._dict(name="LEAD-3", company_name="Cafe LLC")]
+        ]
+
+        lead_index.ensure_index()
+
+        first, second = mock_frappe.get_all.call_args_list
+        self.assertIsNone(first.kwargs["filters"])
+        self.assertEqual(second.kwargs["filters"], {"name": [">", "LEAD-2"]})
+        self.assertNotIn("start", second.kwargs)
+        pipe.sadd.assert_any_call("aida_lead_index_build:b1:phone", "5550100001")
+        pipe.rename.assert_any_call("aida_lead_index_build:b1:phone", "aida_lead_index:phone")
+        self.assertEqual(pipe.rename.call_count, 3)
+        pipe.delete.assert_called_once_with("aida_lead_index:website")
+        # The live sets are never emptied before the new ones are ready
+        cache.delete.assert_not_called()
+
+if __name__ == '__main__':
+    unittest.main()
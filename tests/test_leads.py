@@ -0,0 +1,190 @@
+import unittest
+from unittest.mock import patch, MagicMock
+from aida_agent_app import leads
+from aida_agent_app.settings import AidaSettings
+
+class TestBulkLeadInsert(unittest.TestCase):
+    """Test cases for inserting AIDA lead candidates locally."""
+
+    def make_settings(self, bulk_insert_leads):
+        return AidaSettings(
+            api_server_url="http://localhost:5000", erpnext_url="http://localhost:8000",
+            google_api_key="key", mongo_uri="", enable_onboarding=1, enable_lead_creation=1,
+            widget_position="bottom-right", widget_theme="light", connection_pool_size=10,
+            enable_streaming=0, lead_batch_concurrency=4, bulk_insert_leads=bulk_insert_leads,
+            answer_cache_ttl=0
+        )
+
+    def test_payload_without_session_in_bulk_mode(self):
+        """Test that bulk mode asks for candidates and doesn't forward the sid."""
+        payload = leads._build_payload(self.make_settings(1), "user@example.com", "sid123", "cafes", "Austin", 5)
+
+        self.assertTrue(payload["return_candidates"])
+        self.assertNotIn("password", payload)
+
+        payload = leads._build_payload(
+            self.make_settings(0), "user@example.com", "sid123", "cafes", "Austin", 5, job_id="job1"
+        )
+        self.assertEqual(payload["password"], "sid123")
+        self.assertEqual(payload["erpnext_headers"], {"X-AIDA-Lead-Job": "job1"})
+
+    @patch('aida_agent_app.leads.publish_progress')
+    @patch('aida_agent_app.leads.check_cancelled')
+    @patch('aida_agent_app.leads.lead_index')
+    @patch('aida_agent_app.leads.frappe')
+    def test_insert_leads_commits_per_chunk(self, mock_frappe, mock_lead_index, mock_check_cancelled,
+                                            mock_publish):
+        """Test that candidates are inserted in chunks with one commit each."""
+        candidates = [{"name": f"Cafe {i}", "phone": f"555 010 {i:04d}"} for i in range(5)]
+        mock_lead_index.filter_leads.return_value = (candidates[:4], candidates[4:])
+        mock_frappe.get_meta.return_value.has_field.return_value = True
+        mock_frappe.new_doc.side_effect = lambda doctype: MagicMock()
+
+        with patch.object(leads, 'LEAD_INSERT_CHUNK', 2):
+            result = leads.insert_leads("job1", "user@example.com", candidates)
+
+        self.assertEqual(result["created_count"], 4)
+        self.assertEqual(result["skipped_duplicates"], 1)
+        self.assertEqual(result["failed_count"], 0)
+        self.assertEqual(mock_frappe.db.bulk_insert.call_count, 2)
+        self.assertEqual(len(mock_frappe.db.bulk_insert.call_args[0][2]), 2)
+        self.assertEqual(mock_frappe.db.commit.call_count, 2)
+        self.assertEqual(mock_lead_index.add_leads.call_count, 2)
+
+    @patch('aida_agent_app.leads.publish_progress')
+    @patch('aida_agent_app.leads.check_cancelled')
+    @patch('aida_agent_app.leads.lead_index')
+    @patch('aida_agent_app.leads.frappe')
+    def test_insert_leads_skips_invalid_candidate(self, mock_frappe, mock_lead_index, mock_check_cancelled,
+                                                  mock_publish):
+        """Test that one invalid candidate doesn't lose the rest of its chunk."""
+        candidates = [{"name": "Good"}, {"name": "Bad"}]
+        mock_lead_index.filter_leads.return_value = (candidates, [])
+        mock_frappe.get_meta.return_value.has_field.return_value = True
+        good_doc = MagicMock()
+        good_doc.get_valid_dict.return_value = {"name": "CRM-LEAD-1", "lead_name": "Good"}
+        bad_doc = MagicMock()
+        bad_doc.run_method.side_effect = Exception("Invalid email")
+        mock_frappe.new_doc.side_effect = [good_doc, bad_doc]
+
+        result = leads.insert_leads("job1", "user@example.com", candidates)
+
+        self.assertEqual(result["created_count"], 1)
+        self.assertEqual(result["failed_count"], 1)
+        mock_frappe.db.bulk_insert.assert_called_once_with(
+            "Lead", ["name", "lead_name"], [["CRM-LEAD-1", "Good"]]
+        )
+        mock_frappe.db.rollback.assert_not_called()
+        mock_frappe.db.commit.assert_called_once()
+
+    @patch('aida_agent_app.leads.publish_progress')
+    @patch('aida_agent_app.leads.check_cancelled')
+    @patch('aida_agent_app.leads.lead_index')
+    @patch('aida_agent_app.leads.frappe')
+    def test_insert_leads_rolls_back_failed_write(self, mock_frappe, mock_lead_index, mock_check_cancelled,
+                                                  mock_publish):
+        """Test that a chunk whose insert fails is rolled back and counted as failed."""
+        candidates = [{"name": "Cafe 1"}, {"name": "Cafe 2"}]
+        mock_lead_index.filter_leads.return_value = (candidates, [])
+        mock_frappe.get_meta.return_value.has_field.return_value = True
+        mock_frappe.new_doc.side_effect = lambda doctype: MagicMock()
+        mock_frappe.db.bulk_insert.side_effect = Exception("Duplicate entry")
+
+        result = leads.insert_leads("job1", "user@example.com", candidates)
+
+        self.assertEqual(result["created_count"], 0)
+        self.assertEqual(result["failed_count"], 2)
+        mock_frappe.db.rollback.assert_called_once_with(save_point="aida_lead_insert")
+        mock_lead_index.add_leads.assert_called_once_with([])
+
+    @patch('aida_agent_app.leads.frappe')
+    def test_start_lead_job_checks_permission(self, mock_frappe):
+        """Test that a user who can't create Leads gets an error before any job is queued."""
+        mock_frappe.PermissionError = PermissionError
+        mock_frappe.session.user = "guest@example.com"
+        mock_frappe.has_permission.return_value = False
+
+        with self.assertRaises(PermissionError):
+            leads.start_lead_job("cafes", "Austin", 5)
+        with self.assertRaises(PermissionError):
+            leads.start_lead_batch_job([("cafes", "Austin", 5)])
+
+        mock_frappe.enqueue.assert_not_called()
+
+    def test_compact_lead(self):
+        """Test that only the keys leads are built and matched from are kept."""
+        candidate = {"name": "Cafe", "phone_number": "555", "photos": ["x" * 1000], "reviews": [], "website": ""}
+
+        self.assertEqual(leads.compact_lead(candidate), {"name": "Cafe", "phone_number": "555"})
+
+    @patch('aida_agent_app.leads.publish_progress')
+    @patch('aida_agent_app.leads.check_cancelled')
+    @patch('aida_agent_app.leads.lead_index')
+    @patch('aida_agent_app.leads.frappe')
+    def test_insert_streamed_leads_checks_each_chunk(self, mock_frappe, mock_lead_index, mock_check_cancelled,
+                                                     mock_publish):
+        """Test that streamed chunks are checked for duplicates and inserted as they arrive."""
+        chunks = [[{"name": "Cafe 1"}, {"name": "Cafe 2"}], [{"name": "Cafe 1"}, {"name": "Cafe 3"}]]
+        mock_lead_index.filter_leads.side_effect = [(chunks[0], []), (chunks[1][1:], chunks[1][:1])]
+        mock_frappe.get_meta.return_value.has_field.return_value = True
+        mock_frappe.new_doc.side_effect = lambda doctype: MagicMock()
+
+        result = leads.insert_streamed_leads("job1", "user@example.com", iter(chunks), 4)
+
+        self.assertEqual(result["created_count"], 3)
+        self.assertEqual(result["skipped_duplicates"], 1)
+        self.assertEqual(mock_lead_index.filter_leads.call_count, 2)
+        self.assertEqual(mock_frappe.db.commit.call_count, 2)
+        self.assertEqual(mock_publish.call_args[1]["total"], 4)
+
+    def test_lead_chunks(self):
+        """Test that parsed leads are compacted and grouped into insert chunks."""
+        stream = [("candidates", {"name": f"Cafe {i}", "photos": []}) for i in range(5)]
+
+        with patch.object(leads, 'LEAD_INSERT_CHUNK', 2):
+            chunks = list(leads._lead_chunks(stream))
+
+        self.assertEqual([len(chunk) for chunk in chunks], [2, 2, 1])
+        self.assertEqual(chunks[2], [{"name": "Cafe 4"}])
+
+    @patch('aida_agent_app.leads.insert_streamed_leads')
+    @patch('aida_agent_app.leads._run_query')
+    @patch('aida_agent_app.leads.upstream')
+    @patch('aida_agent_app.leads.circuit_breaker')
+    @patch('aida_agent_app.leads.backends')
+    @patch('aida_agent_app.leads.lead_index')
+    @patch('aida_agent_app.leads.is_cancelled', return_value=False)
+    @patch('aida_agent_app.leads.check_cancelled')
+    @patch('aida_agent_app.leads.publish_progress')
+    @patch('aida_agent_app.leads.set_job_status')
+    @patch('aida_agent_app.leads.get_settings_snapshot')
+    def test_batch_inserts_chunks_as_parsed(self, mock_snapshot, mock_set_status, mock_publish, mock_check_cancelled,
+                                            mock_is_cancelled, mock_lead_index, mock_backends, mock_circuit_breaker,
+                                            mock_upstream, mock_run_query, mock_insert):
+        """Test that a batch query's leads reach the job's thread a chunk at a time, never as one list."""
+        mock_snapshot.return_value = self.make_settings(1)
+        mock_backends.acquire.return_value = ("http://localhost:5000", 1)
+        mock_lead_index.pop_skipped.return_value = 0
+        chunks = [[{"name": "Cafe 1"}, {"name": "Cafe 2"}], [{"name": "Cafe 3"}]]
+
+        def run_query(session, api_server_url, payload, emit):
+            for chunk in chunks:
+                emit(chunk)
+            return {"success": True, "result": {}, "duration": 1.0}
+
+        mock_run_query.side_effect = run_query
+        mock_insert.side_effect = lambda job_id, user, chunk_list, total: {
+            "created_count": len(chunk_list[0]), "created": [lead["name"] for lead in chunk_list[0]],
+            "failed_count": 0, "errors": [], "skipped_duplicates": 0
+        }
+
+        leads.run_lead_batch_job("job1", [("cafes", "Austin", 5)], "user@example.com", "sid123")
+
+        self.assertEqual([call[0][2] for call in mock_insert.call_args_list], [[chunks[0]], [chunks[1]]])
+        status = mock_set_status.call_args[1]
+        self.assertEqual(status["status"], "completed")
+        self.assertEqual(status["result"]["created_count"], 3)
+        self.assertEqual(status["result"]["queries"][0]["result"]["created"], ["Cafe 1", "Cafe 2", "Cafe 3"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import unittest
+from unittest.mock import patch
+import frappe
+from aida_agent_app import metrics, circuit_breaker
+from aida_agent_app.api import get_metrics
+
+class TestMetrics(unittest.TestCase):
+    """Test cases for the Prometheus metrics output."""
+
+    @patch('aida_agent_app.metrics.frappe.cache')
+    def test_histogram_buckets_are_cumulative(self, mock_cache):
+        """Test that stored bucket counts are rendered cumulatively."""
+        mock_cache.return_value.execute_command.return_value = {
+            b"chat|total|2": b"3",
+            b"chat|total|5": b"1",
+            b"chat|total|sum": b"1.75",
+            b"chat|requests": b"4",
+            b"chat|errors": b"1"
+        }
+
+        text = metrics.render_prometheus()
+
+        self.assertIn('aida_request_duration_seconds_bucket{endpoint="chat",phase="total",le="0.1"} 3', text)
+        self.assertIn('aida_request_duration_seconds_bucket{endpoint="chat",phase="total",le="1"} 4', text)
+        self.assertIn('aida_request_duration_seconds_bucket{endpoint="chat",phase="total",le="+Inf"} 4', text)
+        self.assertIn('aida_request_duration_seconds_count{endpoint="chat",phase="total"} 4', text)
+        self.assertIn('aida_errors_total{endpoint="chat"} 1', text)
+
+    def test_bucket_index(self):
+        """Test that observations land in the first bucket that holds them."""
+        self.assertEqual(metrics._bucket_index(0.005), 0)
+        self.assertEqual(metrics._bucket_index(1), metrics.BUCKETS.index(1))
+        self.assertEqual(metrics._bucket_index(500), len(metrics.BUCKETS))
+
+class TestGetMetrics(unittest.TestCase):
+    """Test cases for the get_metrics endpoint."""
+
+    @patch('aida_agent_app.api.metrics.render_prometheus')
+    @patch('aida_agent_app.api.frappe.only_for')
+    def test_requires_system_manager(self, mock_only_for, mock_render):
+        """Test that only System Managers can read the metrics."""
+        mock_only_for.side_effect = frappe.PermissionError("Not permitted")
+
+        with self.assertRaises(frappe.PermissionError):
+            get_metrics()
+
+        mock_only_for.assert_called_once_with("System Manager")
+        mock_render.assert_not_called()
+
+    @patch('aida_agent_app.api.Response')
+    @patch('aida_agent_app.api.circuit_breaker.get_state')
+    @patch('aida_agent_app.api.admission.get_stats')
+    @patch('aida_agent_app.api.answer_cache.get_stats')
+    @patch('aida_agent_app.api.get_settings_snapshot')
+    @patch('aida_agent_app.api.frappe.only_for')
+    @patch('aida_agent_app.metrics.frappe.cache')
+    def test_prometheus_text(self, mock_cache, mock_only_for, mock_snapshot, mock_cache_stats, mock_admission_stats,
+                             mock_get_state, mock_response):
+        """Test that histograms and gauges are returned as Prometheus text."""
+        mock_cache.return_value.execute_command.return_value = {b"chat|total|2": b"3", b"chat|requests": b"3"}
+        mock_snapshot.return_value.api_server_url = "http://localhost:5000"
+        mock_cache_stats.return_value = {"entries": 7, "hit_ratio": 0.25}
+        mock_admission_stats.return_value = {"in_flight": 2, "queued": 0}
+        mock_get_state.return_value = circuit_breaker.OPEN
+
+        get_metrics()
+
+        text = mock_response.call_args[0][0]
+        self.assertEqual(mock_response.call_args[1]["mimetype"], "text/plain; version=0.0.4")
+        self.assertIn('aida_request_duration_seconds_count{endpoint="chat",phase="total"} 3', text)
+        self.assertIn("# TYPE aida_answer_cache_entries gauge", text)
+        self.assertIn("aida_answer_cache_entries 7", text)
+        self.assertIn("aida_admission_in_flight 2", text)
+        self.assertIn('aida_circuit_open{server="http://localhost:5000"} 1', text)
+
+if __name__ == '__main__':
+    unittest.main()
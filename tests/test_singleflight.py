@@ -0,0 +1,91 @@
+import unittest
+from unittest.mock import patch
+from aida_agent_app import singleflight
+
+class FakeCache:
+    """Just enough of frappe.cache() for the single-flight calls."""
+
+    def __init__(self):
+        self.data = {}
+
+    def make_key(self, key):
+        return key
+
+    def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.data:
+            return False
+        self.data[key] = value
+        return True
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+    def set_value(self, key, value, expires_in_sec=None):
+        self.data[key] = value
+
+    def get_value(self, key, expires=False):
+        return self.data.get(key)
+
+class TestSingleFlight(unittest.TestCase):
+    """Test cases for coalescing identical upstream calls."""
+
+    def setUp(self):
+        self.cache = FakeCache()
+        patcher = patch('aida_agent_app.singleflight.frappe.cache', return_value=self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_make_key_ignores_dict_order(self):
+        """Test that equal payloads give the same key."""
+        self.assertEqual(
+            singleflight.make_key("POST", "/chat", {"a": 1, "b": 2}),
+            singleflight.make_key("POST", "/chat", {"b": 2, "a": 1})
+        )
+
+    def test_leader_runs_and_publishes(self):
+        """Test that the leader runs the call, shares the result and releases the lock."""
+        result = singleflight.run("k1", lambda: "live", 1, publish=lambda r: r.upper())
+
+        self.assertEqual(result, "live")
+        self.assertNotIn(singleflight.LOCK_KEY.format("k1"), self.cache.data)
+        shared = [v for k, v in self.cache.data.items() if k.startswith("aida_flight_result:k1:")]
+        self.assertEqual(shared, [{"result": "LIVE"}])
+
+    @patch('aida_agent_app.singleflight.time.sleep')
+    def test_follower_shares_leader_result(self, mock_sleep):
+        """Test that a caller arriving mid-flight gets the leader's result without calling."""
+        self.cache.data[singleflight.LOCK_KEY.format("k2")] = b"tok"
+        self.cache.data[singleflight.RESULT_KEY.format("k2", "tok")] = {"result": "shared"}
+        calls = []
+
+        result = singleflight.run("k2", lambda: calls.append(1), 1)
+
+        self.assertEqual(result, "shared")
+        self.assertEqual(calls, [])
+
+    @patch('aida_agent_app.singleflight.time.sleep')
+    def test_follower_falls_back_when_leader_fails(self, mock_sleep):
+        """Test that a failed leader makes followers call on their own."""
+        self.cache.data[singleflight.LOCK_KEY.format("k3")] = b"tok"
+        self.cache.data[singleflight.RESULT_KEY.format("k3", "tok")] = singleflight._FAILED
+
+        result = singleflight.run("k3", lambda: "own", 1)
+
+        self.assertEqual(result, "own")
+
+    @patch('aida_agent_app.singleflight.time.time')
+    @patch('aida_agent_app.singleflight.time.sleep')
+    def test_follower_wait_is_bounded(self, mock_sleep, mock_time):
+        """Test that a follower stops waiting after the timeout and calls on its own."""
+        mock_time.side_effect = [0, 0, 0.5, 2]
+        self.cache.data[singleflight.LOCK_KEY.format("k4")] = b"tok"
+
+        result = singleflight.run("k4", lambda: "own", 1)
+
+        self.assertEqual(result, "own")
+
+if __name__ == '__main__':
+    unittest.main()
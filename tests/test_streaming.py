@@ -0,0 +1,103 @@
+import unittest
+from unittest.mock import patch, MagicMock
+from aida_agent_app.streaming import iter_stream_text, stream_chat, DONE_EVENT
+from aida_agent_app.admission import AdmissionRejected
+from aida_agent_app.circuit_breaker import CircuitOpenError
+
+class TestChatStreaming(unittest.TestCase):
+    """Test cases for parsing streamed chat replies."""
+
+    def make_response(self, lines):
+        response = MagicMock()
+        response.iter_lines.return_value = iter(lines)
+        return response
+
+    def test_json_and_plain_events(self):
+        """Test that JSON and plain text events are both relayed."""
+        response = self.make_response([
+            'data: {"token": "Hello"}',
+            '',
+            'data: {"delta": ", "}',
+            'data: world',
+            'data: [DONE]',
+            'data: {"token": "ignored"}'
+        ])
+
+        self.assertEqual(list(iter_stream_text(response)), ["Hello", ", ", "world"])
+
+    def test_non_data_lines_skipped(self):
+        """Test that comments and event names are ignored."""
+        response = self.make_response([': keep-alive', 'event: message', 'data: {"response": "Hi"}'])
+
+        self.assertEqual(list(iter_stream_text(response)), ["Hi"])
+
+    @patch('aida_agent_app.streaming._publish')
+    @patch('aida_agent_app.streaming.upstream.post')
+    @patch('aida_agent_app.streaming.admission.slot')
+    @patch('aida_agent_app.streaming.backends.for_session')
+    @patch('aida_agent_app.streaming.get_settings_snapshot')
+    def test_busy_stream_not_sent(self, mock_snapshot, mock_for_session, mock_slot, mock_post, mock_publish):
+        """Test that a stream turned away by admission control reports busy without calling the server."""
+        mock_slot.side_effect = AdmissionRejected(5)
+
+        stream_chat("abc123", "session123", "Hello", "test@example.com", "http://site.localhost")
+
+        mock_post.assert_not_called()
+        event, message = mock_publish.call_args[0][:2]
+        self.assertEqual(event, DONE_EVENT)
+        self.assertEqual(message["stream_id"], "abc123")
+        self.assertTrue(message["busy"])
+
+    @patch('aida_agent_app.streaming.frappe.log_error')
+    @patch('aida_agent_app.streaming._publish')
+    @patch('aida_agent_app.streaming.upstream.post')
+    @patch('aida_agent_app.streaming.admission.slot')
+    @patch('aida_agent_app.streaming.backends.for_session')
+    @patch('aida_agent_app.streaming.get_settings_snapshot')
+    def test_circuit_open_reports_retry(self, mock_snapshot, mock_for_session, mock_slot, mock_post, mock_publish,
+                                        mock_log_error):
+        """Test that an open circuit ends the stream with a retry hint and no error log."""
+        mock_post.side_effect = CircuitOpenError("http://localhost:5000", 12)
+
+        stream_chat("abc123", "session123", "Hello", "test@example.com", "http://site.localhost")
+
+        message = mock_publish.call_args[0][1]
+        self.assertFalse(message["success"])
+        self.assertEqual(message["retry_after"], 12)
+        mock_log_error.assert_not_called()
+
+    def stream_reply(self, lines):
+        response = self.make_response(lines)
+        response.status_code = 200
+        response.headers = {"content-type": "text/event-stream"}
+        response.__enter__.return_value = response
+        return response
+
+    @patch('aida_agent_app.streaming.chat_history.record_exchange')
+    @patch('aida_agent_app.streaming.answer_cache.store')
+    @patch('aida_agent_app.streaming._publish')
+    @patch('aida_agent_app.streaming.upstream.post')
+    @patch('aida_agent_app.streaming.admission.slot')
+    @patch('aida_agent_app.streaming.backends.for_session')
+    @patch('aida_agent_app.streaming.get_settings_snapshot')
+    def test_session_dependent_stream_not_cached(self, mock_snapshot, mock_for_session, mock_slot, mock_post,
+                                                 mock_publish, mock_store, mock_record):
+        """Test that streamed replies are cached only when the server marks them shareable."""
+        mock_snapshot.return_value.answer_cache_ttl = 3600
+        for lines in (
+            ['data: {"token": "Your open orders: 3"}', 'data: {"session_dependent": true}', 'data: [DONE]'],
+            ['data: {"token": "Your open orders: 3"}', 'data: [DONE]'],
+            ['data: {"token": "Go to Selling"}', 'data: {"cacheable": true, "session_dependent": true}']
+        ):
+            mock_post.return_value = self.stream_reply(lines)
+            stream_chat("abc123", "session123", "what is my order count", "test@example.com",
+                        "http://site.localhost", answer_key="key1")
+        mock_store.assert_not_called()
+
+        mock_post.return_value = self.stream_reply(['data: {"token": "Go to Selling"}', 'data: {"cacheable": true}'])
+        stream_chat("abc123", "session123", "how do I add a customer", "test@example.com",
+                    "http://site.localhost", answer_key="key2")
+        mock_store.assert_called_once_with("key2", {"response": "Go to Selling", "cacheable": True}, 3600)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+import time
+import unittest
+from unittest.mock import patch, MagicMock
+from aida_agent_app import upstream, circuit_breaker
+
+class TestUpstreamSessionPool(unittest.TestCase):
+    """Test cases for the pooled AIDA HTTP client."""
+
+    def setUp(self):
+        """Start every test with an empty pool."""
+        upstream._sessions.clear()
+        upstream._site_urls.clear()
+        upstream._warm_up_failures.clear()
+
+    @patch('aida_agent_app.upstream.frappe.local')
+    def test_session_is_reused(self, mock_local):
+        """Test that the same URL reuses one pooled session."""
+        mock_local.site = "test.localhost"
+
+        first = upstream.get_session("http://localhost:5000")
+        second = upstream.get_session("http://localhost:5000")
+
+        self.assertIs(first, second)
+
+    @patch('aida_agent_app.upstream.frappe.local')
+    def test_session_rebuilt_on_url_change(self, mock_local):
+        """Test that changing the server URL drops the old pool."""
+        mock_local.site = "test.localhost"
+
+        old = upstream.get_session("http://localhost:5000")
+        new = upstream.get_session("http://aida.internal:5000")
+
+        self.assertIsNot(old, new)
+        self.assertNotIn("http://localhost:5000", upstream._sessions)
+
+    @patch('aida_agent_app.upstream.frappe.local')
+    def test_registered_pool_keeps_sessions(self, mock_local):
+        """Test that alternating between servers of a pool reuses their sessions."""
+        mock_local.site = "test.localhost"
+        upstream.use_backends(["http://aida-1:5000", "http://aida-2:5000"])
+
+        first = upstream.get_session("http://aida-1:5000")
+        upstream.get_session("http://aida-2:5000")
+
+        self.assertIs(upstream.get_session("http://aida-1:5000"), first)
+
+        upstream.use_backends(["http://aida-2:5000"])
+        self.assertNotIn("http://aida-1:5000", upstream._sessions)
+
+    @patch('aida_agent_app.upstream.frappe.local')
+    def test_session_rebuilt_on_pool_size_change(self, mock_local):
+        """Test that changing the pool size rebuilds the session."""
+        mock_local.site = "test.localhost"
+
+        small = upstream.get_session("http://localhost:5000", pool_size=2)
+        large = upstream.get_session("http://localhost:5000", pool_size=20)
+
+        self.assertIsNot(small, large)
+
+    @patch('aida_agent_app.api.get_settings')
+    @patch('aida_agent_app.upstream.frappe.local')
+    def test_failed_warm_up_backs_off(self, mock_local, mock_get_settings):
+        """Test that a failed settings read is not retried on every request."""
+        mock_local.site = "test.localhost"
+        mock_get_settings.side_effect = Exception("database unavailable")
+
+        upstream.warm_up_connections()
+        upstream.warm_up_connections()
+
+        self.assertEqual(mock_get_settings.call_count, 1)
+        self.assertIn("test.localhost", upstream._warm_up_failures)
+
+    def test_backoff_delay_is_jittered_and_capped(self):
+        """Test that backoff delays stay within the exponential bound and the cap."""
+        for attempt in range(10):
+            delay = circuit_breaker.backoff_delay(attempt)
+            bound = min(circuit_breaker.BACKOFF_CAP, circuit_breaker.BACKOFF_BASE * (2 ** attempt))
+            self.assertGreaterEqual(delay, 0)
+            self.assertLessEqual(delay, bound)
+
+class TestCircuitBreaker(unittest.TestCase):
+    """Test cases for the shared circuit breaker."""
+
+    url = "http://localhost:5000"
+
+    def setUp(self):
+        """Back the circuit with an in-memory cache."""
+        self.store = {}
+        cache = MagicMock()
+        cache.make_key.side_effect = lambda key: key
+        cache.get.side_effect = self.store.get
+        cache.set.side_effect = lambda key, value, **kwargs: self.store.__setitem__(key, value)
+        cache.delete.side_effect = lambda *keys: [self.store.pop(key, None) for key in keys]
+        patcher = patch('aida_agent_app.circuit_breaker.frappe.cache', return_value=cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.opened_key = circuit_breaker._keys(self.url)[1]
+
+    def test_late_failure_keeps_open_period(self):
+        """Test that a call failing after the circuit opened doesn't restart the open period."""
+        opened = time.time() - 20
+        self.store[self.opened_key] = opened
+
+        circuit_breaker.record_failure(self.url)
+
+        self.assertEqual(self.store[self.opened_key], opened)
+        self.assertEqual(circuit_breaker.get_state(self.url), circuit_breaker.OPEN)
+
+    def test_failed_probe_reopens(self):
+        """Test that a failed half-open probe starts a new open period."""
+        opened = time.time() - circuit_breaker.RESET_TIMEOUT - 1
+        self.store[self.opened_key] = opened
+
+        circuit_breaker.record_failure(self.url)
+
+        self.assertGreater(self.store[self.opened_key], opened)
+        self.assertEqual(circuit_breaker.get_state(self.url), circuit_breaker.OPEN)
+
+if __name__ == '__main__':
+    unittest.main()
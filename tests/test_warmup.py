@@ -0,0 +1,127 @@
+import unittest
+from unittest.mock import patch, MagicMock
+import frappe
+from aida_agent_app import warmup
+from aida_agent_app.settings import AidaSettings
+
+def make_settings(**overrides):
+    values = dict(
+        api_server_url="http://aida.example.com", erpnext_url="http://erp.example.com", google_api_key="",
+        mongo_uri="", enable_onboarding=1, enable_lead_creation=1, widget_position="bottom-right",
+        widget_theme="light", connection_pool_size=10, enable_streaming=0, lead_batch_concurrency=4,
+        bulk_insert_leads=0, answer_cache_ttl=86400, backends=()
+    )
+    values.update(overrides)
+    return AidaSettings(**values)
+
+def make_response(status_code, data=None):
+    response = MagicMock()
+    response.status_code = status_code
+    response.headers = {"content-type": "application/json"}
+    response.json.return_value = data or {}
+    return response
+
+class TestWarmUp(unittest.TestCase):
+    """Test cases for the post-deploy warm-up."""
+
+    @patch('aida_agent_app.warmup.frappe.get_all')
+    def test_top_questions(self, mock_get_all):
+        """Test that the most asked how-to questions come first, topped up with defaults."""
+        mock_get_all.return_value = [
+            frappe._dict(user="a@example.com", message="How do I add a supplier?"),
+            frappe._dict(user="b@example.com", message="how do i add a supplier"),
+            frappe._dict(user="a@example.com", message="What is a BOM?"),
+            frappe._dict(user="a@example.com", message="open the customer list"),
+            frappe._dict(user="b@example.com", message="How do I create a new customer?")
+        ]
+
+        questions, askers = warmup.top_questions(limit=4)
+
+        self.assertEqual(questions[:3], ["How do I add a supplier?", "What is a BOM?", "How do I create a new customer?"])
+        self.assertEqual(questions[3], "How to make a sales invoice?")
+        self.assertEqual(askers, {"a@example.com": 2, "b@example.com": 2})
+
+    @patch('aida_agent_app.warmup.answer_cache.role_profile')
+    def test_top_profile_users(self, mock_role_profile):
+        """Test that one user stands for each of the busiest role profiles."""
+        profiles = {"a@example.com": "Accounts User", "b@example.com": "Sales User", "c@example.com": "Sales User"}
+        mock_role_profile.side_effect = profiles.get
+        askers = warmup.Counter({"a@example.com": 3, "b@example.com": 2, "c@example.com": 2, "Guest": 9})
+
+        self.assertEqual(warmup.top_profile_users(askers, limit=2), ["b@example.com", "a@example.com"])
+        self.assertEqual(warmup.top_profile_users(askers, limit=1), ["b@example.com"])
+
+    @patch('aida_agent_app.warmup.agent_sessions.clear_upstream_session')
+    @patch('aida_agent_app.warmup.answer_cache.store')
+    @patch('aida_agent_app.warmup.upstream.post')
+    @patch('aida_agent_app.warmup.health.known_down', return_value=None)
+    @patch('aida_agent_app.warmup.backends.pin')
+    @patch('aida_agent_app.warmup.answer_cache.has_answer')
+    @patch('aida_agent_app.warmup.answer_cache.make_key')
+    def test_resolve_asks_only_missing(self, mock_make_key, mock_has_answer, mock_pin, mock_known_down,
+                                       mock_post, mock_store, mock_clear):
+        """Test that only uncached questions are asked, in one session that is cleared after."""
+        mock_make_key.side_effect = lambda question, user: question.lower()
+        mock_has_answer.side_effect = lambda key: key == "what is a bom?"
+        mock_post.side_effect = [
+            make_response(200, {"session_id": "warm-1"}),
+            make_response(200, {"response": "Go to Buying > Supplier."}),
+            make_response(500),
+            make_response(200, {"response": "I couldn't access your account.", "error": "Authentication failed"})
+        ]
+
+        with patch('aida_agent_app.warmup.frappe.session') as mock_session:
+            mock_session.sid = "a@example.com"
+            result = warmup._resolve(
+                "a@example.com",
+                ["How do I add a supplier?", "What is a BOM?", "How do I add an item?", "How do I add a user?"],
+                make_settings()
+            )
+
+        self.assertEqual(result, (1, 1, 2))
+        self.assertEqual(
+            [call[0][1] for call in mock_post.call_args_list], ["/init_session", "/chat", "/chat", "/chat"]
+        )
+        mock_store.assert_called_once_with("how do i add a supplier?", {"response": "Go to Buying > Supplier."}, 86400)
+        mock_clear.assert_called_once_with("warm-1")
+
+    @patch('aida_agent_app.warmup.warm_answers')
+    @patch('aida_agent_app.warmup.warm_connections')
+    @patch('aida_agent_app.warmup.warm_indexes')
+    def test_failed_stage_does_not_stop_warm_up(self, mock_indexes, mock_connections, mock_answers):
+        """Test that every stage runs and is timed even when one fails."""
+        mock_indexes.return_value = {"intent_phrases": 10, "doctypes_indexed": 5}
+        mock_connections.side_effect = Exception("connection refused")
+        mock_answers.return_value = {"questions": 0}
+
+        with patch('aida_agent_app.warmup.frappe.local') as mock_local:
+            mock_local.site = "test.local"
+            report = warmup.warm_up()
+
+        self.assertEqual(report["stages"]["connections"]["error"], "connection refused")
+        self.assertEqual(report["stages"]["answers"]["questions"], 0)
+        for stage in report["stages"].values():
+            self.assertIn("seconds", stage)
+        self.assertIn("test.local", warmup.format_report(report))
+
+    @patch('aida_agent_app.warmup.frappe.enqueue')
+    @patch('aida_agent_app.warmup.frappe.cache')
+    def test_migrate_asks_questions_once_per_cooldown(self, mock_cache, mock_enqueue):
+        """Test that migrations inside the cooldown warm only indexes and connections."""
+        mock_cache.return_value.set.side_effect = [True, None]
+
+        with patch('aida_agent_app.warmup.frappe.conf', {}):
+            warmup.enqueue_warm_up()
+            warmup.enqueue_warm_up()
+
+        counts = [call[1]["question_count"] for call in mock_enqueue.call_args_list]
+        self.assertEqual(counts, [warmup.DEFAULT_QUESTION_COUNT, 0])
+        self.assertEqual(mock_cache.return_value.set.call_args[1]["ex"], warmup.WARM_UP_COOLDOWN)
+
+        with patch('aida_agent_app.warmup.frappe.conf', {"aida_warm_up_questions": 0}):
+            warmup.enqueue_warm_up()
+        self.assertEqual(mock_enqueue.call_args[1]["question_count"], 0)
+        self.assertEqual(mock_cache.return_value.set.call_count, 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+import gzip
+import json
+import unittest
+from aida_agent_app import wire
+
+class TestWireNegotiation(unittest.TestCase):
+    """Test cases for request encoding negotiated with the AIDA server."""
+
+    def setUp(self):
+        wire._capabilities.clear()
+
+    def test_plain_json_for_unknown_server(self):
+        """Test that a server that never advertised encodings gets plain JSON."""
+        payload = {"user_input": "x" * 5000}
+
+        kwargs = wire.prepare("http://old:5000", {"json": payload, "timeout": 10})
+
+        self.assertNotIn("json", kwargs)
+        self.assertEqual(kwargs["timeout"], 10)
+        self.assertEqual(kwargs["headers"]["Content-Type"], wire.JSON_TYPE)
+        self.assertNotIn("Content-Encoding", kwargs["headers"])
+        self.assertEqual(json.loads(kwargs["data"]), payload)
+
+    def test_gzip_large_body_when_advertised(self):
+        """Test that large bodies are gzipped once the server accepts gzip."""
+        wire.note_capabilities("http://new:5000", {wire.CAPABILITIES_HEADER: "gzip"})
+        payload = {"user_input": "x" * 5000}
+
+        kwargs = wire.prepare("http://new:5000", {"json": payload})
+
+        self.assertEqual(kwargs["headers"]["Content-Encoding"], "gzip")
+        self.assertEqual(json.loads(gzip.decompress(kwargs["data"])), payload)
+
+    def test_small_body_not_compressed(self):
+        """Test that small bodies skip compression."""
+        wire.note_capabilities("http://new:5000", {wire.CAPABILITIES_HEADER: "gzip"})
+
+        kwargs = wire.prepare("http://new:5000", {"json": {"session_id": "abc"}})
+
+        self.assertNotIn("Content-Encoding", kwargs["headers"])
+
+    @unittest.skipIf(wire.msgpack is None, "msgpack is not installed")
+    def test_msgpack_round_trip(self):
+        """Test msgpack request bodies and responses when both sides support it."""
+        wire.note_capabilities("http://new:5000", {wire.CAPABILITIES_HEADER: "msgpack"})
+        payload = {"leads": [{"lead_name": "Cafe"}]}
+
+        kwargs = wire.prepare("http://new:5000", {"json": payload})
+
+        self.assertEqual(kwargs["headers"]["Content-Type"], wire.MSGPACK_TYPE)
+        self.assertEqual(wire.loads(kwargs["data"], wire.MSGPACK_TYPE), payload)
+
+    def test_caller_accept_header_kept(self):
+        """Test that an explicit Accept header, e.g. for event streams, is left alone."""
+        kwargs = wire.prepare("http://new:5000", {"json": {}, "headers": {"Accept": "text/event-stream"}})
+
+        self.assertEqual(kwargs["headers"]["Accept"], "text/event-stream")
+
+    def test_loads_json_with_charset(self):
+        """Test that a JSON content type with parameters is decoded as JSON."""
+        self.assertEqual(wire.loads(b'{"ok": true}', "application/json; charset=utf-8"), {"ok": True})
+
+class TestDocumentStream(unittest.TestCase):
+    """Test cases for parsing lead lists as they download."""
+
+    DOCUMENT = {
+        "success": True,
+        "result": {"created_count": 2, "leads": [{"lead_name": "Cafe", "rating": 4.5}, {"lead_name": "Bakery"}]},
+        "candidates": [{"name": "Deli", "reviews": [{"text": "Good", "stars": 5}]}, "Diner"]
+    }
+    PATHS = ("result.leads", "leads", "candidates")
+
+    def chunks(self, body, size=7):
+        return (body[start:start + size] for start in range(0, len(body), size))
+
+    def assert_streamed(self, stream):
+        items = {}
+        for path, item in stream:
+            items.setdefault(path, []).append(item)
+
+        self.assertEqual(items, {
+            "result.leads": [{"lead_name": "Cafe", "rating": 4.5}, {"lead_name": "Bakery"}],
+            "candidates": [{"name": "Deli", "reviews": [{"text": "Good", "stars": 5}]}, "Diner"]
+        })
+        self.assertEqual(stream.summary, {"success": True, "result": {"created_count": 2}})
+
+    @unittest.skipIf(wire.ijson is None, "ijson is not installed")
+    def test_json_streamed(self):
+        """Test that JSON array items are handed out one by one, the rest kept as the summary."""
+        body = json.dumps(self.DOCUMENT).encode("utf-8")
+        self.assert_streamed(wire.DocumentStream(self.chunks(body), wire.JSON_TYPE, self.PATHS))
+
+    @unittest.skipIf(wire.msgpack is None, "msgpack is not installed")
+    def test_msgpack_streamed(self):
+        """Test that msgpack bodies give the same items and summary."""
+        body = wire.msgpack.packb(self.DOCUMENT, use_bin_type=True)
+        self.assert_streamed(wire.DocumentStream(self.chunks(body), wire.MSGPACK_TYPE, self.PATHS))
+
+    def test_whole_body_fallback(self):
+        """Test that without ijson the body is decoded whole with the same result."""
+        body = json.dumps(self.DOCUMENT).encode("utf-8")
+        original, wire.ijson = wire.ijson, None
+        try:
+            self.assert_streamed(wire.DocumentStream(self.chunks(body), wire.JSON_TYPE, self.PATHS))
+        finally:
+            wire.ijson = original
+
+if __name__ == '__main__':
+    unittest.main()